@@ -31,6 +31,8 @@ def create_app():
     # Import models so metadata is populated for migrations.
     import models  # noqa: F401
     migrate.init_app(app, db)
+    from services.search_index import init_search_index
+    init_search_index()
     init_cors(app)
     csrf.init_app(app)
     limiter.init_app(app)
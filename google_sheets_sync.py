@@ -1,40 +1,67 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Модуль для синхронизации данных с Google Sheets
+Модуль для синхронизации данных с Google Sheets (и выгрузки тех же листов в XLSX)
 """
 
 import gspread
 from google.oauth2.service_account import Credentials
 from datetime import datetime, date
 import logging
+import os
 import time
 import random
+
+import numpy as np
+
 from app import app, db
 from event_rank_constants import (
     CATEGORY_RANKS_MS_KMS,
     EVENT_RANK_OPTIONS,
     UNASSIGNED_EVENT_RANK,
 )
-from models import Athlete, Club, Category, Participant, Event
+from models import Athlete, Club, Event
+from services.participation_frame import (
+    NO_VALUE,
+    codes_where,
+    count_distinct,
+    distinct_count,
+    first_occurrence,
+    get_participation_frame,
+    group_count,
+    group_index,
+    relabel,
+)
+from services.sheets_sync import SheetsSync
+from services.xlsx_export import XlsxSpreadsheet
 
 logger = logging.getLogger(__name__)
 
 
-def _is_free_for_reports(pct_ppname, exclude_free_from_reports=False, participant_exclude_free_from_reports=False):
-    """Эффективная бесплатность для отчетов: БЕСП и турнир не исключен."""
-    return (
-        (pct_ppname == 'БЕСП')
-        and (not bool(exclude_free_from_reports))
-        and (not bool(participant_exclude_free_from_reports))
-    )
-
 # Настройки Google Sheets API
 SCOPES = [
     'https://www.googleapis.com/auth/spreadsheets',
     'https://www.googleapis.com/auth/drive'
 ]
 
+# Манифест последнего экспорта (хеши листов) в instance/ — для отправки только изменений
+SHEETS_MANIFEST_FILENAME = 'google_sheets_manifest.json'
+
+# Листы отчёта в порядке построения — этапы progress в _export_report_sheets
+REPORT_SHEETS = (
+    'Список спортсменов',
+    'Анализ по школам',
+    'Статистика',
+    'Общая статистика',
+    'Статистика участий',
+    'Турниры: новички и повторяющиеся',
+    'сводная статистика',
+    '1 сп: новички и повторяющиеся',
+    'Превышение бесплатных (>3)',
+)
+# Последний этап: отправка в Google Sheets / запись XLSX
+FINISH_STAGE = 'Отправка'
+
 # ID основной Google Таблицы (всегда используется эта таблица)
 DEFAULT_SPREADSHEET_ID = '1Db14waZDObeIra4JXm7kvb2oXQUA52_MhjqImgqFXSc'
 
@@ -109,48 +136,15 @@ def _install_gspread_retry(client, max_retries=6, base_delay=2.0):
                 logger.warning(
                     f"Google Sheets rate limit (429), retry {attempt + 1}/{max_retries}, sleep {wait_time:.1f}s"
                 )
+                # Счётчик повторов задачи экспорта (services/export_jobs.py), если она подписана
+                on_retry = getattr(http_client, 'on_retry', None)
+                if on_retry is not None:
+                    on_retry()
                 time.sleep(wait_time)
 
     http_client.request = request_with_retry
     http_client._retry_patched = True
 
-def safe_api_call(func, *args, max_retries=3, delay=1, **kwargs):
-    """
-    Безопасный вызов API с обработкой rate limiting и retry
-    
-    Args:
-        func: Функция для вызова
-        *args: Аргументы функции
-        max_retries: Максимальное количество попыток
-        delay: Начальная задержка между попытками (секунды)
-        **kwargs: Именованные аргументы функции
-    
-    Returns:
-        Результат выполнения функции
-    """
-    for attempt in range(max_retries):
-        try:
-            return func(*args, **kwargs)
-        except Exception as e:
-            error_str = str(e).lower()
-            
-            # Проверяем на rate limiting (429) или quota exceeded
-            if '429' in error_str or 'quota' in error_str or 'rate limit' in error_str or 'user rate limit' in error_str:
-                wait_time = delay * (2 ** attempt)  # Экспоненциальная задержка
-                logger.warning(f"Rate limit достигнут (попытка {attempt + 1}/{max_retries}). Ожидание {wait_time} сек...")
-                time.sleep(wait_time)
-                continue
-            # Другие ошибки - пробуем еще раз с задержкой
-            elif attempt < max_retries - 1:
-                wait_time = delay * (attempt + 1)
-                logger.warning(f"Ошибка API (попытка {attempt + 1}/{max_retries}): {e}. Ожидание {wait_time} сек...")
-                time.sleep(wait_time)
-                continue
-            else:
-                # Последняя попытка - пробрасываем ошибку
-                logger.error(f"Ошибка API после {max_retries} попыток: {e}")
-                raise
-
 
 def _empty_event_rank_stats_row(rank: str, tournaments_count: int = 0) -> dict:
     return {
@@ -160,8 +154,6 @@ def _empty_event_rank_stats_row(rank: str, tournaments_count: int = 0) -> dict:
         'participants_unique': 0,
         'free_total': 0,
         'free_unique': 0,
-        '_unique_set': set(),
-        '_free_unique_set': set(),
     }
 
 
@@ -170,28 +162,7 @@ def _finalize_event_rank_stats_table(stats: dict):
     remaining = sorted([r for r in stats.keys() if r not in ordered_ranks])
     ordered_ranks.extend(remaining)
 
-    result = []
-    for rank in ordered_ranks:
-        if rank not in stats:
-            result.append({
-                'rank': rank,
-                'tournaments_count': 0,
-                'participants_total': 0,
-                'participants_unique': 0,
-                'free_total': 0,
-                'free_unique': 0,
-            })
-            continue
-        row_stats = stats[rank]
-        result.append({
-            'rank': rank,
-            'tournaments_count': row_stats['tournaments_count'],
-            'participants_total': row_stats['participants_total'],
-            'participants_unique': len(row_stats['_unique_set']),
-            'free_total': row_stats['free_total'],
-            'free_unique': len(row_stats['_free_unique_set']),
-        })
-    return result
+    return [stats.get(rank) or _empty_event_rank_stats_row(rank) for rank in ordered_ranks]
 
 
 def _is_ms_kms_normalized_category(normalized_name) -> bool:
@@ -205,100 +176,98 @@ def get_event_rank_statistics_data():
     """Статистика по рангам турниров (для админки и Google Sheets).
 
     Возвращает два набора строк: без разрядов МС/КМС (как в аналитике) и со всеми разрядами.
+    Участия берутся из колоночного снимка services.participation_frame.
     """
     with app.app_context():
         events = db.session.query(Event.id, Event.event_rank).all()
+        frame = get_participation_frame()
+
+    def _event_rank_label(event_rank):
+        return (event_rank or '').strip() or UNASSIGNED_EVENT_RANK
+
+    rank_to_event_ids = {}
+    for event_id, event_rank in events:
+        rank_to_event_ids.setdefault(_event_rank_label(event_rank), set()).add(event_id)
+
+    rank_codes, rank_labels = relabel(frame.event_rank_code, frame.event_rank_labels, _event_rank_label)
+    n_ranks = len(rank_labels)
+    is_free = frame.free_mask()
+    has_athlete = frame.athlete_id != NO_VALUE
+    # Участия без категории остаются в наборе «без МС/КМС», как и раньше
+    not_ms_kms = ~codes_where(frame.rank_code, frame.rank_labels, _is_ms_kms_normalized_category)
+
+    def _stats_table(mask):
+        totals = group_count(rank_codes, n_ranks, mask)
+        free_totals = group_count(rank_codes, n_ranks, mask & is_free)
+        unique = distinct_count(rank_codes, frame.athlete_id, n_ranks, mask & has_athlete)
+        free_unique = distinct_count(rank_codes, frame.athlete_id, n_ranks, mask & has_athlete & is_free)
+        stats = {
+            rank: _empty_event_rank_stats_row(rank, len(event_ids))
+            for rank, event_ids in rank_to_event_ids.items()
+        }
+        for code, rank in enumerate(rank_labels):
+            row = stats.setdefault(rank, _empty_event_rank_stats_row(rank, 0))
+            row['participants_total'] = int(totals[code])
+            row['participants_unique'] = int(unique[code])
+            row['free_total'] = int(free_totals[code])
+            row['free_unique'] = int(free_unique[code])
+        rows = _finalize_event_rank_stats_table(stats)
+        footer = {
+            'tournaments_count': len(events),
+            'participants_total': sum(r['participants_total'] for r in rows),
+            'participants_unique': count_distinct(frame.athlete_id, mask & has_athlete),
+            'free_total': sum(r['free_total'] for r in rows),
+            'free_unique': count_distinct(frame.athlete_id, mask & has_athlete & is_free),
+        }
+        return rows, footer
 
-        rank_to_event_ids = {}
-        for event_id, event_rank in events:
-            rank = (event_rank or '').strip() or UNASSIGNED_EVENT_RANK
-            rank_to_event_ids.setdefault(rank, set()).add(event_id)
+    result_full, totals_full = _stats_table(np.ones(len(frame), dtype=bool))
+    result_filtered, totals_filtered = _stats_table(not_ms_kms)
+    return {
+        'without_ms_kms': result_filtered,
+        'with_ms_kms': result_full,
+        'totals_without_ms_kms': totals_filtered,
+        'totals_with_ms_kms': totals_full,
+    }
 
-        stats_full: dict = {}
-        stats_filtered: dict = {}
-        for rank, event_ids in rank_to_event_ids.items():
-            tc = len(event_ids)
-            stats_full[rank] = _empty_event_rank_stats_row(rank, tc)
-            stats_filtered[rank] = _empty_event_rank_stats_row(rank, tc)
+def _athlete_name(row):
+    return row.full_name_xml or f"{row.last_name} {row.first_name}"
 
-        athletes_all: set = set()
-        athletes_free_all: set = set()
-        athletes_filtered: set = set()
-        athletes_free_filtered: set = set()
 
-        participant_rows = db.session.query(
-            Participant.event_id,
-            Participant.athlete_id,
-            Participant.pct_ppname,
-            Participant.exclude_free_from_reports,
-            Event.exclude_free_from_reports,
-            Event.event_rank,
-            Category.normalized_name,
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).outerjoin(
-            Category, Participant.category_id == Category.id
-        ).all()
+def _gender_label(gender):
+    return 'Ж' if gender == 'F' else 'М' if gender == 'M' else 'Пара' if gender == 'P' else '-'
 
-        for (
-            _event_id,
-            athlete_id,
-            pct_ppname,
-            participant_excl,
-            event_excl,
-            event_rank,
-            category_normalized,
-        ) in participant_rows:
-            rank = (event_rank or '').strip() or UNASSIGNED_EVENT_RANK
-            for bucket in (stats_full, stats_filtered):
-                if rank not in bucket:
-                    bucket[rank] = _empty_event_rank_stats_row(rank, 0)
 
-            row_full = stats_full[rank]
-            row_full['participants_total'] += 1
-            if athlete_id is not None:
-                row_full['_unique_set'].add(athlete_id)
-                athletes_all.add(athlete_id)
-            is_free = _is_free_for_reports(pct_ppname, event_excl, participant_excl)
-            if is_free:
-                row_full['free_total'] += 1
-                if athlete_id is not None:
-                    row_full['_free_unique_set'].add(athlete_id)
-                    athletes_free_all.add(athlete_id)
+def _event_label(frame, event_id, is_free):
+    """(название, подпись) турнира для списков в листах; бесплатные помечаются [БЕСПЛАТНО]."""
+    event_name, event_date = frame.events.get(event_id, (None, None))
+    if not event_name:
+        return None, None
+    event_str = event_name
+    if event_date:
+        event_str += f" ({event_date.strftime('%d.%m.%Y')})"
+    if is_free:
+        event_str = f"[БЕСПЛАТНО] {event_str}"
+    return event_name, event_str
 
-            if _is_ms_kms_normalized_category(category_normalized):
-                continue
 
-            row_f = stats_filtered[rank]
-            row_f['participants_total'] += 1
-            if athlete_id is not None:
-                row_f['_unique_set'].add(athlete_id)
-                athletes_filtered.add(athlete_id)
-            if is_free:
-                row_f['free_total'] += 1
-                if athlete_id is not None:
-                    row_f['_free_unique_set'].add(athlete_id)
-                    athletes_free_filtered.add(athlete_id)
+def _empty_athlete_stats():
+    return {
+        'ranks': set(),
+        'events': set(),  # Турниры (с отметками бесплатных), без дубликатов
+        'free_events': set(),  # Отдельно бесплатные турниры
+        'participations': 0,
+        'free_participations': 0
+    }
 
-        result_filtered = _finalize_event_rank_stats_table(stats_filtered)
-        result_full = _finalize_event_rank_stats_table(stats_full)
-        total_events = len(events)
 
-        def _footer_rows(rows, athletes_u: set, athletes_free_u: set) -> dict:
-            return {
-                'tournaments_count': total_events,
-                'participants_total': sum(r['participants_total'] for r in rows),
-                'participants_unique': len(athletes_u),
-                'free_total': sum(r['free_total'] for r in rows),
-                'free_unique': len(athletes_free_u),
-            }
+def _count_by(values, mask=None):
+    """{значение: число строк} по колонке фрейма (только строки mask, если задан)."""
+    if mask is not None:
+        values = values[mask]
+    keys, counts = np.unique(values, return_counts=True)
+    return dict(zip(keys.tolist(), counts.tolist()))
 
-        return {
-            'without_ms_kms': result_filtered,
-            'with_ms_kms': result_full,
-            'totals_without_ms_kms': _footer_rows(result_filtered, athletes_filtered, athletes_free_filtered),
-            'totals_with_ms_kms': _footer_rows(result_full, athletes_all, athletes_free_all),
-        }
 
 def get_athletes_data():
     """Получает данные всех спортсменов из БД, сгруппированные по разрядам (без МС и КМС)"""
@@ -315,10 +284,57 @@ def get_athletes_data():
         'КМС, Танцы'
     }
     
+    # Вес разряда для выбора самого высокого
+    rank_weights = {
+        'МС': 1, 'КМС': 2,
+        '1 Спортивный': 3, '2 Спортивный': 4, '3 Спортивный': 5,
+        '1 Юношеский': 6, '2 Юношеский': 7, '3 Юношеский': 8,
+        'Юный Фигурист': 9, 'Дебют': 10, 'Новичок': 11
+    }
+    
+    def get_rank_weight(rank):
+        base_rank = rank.split(',')[0].strip()
+        return rank_weights.get(base_rank, 99)
+    
     with app.app_context():
-        from models import Event
-        
-        # Получаем всех спортсменов с их данными (исключаем МС и КМС)
+        frame = get_participation_frame()
+        # Строки участий без МС и КМС; участия считаются только с категорией,
+        # бесплатные — ещё и с турниром, не исключённым из отчётов
+        kept = ~codes_where(frame.rank_code, frame.rank_labels, lambda label: label in excluded_ranks)
+        counted = kept & frame.has_category
+        free_counted = counted & frame.free_mask()
+        # Пометка [БЕСПЛАТНО] в списке турниров — без учёта исключения отдельного участия
+        free_marked = frame.free_mask(respect_participant_flag=False)
+        athletes_with_participations = set(np.unique(frame.athlete_id).tolist())
+
+        stats_by_athlete = {}
+        rows = zip(
+            frame.athlete_id[kept].tolist(),
+            frame.event_id[kept].tolist(),
+            frame.rank_code[kept].tolist(),
+            counted[kept].tolist(),
+            free_counted[kept].tolist(),
+            free_marked[kept].tolist(),
+        )
+        for athlete_id, event_id, rank_code, is_counted, is_free, is_marked in rows:
+            stats = stats_by_athlete.get(athlete_id)
+            if stats is None:
+                stats = stats_by_athlete[athlete_id] = _empty_athlete_stats()
+            stats['participations'] += is_counted
+            stats['free_participations'] += is_free
+
+            # Добавляем разряд
+            rank = frame.rank_labels[rank_code] if rank_code != NO_VALUE else None
+            if rank:
+                stats['ranks'].add(rank)
+
+            # Добавляем турнир
+            event_name, event_str = _event_label(frame, event_id, is_marked)
+            if event_str:
+                if is_marked:
+                    stats['free_events'].add(event_name)
+                stats['events'].add(event_str)
+
         athletes_query = db.session.query(
             Athlete.id,
             Athlete.full_name_xml,
@@ -327,126 +343,43 @@ def get_athletes_data():
             Athlete.birth_date,
             Athlete.gender,
             Club.name.label('club_name'),
-            Category.normalized_name.label('rank'),
-            Event.name.label('event_name'),
-            Event.begin_date.label('event_date'),
-            Participant.pct_ppname.label('is_free'),
-            Event.exclude_free_from_reports.label('exclude_free_from_reports')
         ).outerjoin(
             Club, Athlete.club_id == Club.id
-        ).outerjoin(
-            Participant, Athlete.id == Participant.athlete_id
-        ).outerjoin(
-            Category, Participant.category_id == Category.id
-        ).outerjoin(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
+        ).order_by(Athlete.id)
+
         # Группируем по спортсменам
         athletes_dict = {}
-        
+
         for row in athletes_query:
-            athlete_id = row.id
-            
-            if athlete_id not in athletes_dict:
-                full_name = row.full_name_xml or f"{row.last_name} {row.first_name}"
-                
-                athletes_dict[athlete_id] = {
-                    'id': athlete_id,
-                    'name': full_name,
-                    'birth_date': row.birth_date.strftime('%d.%m.%Y') if row.birth_date else 'Не указана',
-                    'gender': 'Ж' if row.gender == 'F' else 'М' if row.gender == 'M' else 'Пара' if row.gender == 'P' else '-',
-                    'club': row.club_name or 'Не указан',
-                    'ranks': set(),
-                    'events': [],  # Список турниров (с отметками бесплатных)
-                    'free_events': set(),  # Отдельно бесплатные турниры
-                    'participations': 0,
-                    'free_participations': 0
-                }
-            
-            # Добавляем разряд
-            if row.rank:
-                athletes_dict[athlete_id]['ranks'].add(row.rank)
-            
-            # Добавляем турнир
-            if row.event_name:
-                # Форматируем дату турнира
-                event_str = row.event_name
-                if row.event_date:
-                    event_str += f" ({row.event_date.strftime('%d.%m.%Y')})"
-                
-                # Помечаем бесплатные турниры текстом [БЕСПЛАТНО] вместо эмодзи
-                is_free = _is_free_for_reports(row.is_free, row.exclude_free_from_reports)
-                if is_free:
-                    event_str = f"[БЕСПЛАТНО] {event_str}"
-                    athletes_dict[athlete_id]['free_events'].add(row.event_name)
-                
-                # Избегаем дубликатов
-                if event_str not in athletes_dict[athlete_id]['events']:
-                    athletes_dict[athlete_id]['events'].append(event_str)
-        
-        # Подсчитываем участия для каждого спортсмена (исключая МС и КМС)
-        for athlete_id in athletes_dict.keys():
-            # Всего участий (без МС и КМС)
-            total_participations = db.session.query(Participant).join(
-                Category, Participant.category_id == Category.id
-            ).filter(
-                Participant.athlete_id == athlete_id,
-                db.or_(
-                    Category.normalized_name.is_(None),
-                    Category.normalized_name.notin_(excluded_ranks)
-                )
-            ).count()
-            athletes_dict[athlete_id]['participations'] = total_participations
-            
-            # Бесплатных участий (без МС и КМС)
-            free_participations = db.session.query(Participant).join(
-                Category, Participant.category_id == Category.id
-            ).join(
-                Event, Participant.event_id == Event.id
-            ).filter(
-                Participant.athlete_id == athlete_id,
-                Participant.pct_ppname == 'БЕСП',
-                db.or_(Participant.exclude_free_from_reports.is_(False), Participant.exclude_free_from_reports.is_(None)),
-                db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None)),
-                db.or_(
-                    Category.normalized_name.is_(None),
-                    Category.normalized_name.notin_(excluded_ranks)
-                )
-            ).count()
-            athletes_dict[athlete_id]['free_participations'] = free_participations
-            
+            stats = stats_by_athlete.get(row.id)
+            if stats is None:
+                # Спортсмен только с участиями МС и КМС в лист не попадает
+                if row.id in athletes_with_participations:
+                    continue
+                stats = _empty_athlete_stats()
+            athletes_dict[row.id] = {
+                'id': row.id,
+                'name': _athlete_name(row),
+                'birth_date': row.birth_date.strftime('%d.%m.%Y') if row.birth_date else 'Не указана',
+                'gender': _gender_label(row.gender),
+                'club': row.club_name or 'Не указан',
+                **stats,
+            }
+        
+        for athlete in athletes_dict.values():
             # Берем самый высокий разряд
-            if athletes_dict[athlete_id]['ranks']:
-                # Сортируем разряды по весу
-                rank_weights = {
-                    'МС': 1, 'КМС': 2,
-                    '1 Спортивный': 3, '2 Спортивный': 4, '3 Спортивный': 5,
-                    '1 Юношеский': 6, '2 Юношеский': 7, '3 Юношеский': 8,
-                    'Юный Фигурист': 9, 'Дебют': 10, 'Новичок': 11
-                }
-                
-                def get_rank_weight(rank):
-                    base_rank = rank.split(',')[0].strip()
-                    return rank_weights.get(base_rank, 99)
-                
-                best_rank = min(athletes_dict[athlete_id]['ranks'], key=get_rank_weight)
-                athletes_dict[athlete_id]['rank'] = best_rank
+            if athlete['ranks']:
+                athlete['rank'] = min(athlete['ranks'], key=get_rank_weight)
             else:
-                athletes_dict[athlete_id]['rank'] = 'Без разряда'
+                athlete['rank'] = 'Без разряда'
             
             # Форматируем список турниров (через перенос строки для Google Sheets)
-            if athletes_dict[athlete_id]['events']:
+            if athlete['events']:
                 # Сортируем: сначала бесплатные ([БЕСПЛАТНО]), потом остальные
-                events_sorted = sorted(athletes_dict[athlete_id]['events'], key=lambda x: (not x.startswith('[БЕСПЛАТНО]'), x))
-                athletes_dict[athlete_id]['events_str'] = '\n'.join(events_sorted)
+                events_sorted = sorted(athlete['events'], key=lambda x: (not x.startswith('[БЕСПЛАТНО]'), x))
+                athlete['events_str'] = '\n'.join(events_sorted)
             else:
-                athletes_dict[athlete_id]['events_str'] = '-'
+                athlete['events_str'] = '-'
         
         # Группируем по разрядам
         by_rank = {}
@@ -469,144 +402,81 @@ def get_schools_analysis_data():
     """Получает анализ по школам: статистика и список спортсменов"""
     
     with app.app_context():
-        from models import Event
-        
-        # Получаем все школы с их спортсменами
-        schools_query = db.session.query(
-            Club.id,
-            Club.name,
-            Athlete.id.label('athlete_id'),
+        frame = get_participation_frame()
+        free = frame.free_mask()
+        participations_by_athlete = _count_by(frame.athlete_id)
+        free_by_athlete = _count_by(frame.athlete_id, free)
+        participations_by_club = _count_by(frame.club_id)
+        free_by_club = _count_by(frame.club_id, free)
+
+        # Разряд спортсмена в листе — категория его первого участия
+        athlete_groups, athlete_keys = group_index(frame.athlete_id)
+        groups, first_rows = first_occurrence(athlete_groups, frame.participant_id)
+        first_rank_code = dict(zip(athlete_keys[groups].tolist(), frame.rank_code[first_rows].tolist()))
+
+        # Турниры спортсменов школ в порядке участий (с отметками бесплатных)
+        events_by_athlete = {}
+        has_club = frame.club_id != NO_VALUE
+        rows = zip(frame.athlete_id[has_club].tolist(), frame.event_id[has_club].tolist(), free[has_club].tolist())
+        for athlete_id, event_id, is_free in rows:
+            event_name, event_str = _event_label(frame, event_id, is_free)
+            if not event_str:
+                continue
+            events, free_events = events_by_athlete.setdefault(athlete_id, ([], set()))
+            if is_free:
+                free_events.add(event_name)
+            # Избегаем дубликатов
+            if event_str not in events:
+                events.append(event_str)
+
+        # Группируем по школам
+        schools_dict = {}
+
+        for club_id, club_name in db.session.query(Club.id, Club.name).order_by(Club.name, Club.id):
+            total_participations = participations_by_club.get(club_id, 0)
+            free_participations = free_by_club.get(club_id, 0)
+            schools_dict[club_id] = {
+                'name': club_name or 'Без школы',
+                'athletes': {},
+                'total_athletes': 0,
+                'total_participations': total_participations,
+                'free_participations': free_participations,
+                'paid_participations': total_participations - free_participations
+            }
+
+        athletes_query = db.session.query(
+            Athlete.id,
+            Athlete.club_id,
             Athlete.full_name_xml,
             Athlete.first_name,
             Athlete.last_name,
             Athlete.birth_date,
             Athlete.gender,
-            Category.normalized_name.label('rank'),
-            Event.name.label('event_name'),
-            Event.begin_date.label('event_date'),
-            Participant.pct_ppname.label('is_free'),
-            Event.exclude_free_from_reports.label('exclude_free_from_reports'),
-            Participant.exclude_free_from_reports.label('participant_exclude_free_from_reports')
-        ).outerjoin(
-            Athlete, Club.id == Athlete.club_id
-        ).outerjoin(
-            Participant, Athlete.id == Participant.athlete_id
-        ).outerjoin(
-            Category, Participant.category_id == Category.id
-        ).outerjoin(
-            Event, Participant.event_id == Event.id
-        ).all()
-        
-        # Группируем по школам
-        schools_dict = {}
-        
-        for row in schools_query:
-            club_id = row.id
-            club_name = row.name or 'Без школы'
-            
-            if club_id not in schools_dict:
-                schools_dict[club_id] = {
-                    'name': club_name,
-                    'athletes': {},
-                    'total_athletes': 0,
-                    'total_participations': 0,
-                    'free_participations': 0,
-                    'paid_participations': 0
-                }
-            
-            # Добавляем спортсмена
-            athlete_id = row.athlete_id
-            if athlete_id and athlete_id not in schools_dict[club_id]['athletes']:
-                full_name = row.full_name_xml or f"{row.last_name} {row.first_name}"
-                
-                schools_dict[club_id]['athletes'][athlete_id] = {
-                    'name': full_name,
-                    'birth_date': row.birth_date.strftime('%d.%m.%Y') if row.birth_date else '-',
-                    'gender': 'Ж' if row.gender == 'F' else 'М' if row.gender == 'M' else 'Пара' if row.gender == 'P' else '-',
-                    'rank': row.rank or 'Без разряда',
-                    'events': [],  # Список турниров (с отметками бесплатных)
-                    'free_events': set(),  # Отдельно бесплатные турниры
-                    'participations': 0,
-                    'free_participations': 0
-                }
-            
-            # Добавляем турнир
-            if athlete_id and row.event_name:
-                event_str = row.event_name
-                if row.event_date:
-                    event_str += f" ({row.event_date.strftime('%d.%m.%Y')})"
-                
-                # Помечаем бесплатные турниры текстом [БЕСПЛАТНО] вместо эмодзи
-                is_free = _is_free_for_reports(
-                    row.is_free,
-                    row.exclude_free_from_reports,
-                    getattr(row, 'participant_exclude_free_from_reports', False)
-                )
-                if is_free:
-                    event_str = f"[БЕСПЛАТНО] {event_str}"
-                    schools_dict[club_id]['athletes'][athlete_id]['free_events'].add(row.event_name)
-                
-                # Избегаем дубликатов
-                if event_str not in schools_dict[club_id]['athletes'][athlete_id]['events']:
-                    schools_dict[club_id]['athletes'][athlete_id]['events'].append(event_str)
-        
-        # Подсчитываем статистику для каждой школы и каждого спортсмена
-        for club_id in schools_dict.keys():
-            club = Club.query.get(club_id)
-            if club:
-                # Количество спортсменов
-                athlete_count = Athlete.query.filter_by(club_id=club_id).count()
-                schools_dict[club_id]['total_athletes'] = athlete_count
-                
-                # Получаем всех спортсменов школы
-                athletes = Athlete.query.filter_by(club_id=club_id).all()
-                athlete_ids = [a.id for a in athletes]
-                
-                # Всего участий
-                total_participations = Participant.query.filter(
-                    Participant.athlete_id.in_(athlete_ids)
-                ).count()
-                schools_dict[club_id]['total_participations'] = total_participations
-                
-                # Бесплатных участий
-                free_participations = Participant.query.filter(
-                    Participant.athlete_id.in_(athlete_ids),
-                    Participant.pct_ppname == 'БЕСП',
-                    db.or_(Participant.exclude_free_from_reports.is_(False), Participant.exclude_free_from_reports.is_(None))
-                ).join(
-                    Event, Participant.event_id == Event.id
-                ).filter(
-                    db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None))
-                ).count()
-                schools_dict[club_id]['free_participations'] = free_participations
-                
-                # Платных участий
-                schools_dict[club_id]['paid_participations'] = total_participations - free_participations
-                
-                # Подсчитываем статистику для КАЖДОГО спортсмена
-                for athlete_id in schools_dict[club_id]['athletes'].keys():
-                    # Всего участий спортсмена
-                    athlete_participations = Participant.query.filter_by(athlete_id=athlete_id).count()
-                    schools_dict[club_id]['athletes'][athlete_id]['participations'] = athlete_participations
-                    
-                    # Бесплатных участий спортсмена
-                    athlete_free = Participant.query.filter_by(
-                        athlete_id=athlete_id
-                    ).join(
-                        Event, Participant.event_id == Event.id
-                    ).filter(
-                        Participant.pct_ppname == 'БЕСП',
-                        db.or_(Participant.exclude_free_from_reports.is_(False), Participant.exclude_free_from_reports.is_(None)),
-                        db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None))
-                    ).count()
-                    schools_dict[club_id]['athletes'][athlete_id]['free_participations'] = athlete_free
-                    
-                    # Форматируем список турниров (бесплатные [БЕСПЛАТНО] в начале)
-                    if schools_dict[club_id]['athletes'][athlete_id]['events']:
-                        events_sorted = sorted(schools_dict[club_id]['athletes'][athlete_id]['events'], key=lambda x: (not x.startswith('[БЕСПЛАТНО]'), x))
-                        schools_dict[club_id]['athletes'][athlete_id]['events_str'] = '\n'.join(events_sorted)
-                    else:
-                        schools_dict[club_id]['athletes'][athlete_id]['events_str'] = '-'
+        ).filter(Athlete.club_id.isnot(None)).order_by(Athlete.id)
+
+        for row in athletes_query:
+            school = schools_dict.get(row.club_id)
+            if school is None:
+                continue
+            school['total_athletes'] += 1
+            rank_code = first_rank_code.get(row.id, NO_VALUE)
+            events, free_events = events_by_athlete.get(row.id, ([], set()))
+            # Форматируем список турниров (бесплатные [БЕСПЛАТНО] в начале)
+            if events:
+                events_str = '\n'.join(sorted(events, key=lambda x: (not x.startswith('[БЕСПЛАТНО]'), x)))
+            else:
+                events_str = '-'
+            school['athletes'][row.id] = {
+                'name': _athlete_name(row),
+                'birth_date': row.birth_date.strftime('%d.%m.%Y') if row.birth_date else '-',
+                'gender': _gender_label(row.gender),
+                'rank': (frame.rank_labels[rank_code] if rank_code != NO_VALUE else None) or 'Без разряда',
+                'events': events,  # Список турниров (с отметками бесплатных)
+                'free_events': free_events,  # Отдельно бесплатные турниры
+                'participations': participations_by_athlete.get(row.id, 0),
+                'free_participations': free_by_athlete.get(row.id, 0),
+                'events_str': events_str,
+            }
         
         # Сортируем школы по количеству спортсменов (по убыванию)
         sorted_schools = sorted(
@@ -617,6 +487,34 @@ def get_schools_analysis_data():
         
         return sorted_schools
 
+# Типы участников по названию разряда (как в листах 4/7)
+PARTICIPATION_TYPES = ('boys', 'girls', 'pairs', 'dances')
+
+
+def _participation_type(rank):
+    """Индекс в PARTICIPATION_TYPES по названию разряда или -1, если тип не определён."""
+    rank_lower = (rank or 'Без разряда').strip().lower()
+    if 'танц' in rank_lower:
+        return PARTICIPATION_TYPES.index('dances')
+    if 'пар' in rank_lower:
+        return PARTICIPATION_TYPES.index('pairs')
+    if 'девочк' in rank_lower or 'девуш' in rank_lower or 'женщин' in rank_lower:
+        return PARTICIPATION_TYPES.index('girls')
+    if 'мальчик' in rank_lower or 'юнош' in rank_lower or 'мужчин' in rank_lower:
+        return PARTICIPATION_TYPES.index('boys')
+    return -1
+
+
+def _participation_type_codes(frame):
+    """Тип каждого участия (индекс в PARTICIPATION_TYPES, -1 — не определён)."""
+    # Тип считается один раз на подпись разряда; последний элемент — для участий без normalized_name (код -1)
+    lookup = np.array(
+        [_participation_type(rank) for rank in frame.rank_labels] + [_participation_type(None)],
+        dtype=np.int32,
+    )
+    return lookup[frame.rank_code]
+
+
 def get_general_statistics_data():
     """Получает общую статистику: количество турниров и участников по типам
     Использует ту же логику подсчета, что и в листах 4/7"""
@@ -634,96 +532,31 @@ def get_general_statistics_data():
     }
     
     with app.app_context():
-        from models import Event, Category
-        
         # Подсчитываем общее количество турниров
         total_events = Event.query.count()
-        
-        # Получаем всех участников с их категориями (исключая МС и КМС)
-        # Используем ту же логику, что в get_events_report_data()
-        participants_query = db.session.query(
-            Participant.athlete_id,
-            Participant.pct_ppname,
-            Event.exclude_free_from_reports,
-            Category.normalized_name.label('rank')
-        ).join(
-            Category, Participant.category_id == Category.id
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
-        # Счетчики для уникальных участников по типам
-        boys_athletes = set()  # Мальчики
-        girls_athletes = set()  # Девочки
-        pairs_athletes = set()  # Пары
-        dances_athletes = set()  # Танцы
-        
-        # Счетчики для бесплатных участников по типам
-        boys_free = set()
-        girls_free = set()
-        pairs_free = set()
-        dances_free = set()
-        
-        # Общее множество всех уникальных спортсменов (для правильного итога)
-        all_unique_athletes = set()
-        all_unique_free = set()
-        
-        for row in participants_query:
-            athlete_id = row.athlete_id
-            rank_name = (row.rank or 'Без разряда').strip()
-            is_free = _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-            
-            # Добавляем в общее множество уникальных спортсменов
-            all_unique_athletes.add(athlete_id)
-            if is_free:
-                all_unique_free.add(athlete_id)
-            
-            # Определяем тип участника по названию разряда (как в листах 4/7)
-            rank_lower = rank_name.lower()
-            
-            if 'танц' in rank_lower:
-                dances_athletes.add(athlete_id)
-                if is_free:
-                    dances_free.add(athlete_id)
-            elif 'пар' in rank_lower:
-                pairs_athletes.add(athlete_id)
-                if is_free:
-                    pairs_free.add(athlete_id)
-            elif 'девочк' in rank_lower or 'девуш' in rank_lower or 'женщин' in rank_lower:
-                girls_athletes.add(athlete_id)
-                if is_free:
-                    girls_free.add(athlete_id)
-            elif 'мальчик' in rank_lower or 'юнош' in rank_lower or 'мужчин' in rank_lower:
-                boys_athletes.add(athlete_id)
-                if is_free:
-                    boys_free.add(athlete_id)
-        
-        return {
-            'total_events': total_events,
-            'boys': {
-                'total': len(boys_athletes),
-                'free': len(boys_free)
-            },
-            'girls': {
-                'total': len(girls_athletes),
-                'free': len(girls_free)
-            },
-            'pairs': {
-                'total': len(pairs_athletes),
-                'free': len(pairs_free)
-            },
-            'dances': {
-                'total': len(dances_athletes),
-                'free': len(dances_free)
-            },
-            'total_unique_athletes': len(all_unique_athletes),  # Общее количество уникальных спортсменов
-            'total_unique_free': len(all_unique_free)  # Общее количество уникальных бесплатных
+        frame = get_participation_frame()
+    
+    # Участия с категорией, без МС и КМС (как в get_events_report_data())
+    mask = frame.rank_allowed_mask(excluded_ranks)
+    is_free = frame.free_mask(respect_participant_flag=False)
+    type_codes = _participation_type_codes(frame)
+    typed = mask & (type_codes >= 0)
+    n_types = len(PARTICIPATION_TYPES)
+    
+    # Уникальные спортсмены по типам и среди них — с бесплатным участием
+    unique_by_type = distinct_count(type_codes, frame.athlete_id, n_types, typed)
+    free_by_type = distinct_count(type_codes, frame.athlete_id, n_types, typed & is_free)
+    
+    result = {'total_events': total_events}
+    for code, type_key in enumerate(PARTICIPATION_TYPES):
+        result[type_key] = {
+            'total': int(unique_by_type[code]),
+            'free': int(free_by_type[code])
         }
+    # Общее количество уникальных спортсменов (для правильного итога, включая неопределённый тип)
+    result['total_unique_athletes'] = count_distinct(frame.athlete_id, mask)
+    result['total_unique_free'] = count_distinct(frame.athlete_id, mask & is_free)
+    return result
 
 def get_participations_statistics_data():
     """Получает статистику по участиям: количество участий (не уникальных спортсменов)
@@ -742,82 +575,25 @@ def get_participations_statistics_data():
     }
     
     with app.app_context():
-        from models import Event, Category
-        
-        # Получаем все участия с их категориями (исключая МС и КМС)
-        participants_query = db.session.query(
-            Participant.id,
-            Participant.pct_ppname,
-            Event.exclude_free_from_reports,
-            Category.normalized_name.label('rank')
-        ).join(
-            Category, Participant.category_id == Category.id
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
-        # Счетчики для участий по типам (считаем все участия, не уникальных спортсменов)
-        boys_count = 0  # Мальчики
-        girls_count = 0  # Девочки
-        pairs_count = 0  # Пары
-        dances_count = 0  # Танцы
-        
-        # Счетчики для бесплатных участий по типам
-        boys_free_count = 0
-        girls_free_count = 0
-        pairs_free_count = 0
-        dances_free_count = 0
-        
-        for row in participants_query:
-            rank_name = (row.rank or 'Без разряда').strip()
-            is_free = _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-            
-            # Определяем тип участия по названию разряда (как в листах 4/7)
-            rank_lower = rank_name.lower()
-            
-            if 'танц' in rank_lower:
-                dances_count += 1
-                if is_free:
-                    dances_free_count += 1
-            elif 'пар' in rank_lower:
-                pairs_count += 1
-                if is_free:
-                    pairs_free_count += 1
-            elif 'девочк' in rank_lower or 'девуш' in rank_lower or 'женщин' in rank_lower:
-                girls_count += 1
-                if is_free:
-                    girls_free_count += 1
-            elif 'мальчик' in rank_lower or 'юнош' in rank_lower or 'мужчин' in rank_lower:
-                boys_count += 1
-                if is_free:
-                    boys_free_count += 1
-        
-        total_participations = boys_count + girls_count + pairs_count + dances_count
-        
-        return {
-            'total_participations': total_participations,
-            'boys': {
-                'total': boys_count,
-                'free': boys_free_count
-            },
-            'girls': {
-                'total': girls_count,
-                'free': girls_free_count
-            },
-            'pairs': {
-                'total': pairs_count,
-                'free': pairs_free_count
-            },
-            'dances': {
-                'total': dances_count,
-                'free': dances_free_count
-            }
+        frame = get_participation_frame()
+    
+    # Все участия с категорией, без МС и КМС (считаем участия, не уникальных спортсменов)
+    mask = frame.rank_allowed_mask(excluded_ranks)
+    is_free = frame.free_mask(respect_participant_flag=False)
+    type_codes = _participation_type_codes(frame)
+    typed = mask & (type_codes >= 0)
+    n_types = len(PARTICIPATION_TYPES)
+    
+    counts = group_count(type_codes, n_types, typed)
+    free_counts = group_count(type_codes, n_types, typed & is_free)
+    
+    result = {'total_participations': int(counts.sum())}
+    for code, type_key in enumerate(PARTICIPATION_TYPES):
+        result[type_key] = {
+            'total': int(counts[code]),
+            'free': int(free_counts[code])
         }
+    return result
 
 def get_summary_statistics_data():
     """Получает сводную статистику для нового листа 'сводная статистика'
@@ -844,156 +620,89 @@ def get_summary_statistics_data():
     }
     
     with app.app_context():
-        from models import Event, Category
-        
-        # Получаем все участия с их категориями (исключая МС и КМС)
-        participants_query = db.session.query(
-            Participant.id,
-            Participant.athlete_id,
-            Participant.pct_ppname,
-            Event.exclude_free_from_reports,
-            Category.normalized_name.label('rank')
-        ).join(
-            Category, Participant.category_id == Category.id
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
-        # 1. Общее количество участий (не уникальных) - как лист 5
-        total_participations = len(participants_query)
-        total_free_participations = sum(
-            1 for row in participants_query if _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-        )
-        total_paid_participations = total_participations - total_free_participations
-        
-        # 2. Общее количество уникальных участий - как лист 4
-        unique_athletes = set()
-        unique_free_athletes = set()
-        unique_paid_athletes = set()
-        
-        for row in participants_query:
-            athlete_id = row.athlete_id
-            is_free = _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-            unique_athletes.add(athlete_id)
-            if is_free:
-                unique_free_athletes.add(athlete_id)
-            else:
-                unique_paid_athletes.add(athlete_id)
-        
-        total_unique_athletes = len(unique_athletes)
-        total_unique_free = len(unique_free_athletes)
-        total_unique_paid = len(unique_paid_athletes)
-        
-        # 3. Количество уникальных участий по каждому разряду с разделением платно/бесплатно
-        # ВАЖНО: один спортсмен может участвовать и платно, и бесплатно в одном разряде
-        # Поэтому сначала собираем информацию о каждом спортсмене, затем определяем категорию
-        rank_athlete_participations = {}  # {rank: {athlete_id: {'has_free': bool, 'has_paid': bool}}}
-        
-        for row in participants_query:
-            rank_name = (row.rank or 'Без разряда').strip()
-            athlete_id = row.athlete_id
-            is_free = _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-            
-            if rank_name not in rank_athlete_participations:
-                rank_athlete_participations[rank_name] = {}
-            
-            if athlete_id not in rank_athlete_participations[rank_name]:
-                rank_athlete_participations[rank_name][athlete_id] = {
-                    'has_free': False,
-                    'has_paid': False
-                }
-            
-            if is_free:
-                rank_athlete_participations[rank_name][athlete_id]['has_free'] = True
-            else:
-                rank_athlete_participations[rank_name][athlete_id]['has_paid'] = True
-        
-        # Теперь определяем категории и считаем
-        rank_unique_counts = {}
-        for rank, athletes_dict in rank_athlete_participations.items():
-            free_only = set()  # Только бесплатно
-            paid_only = set()  # Только платно
-            both = set()       # И платно, и бесплатно
-            
-            for athlete_id, participation_info in athletes_dict.items():
-                has_free = participation_info['has_free']
-                has_paid = participation_info['has_paid']
-                
-                if has_free and has_paid:
-                    both.add(athlete_id)
-                elif has_free:
-                    free_only.add(athlete_id)
-                elif has_paid:
-                    paid_only.add(athlete_id)
-            
+        frame = get_participation_frame()
+    
+    # Все участия с категорией, без МС и КМС
+    mask = frame.rank_allowed_mask(excluded_ranks)
+    athlete_ids = frame.athlete_id[mask]
+    is_free = frame.free_mask(respect_participant_flag=False)[mask]
+    rank_codes, rank_labels = relabel(
+        frame.rank_code, frame.rank_labels, lambda rank: (rank or 'Без разряда').strip()
+    )
+    rank_codes = rank_codes[mask]
+    
+    # 1. Общее количество участий (не уникальных) - как лист 5
+    total_participations = int(mask.sum())
+    total_free_participations = int(is_free.sum())
+    total_paid_participations = total_participations - total_free_participations
+    
+    # 2. Общее количество уникальных участий - как лист 4
+    total_unique_athletes = count_distinct(athlete_ids)
+    total_unique_free = count_distinct(athlete_ids, is_free)
+    total_unique_paid = count_distinct(athlete_ids, ~is_free)
+    
+    # Пары (спортсмен, разряд): сколько у каждой бесплатных и платных участий
+    pairs, pair_keys = group_index(rank_codes, athlete_ids)
+    n_pairs = len(pair_keys)
+    pair_rank = pair_keys[:, 0] if n_pairs else np.zeros(0, dtype=np.int64)
+    pair_free = group_count(pairs, n_pairs, is_free)
+    pair_paid = group_count(pairs, n_pairs, ~is_free)
+    n_ranks = len(rank_labels)
+    
+    def _per_rank(pair_mask):
+        return np.bincount(pair_rank[pair_mask], minlength=n_ranks)
+    
+    # 3. Количество уникальных участий по каждому разряду с разделением платно/бесплатно
+    # ВАЖНО: один спортсмен может участвовать и платно, и бесплатно в одном разряде
+    has_free = pair_free > 0
+    has_paid = pair_paid > 0
+    free_only = _per_rank(has_free & ~has_paid)  # Только бесплатно
+    paid_only = _per_rank(has_paid & ~has_free)  # Только платно
+    both = _per_rank(has_free & has_paid)        # И платно, и бесплатно
+    
+    # 4. Количество бесплатных участий по каждому разряду с процентами тех, кто выступал >1 раза
+    # 5. Количество платных участий по каждому разряду с процентами тех, кто выступал >1 раза
+    free_total = _per_rank(has_free)
+    free_multiple = _per_rank(pair_free > 1)
+    paid_total = _per_rank(has_paid)
+    paid_multiple = _per_rank(pair_paid > 1)
+    
+    rank_unique_counts = {}
+    rank_free_stats = {}  # {rank: {'total': count, 'multiple': count}}
+    rank_paid_stats = {}  # {rank: {'total': count, 'multiple': count}}
+    for code, rank in enumerate(rank_labels):
+        total_unique = int(free_only[code] + paid_only[code] + both[code])
+        if total_unique:
             # Для отображения: "Платно" = только платно + смешанные, "Бесплатно" = только бесплатно + смешанные
             # "Всего" = все уникальные спортсмены
-            total_unique = len(free_only) + len(paid_only) + len(both)
             rank_unique_counts[rank] = {
-                'free': len(free_only) + len(both),  # Участвовали бесплатно (включая тех, кто и платно тоже)
-                'paid': len(paid_only) + len(both),  # Участвовали платно (включая тех, кто и бесплатно тоже)
-                'total': total_unique,                # Всего уникальных спортсменов
-                'free_only': len(free_only),          # Только бесплатно
-                'paid_only': len(paid_only),         # Только платно
-                'both': len(both)                     # И платно, и бесплатно
+                'free': int(free_only[code] + both[code]),  # Участвовали бесплатно (включая тех, кто и платно тоже)
+                'paid': int(paid_only[code] + both[code]),  # Участвовали платно (включая тех, кто и бесплатно тоже)
+                'total': total_unique,                       # Всего уникальных спортсменов
+                'free_only': int(free_only[code]),           # Только бесплатно
+                'paid_only': int(paid_only[code]),           # Только платно
+                'both': int(both[code])                      # И платно, и бесплатно
             }
-        
-        # 4. Количество бесплатных участий по каждому разряду с процентами тех, кто выступал >1 раза
-        # 5. Количество платных участий по каждому разряду с процентами тех, кто выступал >1 раза
-        rank_free_stats = {}  # {rank: {'total': count, 'multiple': count}}
-        rank_paid_stats = {}  # {rank: {'total': count, 'multiple': count}}
-        
-        # Подсчитываем для каждого спортсмена количество бесплатных и платных участий по разрядам
-        athlete_rank_free = {}  # {(athlete_id, rank): count}
-        athlete_rank_paid = {}  # {(athlete_id, rank): count}
-        
-        for row in participants_query:
-            rank_name = (row.rank or 'Без разряда').strip()
-            athlete_id = row.athlete_id
-            is_free = _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports)
-            
-            key = (athlete_id, rank_name)
-            
-            if is_free:
-                athlete_rank_free[key] = athlete_rank_free.get(key, 0) + 1
-            else:
-                athlete_rank_paid[key] = athlete_rank_paid.get(key, 0) + 1
-        
-        # Подсчитываем статистику по разрядам
-        for (athlete_id, rank_name), count in athlete_rank_free.items():
-            if rank_name not in rank_free_stats:
-                rank_free_stats[rank_name] = {'total': 0, 'multiple': 0}
-            rank_free_stats[rank_name]['total'] += 1
-            if count > 1:
-                rank_free_stats[rank_name]['multiple'] += 1
-        
-        for (athlete_id, rank_name), count in athlete_rank_paid.items():
-            if rank_name not in rank_paid_stats:
-                rank_paid_stats[rank_name] = {'total': 0, 'multiple': 0}
-            rank_paid_stats[rank_name]['total'] += 1
-            if count > 1:
-                rank_paid_stats[rank_name]['multiple'] += 1
-        
-        return {
-            'total_participations': {
-                'total': total_participations,
-                'free': total_free_participations,
-                'paid': total_paid_participations
-            },
-            'total_unique_athletes': {
-                'total': total_unique_athletes,
-                'free': total_unique_free,
-                'paid': total_unique_paid
-            },
-            'rank_unique_counts': rank_unique_counts,
-            'rank_free_stats': rank_free_stats,
-            'rank_paid_stats': rank_paid_stats
-        }
+        if free_total[code]:
+            rank_free_stats[rank] = {'total': int(free_total[code]), 'multiple': int(free_multiple[code])}
+        if paid_total[code]:
+            rank_paid_stats[rank] = {'total': int(paid_total[code]), 'multiple': int(paid_multiple[code])}
+    
+    return {
+        'total_participations': {
+            'total': total_participations,
+            'free': total_free_participations,
+            'paid': total_paid_participations
+        },
+        'total_unique_athletes': {
+            'total': total_unique_athletes,
+            'free': total_unique_free,
+            'paid': total_unique_paid
+        },
+        'rank_unique_counts': rank_unique_counts,
+        'rank_free_stats': rank_free_stats,
+        'rank_paid_stats': rank_paid_stats
+    }
 
 
 def get_weekly_unique_athletes_growth():
@@ -1011,83 +720,55 @@ def get_weekly_unique_athletes_growth():
             'week_unique_free': int,      # из них хотя бы одно участие БЕСП за эту неделю
         }
     """
-    from collections import defaultdict as _dd
-
-    # (year, week) -> множества по неделе
-    week_to_all_athletes = _dd(set)   # все уникальные спортсмены за неделю
-    week_to_free_athletes = _dd(set)  # кто имел хотя бы одно БЕСП за неделю
-    week_to_events = _dd(set)         # id турниров с begin_date на этой неделе
-
     with app.app_context():
-        from models import Event, Category  # локальный импорт, как в других функциях
-
-        rows = (
-            db.session.query(
-                Participant.athlete_id,
-                Participant.pct_ppname,
-                Event.exclude_free_from_reports,
-                Event.id.label('event_id'),
-                Event.begin_date.label('event_date'),
-            )
-            .join(Event, Participant.event_id == Event.id)
-            .filter(
-                Event.begin_date.isnot(None),
-            )
-            .all()
-        )
+        frame = get_participation_frame()
+
+    # Только турниры с датой; неделя задаётся ординалом её понедельника (ординал 1 — понедельник)
+    dated = frame.event_date > 0
+    dates = frame.event_date[dated]
+    athlete_ids = frame.athlete_id[dated]
+    event_ids = frame.event_id[dated]
+    is_free = frame.free_mask(respect_participant_flag=False)[dated]
+    mondays = dates - (dates - 1) % 7
+
+    weeks, week_mondays = group_index(mondays)
+    n_weeks = len(week_mondays)
+    week_unique_total = distinct_count(weeks, athlete_ids, n_weeks)
+    week_unique_free = distinct_count(weeks, athlete_ids, n_weeks, is_free)
+    events_in_week = distinct_count(weeks, event_ids, n_weeks)
+
+    # Накопительно: неделя первого появления каждого спортсмена (и первого БЕСП)
+    def _cumulative_first_seen(athletes, athlete_weeks):
+        _, first_rows = first_occurrence(athletes, athlete_weeks)
+        return np.cumsum(np.bincount(athlete_weeks[first_rows], minlength=n_weeks))
+
+    total_unique = _cumulative_first_seen(athlete_ids, weeks)
+    total_free = _cumulative_first_seen(athlete_ids[is_free], weeks[is_free])
 
-    # Группируем по неделям
-    for row in rows:
-        d = row.event_date
-        if not d:
-            continue
-        iso_year, iso_week, _ = d.isocalendar()
-        key = (iso_year, iso_week)
-        week_to_all_athletes[key].add(row.athlete_id)
-        if _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports):
-            week_to_free_athletes[key].add(row.athlete_id)
-        week_to_events[key].add(row.event_id)
-
-    # Строим накопительную статистику
-    all_weeks = sorted(week_to_all_athletes.keys())
-    seen_athletes = set()
-    seen_free_athletes = set()
     result = []
     prev_total = 0
     prev_free_total = 0
-
-    for iso_year, iso_week in all_weeks:
-        key = (iso_year, iso_week)
-        current_set = week_to_all_athletes[key]
-        current_free_set = week_to_free_athletes.get(key, set())
-
-        seen_athletes |= current_set
-        seen_free_athletes |= current_free_set
-
-        total_unique = len(seen_athletes)
-        total_free = len(seen_free_athletes)
-
-        weekly_growth_total = total_unique - prev_total
-        weekly_growth_free = total_free - prev_free_total
-
-        prev_total = total_unique
-        prev_free_total = total_free
-
-        monday = date.fromisocalendar(iso_year, iso_week, 1)
+    for code, monday_ordinal in enumerate(week_mondays):
+        monday = date.fromordinal(int(monday_ordinal))
+        iso_year, iso_week, _ = monday.isocalendar()
+        week_total = int(total_unique[code])
+        week_free_total = int(total_free[code])
         result.append(
             {
                 'year': iso_year,
                 'week': iso_week,
                 'monday': monday,
-                'total_unique': total_unique,
-                'total_free': total_free,
-                'weekly_growth_total': weekly_growth_total,
-                'weekly_growth_free': weekly_growth_free,
-                'events_in_week': len(week_to_events.get(key, set())),
-                'week_unique_total': len(week_to_all_athletes.get(key, set())),
-                'week_unique_free': len(week_to_free_athletes.get(key, set())),
+                'total_unique': week_total,
+                'total_free': week_free_total,
+                'weekly_growth_total': week_total - prev_total,
+                'weekly_growth_free': week_free_total - prev_free_total,
+                'events_in_week': int(events_in_week[code]),
+                'week_unique_total': int(week_unique_total[code]),
+                'week_unique_free': int(week_unique_free[code]),
             }
         )
+        prev_total = week_total
+        prev_free_total = week_free_total
 
     return result
 
@@ -1130,85 +811,39 @@ def get_events_first_timers_report_data(rank_contains: str | None = None, free_o
     rank_priority = {rank: index for index, rank in enumerate(rank_order)}
     
     with app.app_context():
-        from models import Event, Category
-        
-        # Получаем все участия с информацией о турнире, спортсмене и разряде
-        # ВАЖНО: используем ТОЧНО ТАКОЙ ЖЕ запрос как в get_general_statistics_data для идентичности
-        # Это критически важно для правильного подсчета уникальных спортсменов!
-        participants_query = db.session.query(
-            Participant.athlete_id,
-            Participant.pct_ppname,
-            Event.exclude_free_from_reports,
-            Category.normalized_name.label('rank')
-        ).join(
-            Category, Participant.category_id == Category.id
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
-        # Множество для отслеживания уникальных спортсменов (идентично get_general_statistics_data)
-        unique_athletes = set()
-        
-        # Сначала обрабатываем запрос для подсчета уникальных спортсменов (идентично get_general_statistics_data)
-        for row in participants_query:
-            athlete_id = row.athlete_id
-            rank_name = (row.rank or 'Без разряда').strip()
-            if rank_contains_norm and rank_contains_norm not in rank_name.lower():
-                continue
-            # Добавляем спортсмена в множество уникальных (для унификации с листом "Статистика")
-            unique_athletes.add(athlete_id)
-        
-        # Теперь получаем детальную информацию о событиях для формирования таблицы
-        # Используем тот же фильтр, но добавляем event_id для сортировки
-        participants_query_detailed = db.session.query(
-            Participant.athlete_id,
-            Participant.pct_ppname,
-            Event.exclude_free_from_reports,
-            Category.normalized_name.label('rank'),
-            Participant.id.label('participant_id'),
-            Participant.event_id
-        ).join(
-            Category, Participant.category_id == Category.id
-        ).join(
-            Event, Participant.event_id == Event.id
-        ).filter(
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(excluded_ranks)
-            )
-        ).all()
-        
-        # Получаем данные о событиях отдельно
-        event_ids = set(row.event_id for row in participants_query_detailed if row.event_id)
-        events_dict = {}
-        if event_ids:
-            events = Event.query.filter(Event.id.in_(event_ids)).all()
-            events_dict = {e.id: e for e in events}
-        
-        # КРИТИЧНО: сортируем участия по дате турнира (сначала самые ранние), чтобы
-        # "первое появление" (athlete_id, rank) было именно хронологически первым.
-        # Иначе при произвольном порядке все могли бы считаться новичками на позднем турнире.
-        def _participant_sort_key(r):
-            ev = events_dict.get(r.event_id) if r.event_id else None
-            begin_date = getattr(ev, 'begin_date', None) if ev else None
-            # Турниры без даты помещаем в конец
-            sort_date = begin_date if begin_date is not None else date.max
-            return (sort_date, r.event_id or 0, r.participant_id or 0)
-        
-        participants_sorted = sorted(participants_query_detailed, key=_participant_sort_key)
+        frame = get_participation_frame()
+        # Участия с категорией без МС и КМС — те же строки, что в get_general_statistics_data
+        # (критически важно для одинакового подсчета уникальных спортсменов с листом "Статистика")
+        selected = frame.rank_allowed_mask(excluded_ranks)
+        rank_codes, rank_labels = relabel(frame.rank_code, frame.rank_labels, lambda label: (label or 'Без разряда').strip())
+        free = frame.free_mask(respect_participant_flag=False)
 
         # Режим «только бесплатные»: оставляем только участия с БЕСП, итоги считаем по ним
         if free_only:
-            participants_sorted = [
-                r for r in participants_sorted
-                if _is_free_for_reports(getattr(r, 'pct_ppname', None), getattr(r, 'exclude_free_from_reports', False))
-            ]
-            unique_athletes = set(r.athlete_id for r in participants_sorted)
+            selected &= free
+            unique_athletes_count = count_distinct(frame.athlete_id, selected)
+
+        # Если запрошен фильтр по разряду — считаем только подходящие записи
+        if rank_contains_norm:
+            selected &= codes_where(
+                rank_codes, rank_labels, lambda label: label is not None and rank_contains_norm in label.lower()
+            )
+        if not free_only:
+            unique_athletes_count = count_distinct(frame.athlete_id, selected)
+
+        # КРИТИЧНО: участия по дате турнира (сначала самые ранние), чтобы
+        # "первое появление" (athlete_id, rank) было именно хронологически первым.
+        # Иначе при произвольном порядке все могли бы считаться новичками на позднем турнире.
+        # Турниры без даты помещаем в конец
+        sort_date = np.where(frame.event_date > 0, frame.event_date, np.iinfo(np.int32).max)
+        order = np.lexsort((frame.participant_id, frame.event_id, sort_date))
+        order = order[selected[order]]
+        participants_sorted = zip(
+            frame.athlete_id[order].tolist(),
+            frame.event_id[order].tolist(),
+            rank_codes[order].tolist(),
+            free[order].tolist(),
+        )
         
         # Все выступления по (athlete_id, rank): [(event_id, event_date), ...] в хронологическом порядке — для детализации «все предыдущие» и «очередной раз»
         appearances_by_athlete_rank = {}
@@ -1219,20 +854,11 @@ def get_events_first_timers_report_data(rank_contains: str | None = None, free_o
         # Обрабатываем участия в хронологическом порядке (самый ранний турнир — первым)
         events_map = {}
         
-        for row in participants_sorted:
-            event_id = row.event_id
-            rank_name = (row.rank or 'Без разряда').strip()
-            athlete_id = row.athlete_id
-            participant_id = row.participant_id
+        for athlete_id, event_id, rank_code, is_free in participants_sorted:
+            rank_name = rank_labels[rank_code]
 
-            # Если запрошен фильтр по разряду — считаем только подходящие записи
-            if rank_contains_norm and rank_contains_norm not in rank_name.lower():
-                continue
-            
-            # Получаем данные о событии из словаря
-            event = events_dict.get(event_id) if event_id else None
-            event_name = event.name if event else 'Неизвестное событие'
-            event_date = event.begin_date if event else None
+            # Получаем данные о событии из справочника фрейма
+            event_name, event_date = frame.events.get(event_id, ('Неизвестное событие', None))
             
             if event_id not in events_map:
                 events_map[event_id] = {
@@ -1279,7 +905,7 @@ def get_events_first_timers_report_data(rank_contains: str | None = None, free_o
                 })
                 appearances_by_athlete_rank[key] = previous_list + [(event_id, event_date)]
             
-            if _is_free_for_reports(row.pct_ppname, row.exclude_free_from_reports):
+            if is_free:
                 event_entry['free_participations_count'] += 1
                 rank_entry['free_participations_count'] += 1
         
@@ -1333,8 +959,7 @@ def get_events_first_timers_report_data(rank_contains: str | None = None, free_o
                 for rec in rank_stats.get('repeaters_detail', []):
                     previous_events = []
                     for (eid, edate) in rec.get('previous_appearances', []):
-                        ev = events_dict.get(eid) if eid else None
-                        name = ev.name if ev else '—'
+                        name = frame.events[eid][0] if eid in frame.events else '—'
                         d = edate.strftime('%d.%m.%Y') if edate else '—'
                         previous_events.append({'event_name': name, 'event_date': d})
                     repeaters_detail.append({
@@ -1394,7 +1019,7 @@ def get_events_first_timers_report_data(rank_contains: str | None = None, free_o
         # Подсчитываем итоги
         totals = {
             'total_children': sum(event['total_children'] for event in events_data),  # Количество участий (для столбца "Всего")
-            'unique_athletes': len(unique_athletes),  # Количество уникальных спортсменов (для унификации с листом "Статистика")
+            'unique_athletes': unique_athletes_count,  # Количество уникальных спортсменов (для унификации с листом "Статистика")
             'unique_first_timers': len(unique_first_timers),  # Количество уникальных спортсменов-новичков (для столбца "Новички")
             'free_children': sum(event['free_children'] for event in events_data),
             'total_first_timers': sum(
@@ -1427,45 +1052,40 @@ def get_free_participation_exceedance_data():
     Возвращает: (summary_list, detail_list), где summary_list = [{'name', 'club', 'count'}],
     detail_list = [{'name', 'club', 'count', 'event_name', 'event_date', 'rank'}, ...] по каждому участию."""
     with app.app_context():
-        from models import Event
-        rows = db.session.query(
-            Athlete.id,
-            Athlete.first_name,
-            Athlete.last_name,
-            Athlete.full_name_xml,
-            Club.name.label('club_name'),
-            Event.name.label('event_name'),
-            Event.begin_date.label('event_date'),
-            Category.normalized_name.label('rank'),
-        ).select_from(Athlete).outerjoin(Club, Athlete.club_id == Club.id).join(
-            Participant, Athlete.id == Participant.athlete_id
-        ).join(Category, Participant.category_id == Category.id).join(
-            Event, Category.event_id == Event.id
-        ).filter(
-            Participant.pct_ppname == 'БЕСП',
-            db.or_(Participant.exclude_free_from_reports.is_(False), Participant.exclude_free_from_reports.is_(None)),
-            db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None)),
-            db.or_(
-                Category.normalized_name.is_(None),
-                Category.normalized_name.notin_(FREE_PARTICIPATION_EXCLUDED_RANKS)
-            )
-        ).order_by(Event.begin_date.asc(), Athlete.last_name, Athlete.first_name).all()
-        
+        frame = get_participation_frame()
+        selected = frame.free_mask() & frame.rank_allowed_mask(FREE_PARTICIPATION_EXCLUDED_RANKS)
+        # Участия спортсмена — по дате турнира (без даты — в начале, как ORDER BY в SQLite)
+        order = np.lexsort((frame.participant_id, frame.event_date))
+        order = order[selected[order]]
+
         by_athlete = {}
-        for r in rows:
-            aid = r.id
-            name = (r.full_name_xml or f"{r.last_name or ''} {r.first_name or ''}").strip()
-            club = (r.club_name or 'Не указан').strip()
-            event_date = r.event_date.strftime('%d.%m.%Y') if r.event_date else '—'
-            rank = (r.rank or 'Без разряда').strip()
+        for aid, event_id, rank_code in zip(
+            frame.athlete_id[order].tolist(), frame.event_id[order].tolist(), frame.rank_code[order].tolist()
+        ):
+            event_name, event_date = frame.events.get(event_id, (None, None))
+            rank = frame.rank_labels[rank_code] if rank_code != NO_VALUE else None
             if aid not in by_athlete:
-                by_athlete[aid] = {'name': name, 'club': club, 'count': 0, 'participations': []}
+                by_athlete[aid] = {'count': 0, 'participations': []}
             by_athlete[aid]['count'] += 1
             by_athlete[aid]['participations'].append({
-                'event_name': r.event_name or '—',
-                'event_date': event_date,
-                'rank': rank
+                'event_name': event_name or '—',
+                'event_date': event_date.strftime('%d.%m.%Y') if event_date else '—',
+                'rank': (rank or 'Без разряда').strip()
             })
+        by_athlete = {aid: d for aid, d in by_athlete.items() if d['count'] > 3}
+
+        if by_athlete:
+            athletes_query = db.session.query(
+                Athlete.id,
+                Athlete.first_name,
+                Athlete.last_name,
+                Athlete.full_name_xml,
+                Club.name.label('club_name'),
+            ).outerjoin(Club, Athlete.club_id == Club.id).filter(Athlete.id.in_(by_athlete))
+            for r in athletes_query:
+                d = by_athlete[r.id]
+                d['name'] = (r.full_name_xml or f"{r.last_name or ''} {r.first_name or ''}").strip()
+                d['club'] = (r.club_name or 'Не указан').strip()
         
         exceed = [(a, d) for a, d in by_athlete.items() if d['count'] > 3]
         exceed.sort(key=lambda x: (-x[1]['count'], x[1]['name']))
@@ -1484,47 +1104,24 @@ def get_free_participation_exceedance_data():
         return summary_list, detail_list
 
 
-def export_to_google_sheets(spreadsheet_id=None):
-    """
-    Экспортирует данные в Google Sheets
-    
-    Args:
-        spreadsheet_id: ID Google таблицы (если None, используется DEFAULT_SPREADSHEET_ID)
-    
-    Returns:
-        dict: {'success': bool, 'url': str, 'message': str}
-    """
-    api_requests_count = 0  # Счётчик API запросов для отладки
-    last_request_time = 0  # Время последнего запроса
-    
-    def rate_limit_delay():
-        """Добавляет задержку между запросами для соблюдения rate limits"""
-        import time as time_module  # Явный импорт для избежания проблем с областью видимости
-        nonlocal api_requests_count, last_request_time
-        api_requests_count += 1
-        current_time = time_module.time()
-        
-        # Минимальная задержка между запросами: 1 секунда (60 запросов/минуту)
-        min_delay = 1.0
-        if last_request_time > 0:
-            elapsed = current_time - last_request_time
-            if elapsed < min_delay:
-                sleep_time = min_delay - elapsed
-                time_module.sleep(sleep_time)
-        
-        last_request_time = time_module.time()
-        
-        # Каждые 10 запросов - дополнительная задержка
-        if api_requests_count % 10 == 0:
-            logger.info(f"Выполнено {api_requests_count} API запросов. Делаем паузу...")
-            time_module.sleep(2)
-    
-    try:
+class _GoogleSheetsTarget:
+    """Google таблица: листы строятся через services.sheets_sync, в finish() уходят только изменения."""
+
+    def __init__(self, spreadsheet_id=None, full_sync=False, on_retry=None):
+        self.spreadsheet_id = spreadsheet_id
+        self.full_sync = full_sync
+        self.on_retry = on_retry
+        self.sheets_sync = None
+
+    def open(self):
         # Подключаемся к Google Sheets
         logger.info("Подключение к Google Sheets...")
         client = get_google_sheets_client()
+        if self.on_retry is not None and getattr(client, 'http_client', None) is not None:
+            client.http_client.on_retry = self.on_retry
         
         # Используем DEFAULT_SPREADSHEET_ID если не передан другой ID
+        spreadsheet_id = self.spreadsheet_id
         if not spreadsheet_id:
             spreadsheet_id = DEFAULT_SPREADSHEET_ID
             logger.info(f"Используется основная таблица: {spreadsheet_id}")
@@ -1533,9 +1130,88 @@ def export_to_google_sheets(spreadsheet_id=None):
         logger.info(f"Открытие таблицы: {spreadsheet_id}")
         spreadsheet = client.open_by_key(spreadsheet_id)
         
+        # Дальше все записи только запоминаются; отправка — sheets_sync.push() в finish()
+        self.sheets_sync = SheetsSync(spreadsheet, os.path.join(app.instance_path, SHEETS_MANIFEST_FILENAME))
+        return self.sheets_sync.spreadsheet
+
+    def finish(self):
+        logger.info("Отправка изменений в Google Sheets%s...", " (полная перезапись)" if self.full_sync else "")
+        push_result = self.sheets_sync.push(full=self.full_sync)
+        logger.info(
+            "Экспорт завершен успешно! Перезаписано листов: %d, обновлено: %d, без изменений: %d; API запросов: %d.",
+            len(push_result['replayed']), len(push_result['patched']), len(push_result['unchanged']),
+            push_result['api_calls'],
+        )
+        spreadsheet = self.sheets_sync.spreadsheet
+        return {'url': spreadsheet.url, 'spreadsheet_id': spreadsheet.id}
+
+
+class _XlsxTarget:
+    """Локальный .xlsx: те же листы и оформление без сети (services.xlsx_export)."""
+
+    def __init__(self, target):
+        self.target = target
+        self.spreadsheet = None
+
+    def open(self):
+        self.spreadsheet = XlsxSpreadsheet()
+        return self.spreadsheet
+
+    def finish(self):
+        logger.info("Запись XLSX...")
+        self.spreadsheet.save(self.target)
+        logger.info("Экспорт в XLSX завершен успешно!")
+        return {'url': None}
+
+
+def export_to_google_sheets(spreadsheet_id=None, full_sync=False, progress=None, on_retry=None):
+    """
+    Экспортирует данные в Google Sheets
+    
+    Листы строятся через services.sheets_sync: записи копятся и в конце отправляются
+    только для изменившихся листов и блоков строк (манифест прошлого экспорта в instance/).
+    
+    Args:
+        spreadsheet_id: ID Google таблицы (если None, используется DEFAULT_SPREADSHEET_ID)
+        full_sync: перезаписать все листы целиком, не сравнивая с прошлым экспортом
+        progress: callable(stage) — вызывается в начале каждого листа (REPORT_SHEETS) и перед отправкой (FINISH_STAGE)
+        on_retry: callable() — вызывается при каждом повторе запроса к Google API после 429
+    
+    Returns:
+        dict: {'success': bool, 'url': str, 'message': str}
+    """
+    return _export_report_sheets(_GoogleSheetsTarget(spreadsheet_id, full_sync, on_retry), progress)
+
+
+def export_to_xlsx(target):
+    """
+    Экспортирует те же девять листов в один .xlsx без обращения к Google API
+    
+    Args:
+        target: путь к файлу или двоичный файловый объект (например, io.BytesIO)
+    
+    Returns:
+        dict: {'success': bool, 'url': None, 'message': str}
+    """
+    return _export_report_sheets(_XlsxTarget(target))
+
+
+def _no_progress(stage):
+    pass
+
+
+def _export_report_sheets(target, progress=None):
+    """Строит девять листов отчёта в target.open() и завершает экспорт target.finish()."""
+    progress = progress or _no_progress
+    try:
+        progress(REPORT_SHEETS[0])
+        spreadsheet = target.open()
+        
         # Получаем данные
         logger.info("Получение данных из БД...")
         athletes_by_rank = get_athletes_data()
+        # Тот же результат нужен листу "Статистика" (имя athletes_by_rank ниже переопределяется)
+        athletes_by_rank_stats = athletes_by_rank
         
         # Получаем первый лист (или создаем)
         try:
@@ -1591,8 +1267,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                         }
                     }
                 ]
-                safe_api_call(spreadsheet.batch_update, {'requests': clear_requests})
-                rate_limit_delay()
+                spreadsheet.batch_update({'requests': clear_requests})
                 
                 # Дополнительно: очищаем условное форматирование через отдельный запрос
                 try:
@@ -1612,13 +1287,12 @@ def export_to_google_sheets(spreadsheet_id=None):
                                 # Удаляем все правила
                                 for _ in range(len(sheet.get('conditionalFormats', []))):
                                     try:
-                                        safe_api_call(spreadsheet.batch_update, {'requests': [{
+                                        spreadsheet.batch_update({'requests': [{
                                             'deleteConditionalFormatRule': {
                                                 'sheetId': sheet_id,
                                                 'index': 0
                                             }
                                         }]})
-                                        rate_limit_delay()
                                     except:
                                         break
                 except Exception as e:
@@ -1661,8 +1335,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                     'mergeType': 'MERGE_ALL'
                 }
             }
-            safe_api_call(spreadsheet.batch_update, {'requests': [main_header_merge]})
-            rate_limit_delay()
+            spreadsheet.batch_update({'requests': [main_header_merge]})
             logger.info("Главный заголовок объединен и центрирован")
         except Exception as e:
             logger.warning(f"Ошибка объединения главного заголовка: {e}")
@@ -1790,8 +1463,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ЗАПИСЫВАЕМ ВСЕ ДАННЫЕ ОДНИМ ЗАПРОСОМ!
         logger.info(f"Запись {len(all_data)} строк одним пакетом...")
         if all_data:
-            safe_api_call(worksheet.update, f'A{start_row}:G{current_row-1}', all_data)
-            rate_limit_delay()
+            worksheet.update(f'A{start_row}:G{current_row-1}', all_data)
         
         # ИСПОЛЬЗУЕМ BATCH_FORMAT - ВСЁ ФОРМАТИРОВАНИЕ ОДНИМ ЗАПРОСОМ!
         logger.info(f"Применение форматирования батчем (1 запрос)...")
@@ -1806,8 +1478,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                     'format': fmt['format']
                 })
             
-            safe_api_call(worksheet.batch_format, batch_format_data)
-            rate_limit_delay()
+            worksheet.batch_format(batch_format_data)
             logger.info(f"[OK] Применено {len(batch_format_data)} форматов одним запросом!")
         
         # ОБЪЕДИНЯЕМ ЯЧЕЙКИ для заголовков разрядов
@@ -1844,8 +1515,7 @@ def export_to_google_sheets(spreadsheet_id=None):
             
             if merge_batch_requests:
                 try:
-                    safe_api_call(spreadsheet.batch_update, {'requests': merge_batch_requests})
-                    rate_limit_delay()
+                    spreadsheet.batch_update({'requests': merge_batch_requests})
                     logger.info(f"[OK] Объединено {len(merge_batch_requests)} заголовков!")
                 except Exception as e:
                     logger.warning(f"Ошибка объединения ячеек: {e}")
@@ -1884,8 +1554,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         
         if width_batch_requests:
             body = {'requests': width_batch_requests}
-            safe_api_call(spreadsheet.batch_update, body)
-            rate_limit_delay()
+            spreadsheet.batch_update(body)
             logger.info(f"[OK] Установлена ширина {len(column_widths)} колонок одним запросом!")
         
         # УСЛОВНОЕ ФОРМАТИРОВАНИЕ: Выделение дубликатов ФИО
@@ -1924,8 +1593,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         #             'index': 0
         #         }
         #     }
-        #     safe_api_call(spreadsheet.batch_update, {'requests': [conditional_format_request]})
-        #     rate_limit_delay()
+        #     spreadsheet.batch_update({'requests': [conditional_format_request]})
         #     logger.info("[OK] Условное форматирование для дубликатов добавлено!")
         # except Exception as e:
         #     logger.warning(f"Ошибка добавления условного форматирования: {e}")
@@ -1939,6 +1607,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ВТОРОЙ ЛИСТ: АНАЛИЗ ПО ШКОЛАМ
         # ========================================
         
+        progress(REPORT_SHEETS[1])
         logger.info("Создание второго листа 'Анализ по школам'...")
         schools_data = get_schools_analysis_data()
         
@@ -1979,8 +1648,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                         }
                     }
                 ]
-                safe_api_call(spreadsheet.batch_update, {'requests': clear_requests2})
-                rate_limit_delay()
+                spreadsheet.batch_update({'requests': clear_requests2})
                 
                 # Дополнительно: очищаем условное форматирование второго листа
                 try:
@@ -1991,13 +1659,12 @@ def export_to_google_sheets(spreadsheet_id=None):
                                 # Удаляем все правила условного форматирования
                                 for _ in range(len(sheet.get('conditionalFormats', []))):
                                     try:
-                                        safe_api_call(spreadsheet.batch_update, {'requests': [{
+                                        spreadsheet.batch_update({'requests': [{
                                             'deleteConditionalFormatRule': {
                                                 'sheetId': sheet_id2,
                                                 'index': 0
                                             }
                                         }]})
-                                        rate_limit_delay()
                                     except:
                                         break
                 except Exception as e:
@@ -2035,8 +1702,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                     'mergeType': 'MERGE_ALL'
                 }
             }
-            safe_api_call(spreadsheet.batch_update, {'requests': [main_header_merge2]})
-            rate_limit_delay()
+            spreadsheet.batch_update({'requests': [main_header_merge2]})
             logger.info("Главный заголовок второго листа объединен и центрирован")
         except Exception as e:
             logger.warning(f"Ошибка объединения главного заголовка второго листа: {e}")
@@ -2182,8 +1848,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ЗАПИСЫВАЕМ ВСЕ ДАННЫЕ ВТОРОГО ЛИСТА ОДНИМ ЗАПРОСОМ!
         logger.info(f"Запись {len(schools_all_data)} строк для школ одним пакетом...")
         if schools_all_data:
-            safe_api_call(worksheet2.update, f'A3:F{current_row}', schools_all_data)
-            rate_limit_delay()
+            worksheet2.update(f'A3:F{current_row}', schools_all_data)
         
         # ФОРМАТИРОВАНИЕ ВТОРОГО ЛИСТА (точечная подсветка уже в schools_format_requests)
         logger.info("Применение форматирования для второго листа...")
@@ -2195,8 +1860,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                     'format': fmt['format']
                 })
             
-            safe_api_call(worksheet2.batch_format, schools_batch_format_data)
-            rate_limit_delay()
+            worksheet2.batch_format(schools_batch_format_data)
             logger.info(f"[OK] Применено {len(schools_batch_format_data)} форматов для второго листа!")
         
         # ОБЪЕДИНЕНИЕ ЯЧЕЕК ДЛЯ ВТОРОГО ЛИСТА (школы и разряды)
@@ -2233,8 +1897,7 @@ def export_to_google_sheets(spreadsheet_id=None):
             
             if schools_merge_batch_requests:
                 try:
-                    safe_api_call(spreadsheet.batch_update, {'requests': schools_merge_batch_requests})
-                    rate_limit_delay()
+                    spreadsheet.batch_update({'requests': schools_merge_batch_requests})
                     logger.info(f"[OK] Объединено {len(schools_merge_batch_requests)} заголовков для школ!")
                 except Exception as e:
                     logger.warning(f"Ошибка объединения ячеек для школ: {e}")
@@ -2272,8 +1935,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         
         if width_batch_requests2:
             body = {'requests': width_batch_requests2}
-            safe_api_call(spreadsheet.batch_update, body)
-            rate_limit_delay()
+            spreadsheet.batch_update(body)
         
         # УСЛОВНОЕ ФОРМАТИРОВАНИЕ ДЛЯ ВТОРОГО ЛИСТА: Выделение дубликатов ФИО
         # Временно отключено из-за проблем с форматом формулы в API
@@ -2308,8 +1970,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         #             'index': 0
         #         }
         #     }
-        #     safe_api_call(spreadsheet.batch_update, {'requests': [conditional_format_request2]})
-        #     rate_limit_delay()
+        #     spreadsheet.batch_update({'requests': [conditional_format_request2]})
         #     logger.info("[OK] Условное форматирование для дубликатов добавлено (лист 2)!")
         # except Exception as e:
         #     logger.warning(f"Ошибка добавления условного форматирования (лист 2): {e}")
@@ -2322,11 +1983,10 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ТРЕТИЙ ЛИСТ: СТАТИСТИКА БЕСПЛАТНЫХ УЧАСТИЙ
         # ========================================
         
+        progress(REPORT_SHEETS[2])
         logger.info("Создание третьего листа 'Статистика'...")
         
-        # ВАЖНО: Получаем данные заново, т.к. athletes_by_rank уже использовался
-        logger.info("Получение данных для статистики...")
-        athletes_by_rank_stats = get_athletes_data()
+        # Данные спортсменов уже получены для первого листа (athletes_by_rank_stats)
         
         # Подсчитываем статистику по бесплатным участиям
         # 1. Детальная статистика по 1 Спортивному
@@ -2440,8 +2100,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                         }
                     }
                 ]
-                safe_api_call(spreadsheet.batch_update, {'requests': clear_requests3})
-                rate_limit_delay()
+                spreadsheet.batch_update({'requests': clear_requests3})
                 logger.info("[OK] Третий лист очищен")
             except Exception as e:
                 logger.warning(f"Ошибка при очистке третьего листа: {e}")
@@ -2474,8 +2133,7 @@ def export_to_google_sheets(spreadsheet_id=None):
                     'mergeType': 'MERGE_ALL'
                 }
             }
-            safe_api_call(spreadsheet.batch_update, {'requests': [main_header_merge3]})
-            rate_limit_delay()
+            spreadsheet.batch_update({'requests': [main_header_merge3]})
         except Exception as e:
             logger.debug(f"Объединение заголовка третьего листа: {e}")
         
@@ -2548,8 +2206,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         
         # Записываем данные (динамически определяем количество строк)
         end_row = current_row + len(stats_data) - 1
-        safe_api_call(worksheet3.update, f'A{current_row}:D{end_row}', stats_data)
-        rate_limit_delay()
+        worksheet3.update(f'A{current_row}:D{end_row}', stats_data)
         
         # Форматирование третьего листа
         # Вычисляем номера строк для форматирования
@@ -2664,8 +2321,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         ]
         
         if width_batch_requests3:
-            safe_api_call(spreadsheet.batch_update, {'requests': width_batch_requests3})
-            rate_limit_delay()
+            spreadsheet.batch_update({'requests': width_batch_requests3})
         
         worksheet3.freeze(rows=1)
         
@@ -2675,6 +2331,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ЧЕТВЁРТЫЙ ЛИСТ: ОБЩАЯ СТАТИСТИКА (был 5-й)
         # ========================================
         
+        progress(REPORT_SHEETS[3])
         logger.info("Создание четвертого листа 'Общая статистика'...")
         general_stats = get_general_statistics_data()
         
@@ -2923,6 +2580,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ПЯТЫЙ ЛИСТ: СТАТИСТИКА УЧАСТИЙ
         # ========================================
         
+        progress(REPORT_SHEETS[4])
         logger.info("Создание пятого листа 'Статистика участий'...")
         participations_stats = get_participations_statistics_data()
         
@@ -3135,6 +2793,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ШЕСТОЙ ЛИСТ: ОТЧЕТ ПО ТУРНИРАМ С НОВИЧКАМИ
         # ========================================
         
+        progress(REPORT_SHEETS[5])
         logger.info("Создание шестого листа 'Турниры: новички и повторяющиеся'...")
         first_timers_report = get_events_first_timers_report_data()
         first_timers_events = first_timers_report['events']
@@ -3432,8 +3091,6 @@ def export_to_google_sheets(spreadsheet_id=None):
         # Применяем все форматы одним батчем
         if format_requests6:
             logger.info(f"Применение {len(format_requests6)} форматов для шестого листа одним батчем...")
-            import time
-            time.sleep(5)  # Большая задержка перед форматированием
             try:
                 spreadsheet.batch_update({'requests': format_requests6})
                 logger.info(f"[OK] Применено {len(format_requests6)} форматов для шестого листа!")
@@ -3541,8 +3198,6 @@ def export_to_google_sheets(spreadsheet_id=None):
         ]
         
         if width_batch_requests6:
-            import time
-            time.sleep(5)  # Большая задержка перед установкой ширины колонок
             try:
                 spreadsheet.batch_update({'requests': width_batch_requests6})
                 logger.info("[OK] Ширина колонок шестого листа установлена")
@@ -3551,8 +3206,6 @@ def export_to_google_sheets(spreadsheet_id=None):
         
         # Замораживание строки - оборачиваем в try-except, чтобы не падало при ошибке
         try:
-            import time
-            time.sleep(2)  # Задержка перед замораживанием
             worksheet6.freeze(rows=1)
         except Exception as freeze_error:
             logger.warning(f"Не удалось заморозить строки шестого листа: {freeze_error}")
@@ -3563,6 +3216,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # СЕДЬМОЙ ЛИСТ: СВОДНАЯ СТАТИСТИКА
         # ========================================
         
+        progress(REPORT_SHEETS[6])
         logger.info("Создание седьмого листа 'сводная статистика'...")
         summary_stats = get_summary_statistics_data()
         
@@ -3972,6 +3626,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ВОСЬМОЙ ЛИСТ: 1 СП — ТОЛЬКО ТУРНИРЫ ГДЕ БЫЛ РАЗРЯД 1 СПОРТИВНЫЙ
         # ========================================
         
+        progress(REPORT_SHEETS[7])
         logger.info("Создание восьмого листа '1 сп: новички и повторяющиеся'...")
         # Фильтруем данные только по разрядам "1 Спортивный" и только турниры, где этот разряд был
         events_1sp = []
@@ -4082,6 +3737,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         # ДЕВЯТЫЙ ЛИСТ: ПРЕВЫШЕНИЕ БЕСПЛАТНЫХ УЧАСТИЙ (>3)
         # ========================================
         
+        progress(REPORT_SHEETS[8])
         logger.info("Создание девятого листа 'Превышение бесплатных (>3)'...")
         free_exceed_summary, free_exceed_detail = get_free_participation_exceedance_data()
         
@@ -4150,7 +3806,8 @@ def export_to_google_sheets(spreadsheet_id=None):
         worksheet9.freeze(rows=2)
         logger.info("[OK] Девятый лист 'Превышение бесплатных (>3)' создан!")
         
-        logger.info(f"Экспорт завершен успешно! Всего выполнено {api_requests_count} API запросов.")
+        progress(FINISH_STAGE)
+        target_result = target.finish()
         
         total_athletes = sum(len(athletes) for athletes in athletes_by_rank_stats.values())
         total_schools = len(schools_data)
@@ -4158,8 +3815,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         
         return {
             'success': True,
-            'url': spreadsheet.url,
-            'spreadsheet_id': spreadsheet.id,
+            **target_result,
             'message': (
                 f'Экспорт завершен! Создано 9 листов: '
                 f'"Список спортсменов" ({total_athletes} спортсменов), '
@@ -4175,7 +3831,7 @@ def export_to_google_sheets(spreadsheet_id=None):
         }
         
     except Exception as e:
-        logger.error(f"Ошибка при экспорте в Google Sheets: {e}")
+        logger.error(f"Ошибка при экспорте отчёта: {e}")
         import traceback
         traceback.print_exc()
         
@@ -0,0 +1,25 @@
+"""import job heartbeat (stale job recovery)
+
+Revision ID: 2e7a4c9d5b16
+Revises: 9c3e5b7d1f24
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '2e7a4c9d5b16'
+down_revision = '9c3e5b7d1f24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('import_job') as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('import_job') as batch_op:
+        batch_op.drop_column('heartbeat_at')
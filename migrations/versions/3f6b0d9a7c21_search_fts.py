@@ -0,0 +1,56 @@
+"""FTS5 trigram search index for athletes, coaches, clubs and events
+
+Revision ID: 3f6b0d9a7c21
+Revises: 8a41f0c2d9e5
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '3f6b0d9a7c21'
+down_revision = '8a41f0c2d9e5'
+branch_labels = None
+depends_on = None
+
+# Таблица-источник -> (FTS-таблица, поля, из которых собирается body) на момент этой ревизии
+_INDEXES = (
+    ('athlete', 'athlete_fts', ('full_name_xml', 'last_name', 'first_name', 'patronymic')),
+    ('coach', 'coach_fts', ('name',)),
+    ('club', 'club_fts', ('name', 'short_name', 'city')),
+    ('event', 'event_fts', ('name', 'long_name', 'place', 'venue')),
+)
+_CHUNK_SIZE = 500
+
+
+def upgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        # FTS5 есть только в SQLite — на других СУБД поиск работает через LIKE
+        return
+
+    # Ключ (casefold, латиница -> кириллица) считается в Python
+    from utils.search_utils import search_key
+
+    for source_name, fts_name, fields in _INDEXES:
+        conn.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts_name} USING fts5(body, tokenize='trigram')"
+        )
+        source = sa.table(source_name, sa.column('id', sa.Integer), *(sa.column(f, sa.Text) for f in fields))
+        fts = sa.table(fts_name, sa.column('rowid', sa.Integer), sa.column('body', sa.Text))
+        conn.execute(fts.delete())
+        rows = [
+            {'rowid': row[0], 'body': search_key(' '.join(str(value) for value in row[1:] if value))}
+            for row in conn.execute(sa.select(source.c.id, *(source.c[f] for f in fields)))
+        ]
+        for start in range(0, len(rows), _CHUNK_SIZE):
+            conn.execute(fts.insert(), rows[start:start + _CHUNK_SIZE])
+
+
+def downgrade():
+    conn = op.get_bind()
+    if conn.dialect.name != 'sqlite':
+        return
+    for _, fts_name, _ in _INDEXES:
+        conn.exec_driver_sql(f"DROP TABLE IF EXISTS {fts_name}")
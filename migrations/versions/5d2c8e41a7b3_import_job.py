@@ -0,0 +1,41 @@
+"""import job table (background XML import)
+
+Revision ID: 5d2c8e41a7b3
+Revises: e7f2a91b3c44
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '5d2c8e41a7b3'
+down_revision = 'e7f2a91b3c44'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'import_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('files_total', sa.Integer(), nullable=False),
+        sa.Column('files_done', sa.Integer(), nullable=False),
+        sa.Column('athletes_total', sa.Integer(), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=True),
+        sa.Column('files_state', sa.Text(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_import_job_created_at', 'import_job', ['created_at'], unique=False)
+    op.create_index('ix_import_job_status', 'import_job', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_import_job_status', table_name='import_job')
+    op.drop_index('ix_import_job_created_at', table_name='import_job')
+    op.drop_table('import_job')
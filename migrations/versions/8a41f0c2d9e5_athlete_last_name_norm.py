@@ -0,0 +1,38 @@
+"""athlete.last_name_norm for batch birth-date conflict lookup
+
+Revision ID: 8a41f0c2d9e5
+Revises: 5d2c8e41a7b3
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '8a41f0c2d9e5'
+down_revision = '5d2c8e41a7b3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('athlete', sa.Column('last_name_norm', sa.String(length=100), nullable=True))
+    op.create_index('ix_athlete_last_name_norm', 'athlete', ['last_name_norm'], unique=False)
+
+    # lower() в SQLite не понимает кириллицу — ключ считается в Python
+    from utils.normalizers import normalize_name_key
+
+    conn = op.get_bind()
+    athlete = sa.table('athlete', sa.column('id', sa.Integer), sa.column('last_name', sa.String), sa.column('last_name_norm', sa.String))
+    rows = conn.execute(sa.select(athlete.c.id, athlete.c.last_name)).fetchall()
+    updates = [{'athlete_id': row.id, 'norm': normalize_name_key(row.last_name)} for row in rows]
+    if updates:
+        conn.execute(
+            athlete.update().where(athlete.c.id == sa.bindparam('athlete_id')).values(last_name_norm=sa.bindparam('norm')),
+            updates,
+        )
+
+
+def downgrade():
+    op.drop_index('ix_athlete_last_name_norm', table_name='athlete')
+    op.drop_column('athlete', 'last_name_norm')
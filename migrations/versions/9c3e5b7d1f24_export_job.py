@@ -0,0 +1,49 @@
+"""export job table (Google Sheets export status and history)
+
+Revision ID: 9c3e5b7d1f24
+Revises: f19c4a6b2e87
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '9c3e5b7d1f24'
+down_revision = 'f19c4a6b2e87'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'export_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('started_at', sa.DateTime(), nullable=True),
+        sa.Column('finished_at', sa.DateTime(), nullable=True),
+        sa.Column('heartbeat_at', sa.DateTime(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('full_sync', sa.Boolean(), nullable=False),
+        sa.Column('sheets_total', sa.Integer(), nullable=False),
+        sa.Column('sheets_done', sa.Integer(), nullable=False),
+        sa.Column('current_sheet', sa.String(length=255), nullable=True),
+        sa.Column('retries', sa.Integer(), nullable=False),
+        sa.Column('sheets_state', sa.Text(), nullable=True),
+        sa.Column('message', sa.Text(), nullable=True),
+        sa.Column('url', sa.String(length=500), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('idx_export_job_kind_id', 'export_job', ['kind', 'id'], unique=False)
+    op.create_index(
+        'uq_export_job_running', 'export_job', ['kind'], unique=True,
+        sqlite_where=sa.text("status = 'running'"),
+        postgresql_where=sa.text("status = 'running'"),
+    )
+
+
+def downgrade():
+    op.drop_index('uq_export_job_running', table_name='export_job')
+    op.drop_index('idx_export_job_kind_id', table_name='export_job')
+    op.drop_table('export_job')
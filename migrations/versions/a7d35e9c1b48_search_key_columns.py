@@ -0,0 +1,59 @@
+"""search_key columns on athlete, coach, club and event
+
+Revision ID: a7d35e9c1b48
+Revises: 3f6b0d9a7c21
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'a7d35e9c1b48'
+down_revision = '3f6b0d9a7c21'
+branch_labels = None
+depends_on = None
+
+# Таблица -> поля, из которых собирается search_key (на момент этой ревизии)
+_FIELDS = {
+    'athlete': ('full_name_xml', 'last_name', 'first_name', 'patronymic'),
+    'coach': ('name',),
+    'club': ('name', 'short_name', 'city'),
+    'event': ('name', 'long_name', 'place', 'venue'),
+}
+_CHUNK_SIZE = 500
+
+
+def upgrade():
+    for table in _FIELDS:
+        op.add_column(table, sa.Column('search_key', sa.Text(), nullable=True))
+        op.create_index(f'ix_{table}_search_key', table, ['search_key'], unique=False)
+
+    # Ключ (casefold, латиница -> кириллица) считается в Python
+    from utils.search_utils import search_key
+
+    conn = op.get_bind()
+    for table_name, fields in _FIELDS.items():
+        table = sa.table(
+            table_name,
+            sa.column('id', sa.Integer),
+            sa.column('search_key', sa.Text),
+            *(sa.column(f, sa.Text) for f in fields),
+        )
+        updates = [
+            {'row_id': row[0], 'key': search_key(' '.join(str(value) for value in row[1:] if value))}
+            for row in conn.execute(sa.select(table.c.id, *(table.c[f] for f in fields)))
+        ]
+        statement = (
+            table.update()
+            .where(table.c.id == sa.bindparam('row_id'))
+            .values(search_key=sa.bindparam('key'))
+        )
+        for start in range(0, len(updates), _CHUNK_SIZE):
+            conn.execute(statement, updates[start:start + _CHUNK_SIZE])
+
+
+def downgrade():
+    for table in _FIELDS:
+        op.drop_index(f'ix_{table}_search_key', table_name=table)
+        op.drop_column(table, 'search_key')
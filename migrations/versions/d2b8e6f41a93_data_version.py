@@ -0,0 +1,32 @@
+"""data_version counter for process-wide caches
+
+Revision ID: d2b8e6f41a93
+Revises: a7d35e9c1b48
+Create Date: 2026-10-16
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'd2b8e6f41a93'
+down_revision = 'a7d35e9c1b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    data_version = op.create_table(
+        'data_version',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.bulk_insert(data_version, [{'id': 1, 'version': 0, 'updated_at': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('data_version')
@@ -0,0 +1,135 @@
+"""athlete_rank_stats: materialized per-(athlete, rank) aggregates
+
+Revision ID: f19c4a6b2e87
+Revises: d2b8e6f41a93
+Create Date: 2026-10-16
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = 'f19c4a6b2e87'
+down_revision = 'd2b8e6f41a93'
+branch_labels = None
+depends_on = None
+
+_BATCH_SIZE = 500
+
+
+def upgrade():
+    op.create_table(
+        'athlete_rank_stats',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('athlete_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.String(length=200), nullable=False),
+        sa.Column('category_gender', sa.String(length=10), nullable=True),
+        sa.Column('participations', sa.Integer(), nullable=False),
+        sa.Column('events_count', sa.Integer(), nullable=False),
+        sa.Column('best_place', sa.Integer(), nullable=True),
+        sa.Column('best_points', sa.Float(), nullable=True),
+        sa.Column('last_event_date', sa.Date(), nullable=True),
+        sa.Column('free_participations', sa.Integer(), nullable=False),
+        sa.Column('free_reported_participations', sa.Integer(), nullable=False),
+        sa.Column('best_result_event_id', sa.Integer(), nullable=True),
+        sa.Column('best_result_place', sa.Integer(), nullable=True),
+        sa.Column('best_result_points', sa.Float(), nullable=True),
+        sa.ForeignKeyConstraint(['athlete_id'], ['athlete.id'], ),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('athlete_id', 'rank', name='uq_athlete_rank_stats_athlete_rank'),
+    )
+    op.create_index('ix_athlete_rank_stats_athlete_id', 'athlete_rank_stats', ['athlete_id'], unique=False)
+    op.create_index('ix_athlete_rank_stats_rank', 'athlete_rank_stats', ['rank'], unique=False)
+
+    # Заполняем по текущим участиям (агрегация в Python, как при импорте)
+    _backfill(op.get_bind())
+
+
+def _backfill(conn):
+    """Агрегаты по (спортсмен, разряд) на момент этой ревизии — Core-запросы без моделей."""
+    from utils.rank_names import normalize_category_name
+
+    participant = sa.table(
+        'participant',
+        sa.column('id', sa.Integer), sa.column('athlete_id', sa.Integer), sa.column('event_id', sa.Integer),
+        sa.column('category_id', sa.Integer), sa.column('total_place', sa.Integer),
+        sa.column('total_points', sa.Float), sa.column('pct_ppname', sa.String),
+        sa.column('exclude_free_from_reports', sa.Boolean),
+    )
+    category = sa.table(
+        'category',
+        sa.column('id', sa.Integer), sa.column('event_id', sa.Integer), sa.column('name', sa.String),
+        sa.column('gender', sa.String), sa.column('normalized_name', sa.String),
+    )
+    event = sa.table(
+        'event',
+        sa.column('id', sa.Integer), sa.column('begin_date', sa.Date),
+        sa.column('exclude_free_from_reports', sa.Boolean),
+    )
+    stats_table = sa.table(
+        'athlete_rank_stats',
+        *(sa.column(name) for name in (
+            'athlete_id', 'rank', 'category_gender', 'participations', 'events_count',
+            'best_place', 'best_points', 'last_event_date', 'free_participations',
+            'free_reported_participations', 'best_result_event_id', 'best_result_place',
+            'best_result_points',
+        )),
+    )
+    rows = conn.execute(
+        sa.select(
+            participant.c.athlete_id, participant.c.event_id, participant.c.total_place,
+            participant.c.total_points, participant.c.pct_ppname,
+            participant.c.exclude_free_from_reports.label('participant_excluded'),
+            category.c.name.label('category_name'), category.c.gender.label('category_gender'),
+            category.c.normalized_name, event.c.begin_date,
+            event.c.exclude_free_from_reports.label('event_excluded'),
+        )
+        .select_from(participant.join(category, participant.c.category_id == category.c.id)
+                     .join(event, category.c.event_id == event.c.id))
+        .order_by(participant.c.id)
+    )
+
+    stats = {}
+    for row in rows:
+        rank = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
+        entry = stats.get((row.athlete_id, rank))
+        if entry is None:
+            entry = stats[(row.athlete_id, rank)] = {
+                'athlete_id': row.athlete_id, 'rank': rank, 'category_gender': row.category_gender,
+                'participations': 0, 'events': set(), 'best_place': None, 'best_points': None,
+                'last_event_date': None, 'free_participations': 0, 'free_reported_participations': 0,
+                'best_result_event_id': None, 'best_result_place': None, 'best_result_points': None,
+            }
+        entry['participations'] += 1
+        entry['events'].add(row.event_id)
+        if row.total_place is not None and (entry['best_place'] is None or row.total_place < entry['best_place']):
+            entry['best_place'] = row.total_place
+        if row.total_points is not None and (entry['best_points'] is None or row.total_points > entry['best_points']):
+            entry['best_points'] = row.total_points
+        if row.begin_date is not None and (entry['last_event_date'] is None or row.begin_date > entry['last_event_date']):
+            entry['last_event_date'] = row.begin_date
+        # БЕСП-участие в турнире, не исключённом из отчётов
+        if row.pct_ppname == 'БЕСП' and not row.event_excluded:
+            entry['free_participations'] += 1
+            if not row.participant_excluded:
+                entry['free_reported_participations'] += 1
+        # Лучший результат: категории с normalized_name и известным местом, первое участие с максимумом баллов
+        if row.normalized_name and row.total_place is not None:
+            points = round(float(row.total_points), 2) if row.total_points is not None else 0
+            if entry['best_result_event_id'] is None or points > entry['best_result_points']:
+                entry['best_result_event_id'] = row.event_id
+                entry['best_result_place'] = row.total_place
+                entry['best_result_points'] = points
+
+    inserts = []
+    for entry in stats.values():
+        entry['events_count'] = len(entry.pop('events'))
+        inserts.append(entry)
+    for start in range(0, len(inserts), _BATCH_SIZE):
+        conn.execute(stats_table.insert(), inserts[start:start + _BATCH_SIZE])
+
+
+def downgrade():
+    op.drop_index('ix_athlete_rank_stats_rank', table_name='athlete_rank_stats')
+    op.drop_index('ix_athlete_rank_stats_athlete_id', table_name='athlete_rank_stats')
+    op.drop_table('athlete_rank_stats')
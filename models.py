@@ -6,7 +6,10 @@
 
 from datetime import datetime
 
+from sqlalchemy.orm import validates
+
 from extensions import db
+from utils.normalizers import normalize_name_key
 
 class Event(db.Model):
     """Модель события/турнира"""
@@ -24,6 +27,7 @@ class Event(db.Model):
     status = db.Column(db.String(20), index=True)
     event_rank = db.Column(db.String(50), index=True)
     exclude_free_from_reports = db.Column(db.Boolean, default=False, nullable=False, index=True)
+    search_key = db.Column(db.Text, index=True)  # search_key(name, long_name, place, venue) — см. services/search_index.py
     calculation_time = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -82,6 +86,7 @@ class Club(db.Model):
     short_name = db.Column(db.String(50))
     country = db.Column(db.String(3), index=True)
     city = db.Column(db.String(100))
+    search_key = db.Column(db.Text, index=True)  # search_key(name, short_name, city) — см. services/search_index.py
     
     athletes = db.relationship('Athlete', backref='club', lazy=True)
     
@@ -96,9 +101,13 @@ class Athlete(db.Model):
     external_id = db.Column(db.String(50), index=True)
     first_name = db.Column(db.String(100), nullable=False, index=True)
     last_name = db.Column(db.String(100), nullable=False, index=True)
+    # Фамилия в нижнем регистре (normalize_name_key) — заполняется автоматически при записи last_name.
+    # lower() в SQLite не работает с кириллицей, поэтому ключ считается в Python
+    last_name_norm = db.Column(db.String(100), index=True)
     patronymic = db.Column(db.String(100))
     full_name_xml = db.Column(db.String(300))  # Полное ФИО из XML
     lookup_key = db.Column(db.String(300), index=True)  # Ключ дедупликации
+    search_key = db.Column(db.Text, index=True)  # search_key(ФИО) — см. services/search_index.py
     birth_date = db.Column(db.Date, index=True)
     gender = db.Column(db.String(1), index=True)
     country = db.Column(db.String(3), index=True)
@@ -106,21 +115,31 @@ class Athlete(db.Model):
     
     participants = db.relationship('Participant', backref='athlete', lazy=True, cascade='all, delete-orphan')
     
+    @validates('last_name')
+    def _sync_last_name_norm(self, key, value):
+        self.last_name_norm = normalize_name_key(value)
+        return value
+    
     @property
     def full_name(self):
         """Полное имя спортсмена - приоритет у full_name_xml (PCT_PLNAME из XML), иначе составное из частей"""
+        return self.compose_full_name(self.full_name_xml, self.last_name, self.first_name, self.patronymic)
+    
+    @staticmethod
+    def compose_full_name(full_name_xml, last_name, first_name, patronymic):
+        """full_name по значениям колонок (для запросов без загрузки объектов Athlete)"""
         # Используем full_name_xml (PCT_PLNAME) если есть - это правильное имя без дублирования
-        if self.full_name_xml and self.full_name_xml.strip():
-            return self.full_name_xml.strip()
+        if full_name_xml and full_name_xml.strip():
+            return full_name_xml.strip()
         # Иначе формируем из частей, очищая от дублирования
         from utils.normalizers import remove_duplication
         parts = []
-        if self.last_name:
-            parts.append(remove_duplication(self.last_name))
-        if self.first_name:
-            parts.append(remove_duplication(self.first_name))
-        if self.patronymic:
-            parts.append(remove_duplication(self.patronymic))
+        if last_name:
+            parts.append(remove_duplication(last_name))
+        if first_name:
+            parts.append(remove_duplication(first_name))
+        if patronymic:
+            parts.append(remove_duplication(patronymic))
         return ' '.join(parts) if parts else ''
     
     @property
@@ -173,6 +192,29 @@ class Participant(db.Model):
         db.UniqueConstraint('event_id', 'category_id', 'athlete_id', name='uq_participant_event_category_athlete'),
     )
 
+class AthleteRankStats(db.Model):
+    """Агрегаты участий спортсмена по разряду (materialized; пересчитывает services/athlete_rank_stats.py)"""
+    __tablename__ = 'athlete_rank_stats'
+    id = db.Column(db.Integer, primary_key=True)
+    athlete_id = db.Column(db.Integer, db.ForeignKey('athlete.id'), nullable=False, index=True)
+    rank = db.Column(db.String(200), nullable=False, index=True)  # normalized_name или normalize_category_name
+    category_gender = db.Column(db.String(10))
+    participations = db.Column(db.Integer, nullable=False, default=0)
+    events_count = db.Column(db.Integer, nullable=False, default=0)
+    best_place = db.Column(db.Integer)
+    best_points = db.Column(db.Float)
+    last_event_date = db.Column(db.Date)
+    free_participations = db.Column(db.Integer, nullable=False, default=0)  # БЕСП, турнир не исключён из отчётов
+    free_reported_participations = db.Column(db.Integer, nullable=False, default=0)  # + участие не исключено
+    # Лучший результат для /best_results: участие с максимумом баллов среди мест с normalized_name
+    best_result_event_id = db.Column(db.Integer)  # без FK: строки пересчитываются уже после удаления турнира
+    best_result_place = db.Column(db.Integer)
+    best_result_points = db.Column(db.Float)
+
+    __table_args__ = (
+        db.UniqueConstraint('athlete_id', 'rank', name='uq_athlete_rank_stats_athlete_rank'),
+    )
+
 class Performance(db.Model):
     """Модель выступления в сегменте"""
     __tablename__ = 'performance'
@@ -270,6 +312,7 @@ class Coach(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(200), nullable=False, index=True)
     normalized_name = db.Column(db.String(200), index=True)  # Нормализованное имя для поиска
+    search_key = db.Column(db.Text, index=True)  # search_key(name) — см. services/search_index.py
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     assignments = db.relationship('CoachAssignment', backref='coach', lazy=True, cascade='all, delete-orphan')
@@ -329,3 +372,66 @@ class JudgeHelperFreeAudit(db.Model):
     result_no_free = db.Column(db.Integer, nullable=False, default=0)
     result_fio_only = db.Column(db.Integer, nullable=False, default=0)
     result_not_found = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ImportJob(db.Model):
+    """Фоновая задача импорта XML (/upload-to-database), прогресс — в services/import_jobs.py."""
+
+    __tablename__ = 'import_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # последняя отметка воркера; без неё дольше порога задача считается упавшей
+    status = db.Column(db.String(20), nullable=False, default='queued', index=True)  # queued / running / success / error
+    files_total = db.Column(db.Integer, nullable=False, default=0)
+    files_done = db.Column(db.Integer, nullable=False, default=0)
+    athletes_total = db.Column(db.Integer, nullable=False, default=0)
+    payload = db.Column(db.Text)  # JSON: parser_data черновика импорта
+    files_state = db.Column(db.Text)  # JSON: состояние по файлам
+    message = db.Column(db.Text)
+
+
+class ExportJob(db.Model):
+    """Задача экспорта отчётов в Google Sheets, прогресс по листам — в services/export_jobs.py."""
+
+    __tablename__ = 'export_job'
+    __table_args__ = (
+        db.Index('idx_export_job_kind_id', 'kind', 'id'),
+        # Не больше одной выполняющейся задачи каждого вида: вставка строки и есть захват
+        db.Index(
+            'uq_export_job_running', 'kind', unique=True,
+            sqlite_where=db.text("status = 'running'"),
+            postgresql_where=db.text("status = 'running'"),
+        ),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False, default='google_sheets')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # обновляется на каждом этапе; по нему находятся брошенные задачи
+    status = db.Column(db.String(20), nullable=False, default='running')  # running / success / error
+    full_sync = db.Column(db.Boolean, nullable=False, default=False)
+    sheets_total = db.Column(db.Integer, nullable=False, default=0)
+    sheets_done = db.Column(db.Integer, nullable=False, default=0)
+    current_sheet = db.Column(db.String(255))
+    retries = db.Column(db.Integer, nullable=False, default=0)  # повторы запросов к Google API после 429
+    sheets_state = db.Column(db.Text)  # JSON: этапы по листам (статус, секунды, повторы)
+    message = db.Column(db.Text)
+    url = db.Column(db.String(500))
+
+
+class DataVersion(db.Model):
+    """Счётчик версии данных (одна строка id=1), увеличивается при импорте и правках данных.
+
+    По нему кеши (services/athlete_name_index.py, services/response_cache.py) понимают, что данные изменились.
+    """
+
+    __tablename__ = 'data_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
@@ -1,28 +1,34 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """Admin routes."""
+import io
 import logging
 import os
-import threading
-import time
 import json
 import xml.etree.ElementTree as ET
-from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session, flash, current_app
+from flask import Blueprint, render_template, request, jsonify, redirect, url_for, session, flash, current_app, send_file
 from werkzeug.security import check_password_hash
 from werkzeug.utils import secure_filename
 
 from extensions import limiter, db
 from utils.auth import admin_required
-from parsers.isu_calcfs_parser import ISUCalcFSParser
+from services.parse_cache import parse_xml_cached, parse_xml_files
 from services.rank_service import analyze_categories_from_xml
-from services.import_service import save_to_database
+from services.athlete_rank_stats import refresh_athlete_rank_stats, refresh_event_athlete_rank_stats
+from services.data_version import bump_data_version
 from services.xml_import_prepare import iter_ready_parsers
-from services.import_birth_conflict import (
-    apply_birth_conflict_resolutions_json,
-    find_birth_date_conflicts,
+from services.import_birth_conflict import find_birth_date_conflicts
+from services.export_jobs import export_job_status, recent_export_jobs, run_export_job, submit_export_job
+from services.import_jobs import import_job_status, submit_import_job
+from services.import_staging import (
+    SESSION_KEY as STAGING_SESSION_KEY,
+    create_import,
+    discard_import,
+    load_import,
+    save_import,
 )
-from services.xml_archive import archive_imported_xml
 from collections import defaultdict
+from datetime import date
 
 from sqlalchemy import and_, case, func
 
@@ -34,6 +40,27 @@ logger = logging.getLogger(__name__)
 admin_bp = Blueprint('admin', __name__)
 
 
+def _staged_import():
+    """Черновик текущего импорта из серверного хранилища (пустой dict, если его нет)."""
+    return load_import(session.get(STAGING_SESSION_KEY)) or {}
+
+
+def _save_staged_import(data):
+    """Сохраняет черновик; в сессии хранится только его import_id."""
+    import_id = session.get(STAGING_SESSION_KEY)
+    if import_id:
+        try:
+            save_import(import_id, data)
+            return
+        except ValueError:
+            pass
+    session[STAGING_SESSION_KEY] = create_import(data)
+
+
+def _discard_staged_import():
+    discard_import(session.pop(STAGING_SESSION_KEY, None))
+
+
 def _parse_normalize_category_form(request):
     """Читает normalize_* и delete_* из формы нормализации категорий."""
     normalizations = {}
@@ -79,9 +106,9 @@ def _safe_parse_birth_conflict_resolutions(raw: str) -> list:
 @limiter.limit('30 per minute')
 def check_import_birth_conflicts():
     """Проверка перед импортом: совпадение ФИО при разной дате рождения."""
-    if 'parser_data' not in session:
+    parser_data = _staged_import().get('parser_data')
+    if not parser_data:
         return jsonify({'success': False, 'error': 'Нет данных импорта в сессии'}), 400
-    parser_data = session['parser_data']
     categories_analysis = parser_data['categories_analysis']
 
     normalizations, deleted_indices_form = _parse_normalize_category_form(request)
@@ -116,99 +143,6 @@ def check_import_birth_conflicts():
 
     return jsonify({'success': True, 'conflicts': uniq})
 
-_export_job_lock = threading.Lock()
-
-
-def _export_state_path(app_obj):
-    """Путь к общему состоянию экспорта (доступен всем воркерам)."""
-    os.makedirs(app_obj.instance_path, exist_ok=True)
-    return os.path.join(app_obj.instance_path, 'google_export_state.json')
-
-
-def _read_export_state(app_obj):
-    path = _export_state_path(app_obj)
-    if not os.path.exists(path):
-        return {
-            'running': False,
-            'started_at': None,
-            'finished_at': None,
-            'success': None,
-            'message': None,
-            'url': None,
-        }
-    try:
-        with open(path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            return {
-                'running': bool(data.get('running', False)),
-                'started_at': data.get('started_at'),
-                'finished_at': data.get('finished_at'),
-                'success': data.get('success'),
-                'message': data.get('message'),
-                'url': data.get('url'),
-            }
-    except Exception:
-        return {
-            'running': False,
-            'started_at': None,
-            'finished_at': None,
-            'success': None,
-            'message': None,
-            'url': None,
-        }
-
-
-def _write_export_state(app_obj, state):
-    path = _export_state_path(app_obj)
-    tmp_path = f"{path}.tmp"
-    with open(tmp_path, 'w', encoding='utf-8') as f:
-        json.dump(state, f, ensure_ascii=False)
-    os.replace(tmp_path, path)
-
-
-def _start_google_export_background(app_obj):
-    """Запускает экспорт в отдельном потоке и обновляет состояние задачи."""
-    from google_sheets_sync import export_to_google_sheets
-
-    def _worker():
-        with app_obj.app_context():
-            try:
-                result = export_to_google_sheets()
-                with _export_job_lock:
-                    state = _read_export_state(app_obj)
-                    state['running'] = False
-                    state['finished_at'] = int(time.time())
-                    state['success'] = bool(result.get('success'))
-                    state['message'] = result.get('message', 'Экспорт завершён')
-                    state['url'] = result.get('url')
-                    _write_export_state(app_obj, state)
-            except Exception as e:
-                logger.error(f"Ошибка фонового экспорта в Google Sheets: {e}", exc_info=True)
-                with _export_job_lock:
-                    state = _read_export_state(app_obj)
-                    state['running'] = False
-                    state['finished_at'] = int(time.time())
-                    state['success'] = False
-                    state['message'] = f'Ошибка экспорта: {str(e)}'
-                    state['url'] = None
-                    _write_export_state(app_obj, state)
-
-    with _export_job_lock:
-        state = _read_export_state(app_obj)
-        if state.get('running'):
-            return False
-        state['running'] = True
-        state['started_at'] = int(time.time())
-        state['finished_at'] = None
-        state['success'] = None
-        state['message'] = 'Экспорт запущен. Это может занять несколько минут...'
-        state['url'] = None
-        _write_export_state(app_obj, state)
-
-    thread = threading.Thread(target=_worker, daemon=True)
-    thread.start()
-    return True
-
 @admin_bp.route('/upload', methods=['GET', 'POST'])
 @admin_required
 @limiter.limit("100 per minute")  # Увеличено для загрузки множественных файлов
@@ -226,7 +160,7 @@ def upload_file():
             if not files or all(f.filename == '' for f in files):
                 return jsonify({'error': 'Файл не выбран'}), 400
             
-            # Ограничение на количество файлов за раз (из-за ограничений сессии Flask)
+            # Ограничение на количество файлов за раз
             MAX_FILES_PER_UPLOAD = 15
             if len(files) > MAX_FILES_PER_UPLOAD:
                 return jsonify({
@@ -271,10 +205,11 @@ def upload_file():
             if not uploaded_files:
                 return jsonify({'error': 'Не удалось загрузить ни одного файла. ' + '; '.join(errors)}), 400
             
-            # Очищаем старые файлы из сессии и с диска перед загрузкой новых
-            if 'uploaded_files' in session and session['uploaded_files']:
-                logger.info(f"Очистка {len(session['uploaded_files'])} старых файлов из сессии")
-                for old_file in session['uploaded_files']:
+            # Очищаем старые файлы черновика и с диска перед загрузкой новых
+            old_files = _staged_import().get('uploaded_files')
+            if old_files:
+                logger.info(f"Очистка {len(old_files)} старых файлов из черновика импорта")
+                for old_file in old_files:
                     old_filepath = old_file.get('filepath')
                     if old_filepath and os.path.exists(old_filepath):
                         try:
@@ -283,20 +218,16 @@ def upload_file():
                         except Exception as e:
                             logger.warning(f"Не удалось удалить старый файл {old_filepath}: {str(e)}")
             
-            # Очищаем старые данные парсера
-            if 'parser_data' in session:
-                old_parser_data = session.pop('parser_data', None)
-                logger.debug("Очищены старые данные парсера из сессии")
+            # Старый черновик (вместе с данными парсера) заменяется новым
+            _discard_staged_import()
             
-            # Сохраняем новый список файлов в сессии (заменяем, а не добавляем)
-            # Ограничиваем размер данных в сессии - сохраняем только необходимую информацию
+            # Список файлов хранится в черновике на сервере, в сессии — только import_id
             try:
-                session['uploaded_files'] = uploaded_files
-                session.modified = True
-                logger.info(f"Загружено {len(uploaded_files)} новых файлов в сессию")
+                _save_staged_import({'uploaded_files': uploaded_files})
+                logger.info(f"Загружено {len(uploaded_files)} новых файлов в черновик импорта")
             except Exception as session_error:
-                logger.error(f"Ошибка сохранения в сессию: {str(session_error)}", exc_info=True)
-                # Если не удалось сохранить в сессию, удаляем загруженные файлы
+                logger.error(f"Ошибка сохранения черновика импорта: {str(session_error)}", exc_info=True)
+                # Если не удалось сохранить черновик, удаляем загруженные файлы
                 for uploaded_file in uploaded_files:
                     filepath = uploaded_file.get('filepath')
                     if filepath and os.path.exists(filepath):
@@ -305,7 +236,7 @@ def upload_file():
                         except:
                             pass
                 return jsonify({
-                    'error': f'Ошибка сохранения данных: слишком много файлов для сессии. Пожалуйста, загрузите файлы порциями по 10-15 штук.'
+                    'error': f'Ошибка сохранения данных импорта: {str(session_error)}'
                 }), 500
             
             message = f'Загружено файлов: {len(uploaded_files)}'
@@ -335,7 +266,10 @@ def upload_file():
             if 'session' in error_message.lower() or 'too large' in error_message.lower():
                 error_message = 'Слишком много файлов для обработки за раз. Попробуйте загрузить меньше файлов (рекомендуется не более 10-15 файлов за раз).'
             return jsonify({'error': f'Внутренняя ошибка сервера: {error_message}'}), 500
-    return render_template('upload.html')
+    # Импорт, поставленный со страницы нормализации: страница сразу опрашивает его статус
+    import_job_id = request.args.get('import_job', type=int)
+    import_job_status_url = url_for('admin.import_job_status_view', job_id=import_job_id) if import_job_id else None
+    return render_template('upload.html', import_job_status_url=import_job_status_url)
 
 @admin_bp.route('/analyze-xml', methods=['POST'])
 @admin_required
@@ -343,11 +277,12 @@ def upload_file():
 def analyze_xml():
     """Анализ XML файла(ов) без сохранения в базу"""
     try:
-        logger.info(f"Запрос на анализ XML. Сессия содержит uploaded_files: {'uploaded_files' in session}")
+        staged = _staged_import()
+        logger.info(f"Запрос на анализ XML. Черновик содержит uploaded_files: {'uploaded_files' in staged}")
         
-        # Проверяем, есть ли файлы в сессии (множественная загрузка)
-        if 'uploaded_files' in session and session['uploaded_files']:
-            uploaded_files = session['uploaded_files']
+        # Проверяем, есть ли файлы в черновике (множественная загрузка)
+        if staged.get('uploaded_files'):
+            uploaded_files = staged['uploaded_files']
             logger.info(f"Анализ {len(uploaded_files)} файлов из сессии")
             
             all_categories_analysis = []
@@ -355,17 +290,28 @@ def analyze_xml():
             all_file_data = []
             errors = []
             
+            existing_files = []
             for file_info in uploaded_files:
-                filepath = file_info['filepath']
-                if not os.path.exists(filepath):
+                if not os.path.exists(file_info['filepath']):
                     error_msg = f'Файл "{file_info["filename"]}" не найден на сервере'
                     logger.error(error_msg)
                     errors.append(error_msg)
                     continue
-                    
+                existing_files.append(file_info)
+            
+            # Файлы разбираются параллельно в пуле процессов; при ошибке — по одному,
+            # чтобы сообщить, какой именно файл не разобрался
+            try:
+                parsers = parse_xml_files([f['filepath'] for f in existing_files])
+            except Exception as e:
+                logger.warning(f"Параллельный разбор не удался, разбираем по одному: {str(e)}")
+                parsers = [None] * len(existing_files)
+            
+            for file_info, parser in zip(existing_files, parsers):
+                filepath = file_info['filepath']
                 try:
-                    parser = ISUCalcFSParser(filepath)
-                    parser.parse()
+                    if parser is None:
+                        parser = parse_xml_cached(filepath)
                     categories_analysis = analyze_categories_from_xml(parser)
                     
                     all_categories_analysis.extend(categories_analysis)
@@ -394,13 +340,13 @@ def analyze_xml():
             if not all_file_data:
                 return jsonify({'error': 'Не удалось проанализировать ни одного файла. ' + '; '.join(errors)}), 500
             
-            # Сохраняем данные всех файлов в сессии
-            session['parser_data'] = {
+            # Сохраняем данные всех файлов в черновике
+            staged['parser_data'] = {
                 'files': all_file_data,
                 'categories_analysis': all_categories_analysis,
                 'parser_summaries': all_parser_summaries
             }
-            session.modified = True
+            _save_staged_import(staged)
             
             total_categories = len(all_categories_analysis)
             total_files = len(all_file_data)
@@ -442,10 +388,9 @@ def analyze_xml():
             except ET.ParseError as e:
                 os.remove(filepath)
                 return jsonify({'error': f'Файл не является корректным XML: {str(e)}'}), 400
-            parser = ISUCalcFSParser(filepath)
-            parser.parse()
+            parser = parse_xml_cached(filepath)
             categories_analysis = analyze_categories_from_xml(parser)
-            session['parser_data'] = {
+            parser_data = {
                 'filepath': filepath,
                 'upload_original_filename': file.filename,
                 'categories_analysis': categories_analysis,
@@ -459,10 +404,11 @@ def analyze_xml():
                     'performances': len(parser.performances)
                 }
             }
+            _save_staged_import({'parser_data': parser_data})
             return jsonify({
                 'success': True,
                 'categories_analysis': categories_analysis,
-                'parser_summary': session['parser_data']['parser_summary'],
+                'parser_summary': parser_data['parser_summary'],
                 'message': f'Файл проанализирован. Найдено {len(categories_analysis)} категорий'
             })
         except Exception as e:
@@ -474,14 +420,31 @@ def analyze_xml():
         logger.error(f"Критическая ошибка при анализе XML (внешний обработчик): {str(e)}", exc_info=True)
         return jsonify({'error': f'Внутренняя ошибка сервера при анализе XML: {str(e)}'}), 500
 
+def _submit_normalized_import(parser_data):
+    """Ставит задачу импорта черновика после нормализации; редирект на страницу загрузки с её прогрессом.
+
+    None — задачу поставить не удалось (ошибка уже во flash), страница нормализации показывается снова.
+    """
+    try:
+        job_id = submit_import_job(current_app._get_current_object(), parser_data)
+    except Exception as e:
+        logger.error(f"Ошибка при постановке задачи импорта: {str(e)}", exc_info=True)
+        flash(f'Ошибка при сохранении данных: {str(e)}', 'error')
+        return None
+    # Файлы и настройки теперь принадлежат задаче — черновик больше не нужен
+    _discard_staged_import()
+    return redirect(url_for('admin.upload_file', import_job=job_id))
+
+
 @admin_bp.route('/normalize-categories', methods=['GET', 'POST'])
 @admin_required
 def normalize_categories():
     """Страница для ручной нормализации категорий"""
-    if 'parser_data' not in session:
+    staged = _staged_import()
+    parser_data = staged.get('parser_data')
+    if not parser_data:
         flash('Нет данных для нормализации', 'error')
         return redirect(url_for('admin.upload_file'))
-    parser_data = session['parser_data']
     
     # Поддержка множественных файлов
     if 'files' in parser_data:
@@ -499,52 +462,15 @@ def normalize_categories():
                 if index < len(categories_analysis):
                     categories_analysis[index]['normalized'] = normalized_name
                     categories_analysis[index]['needs_manual'] = False
-            session['parser_data']['categories_analysis'] = categories_analysis
-            
-            # Сохраняем все файлы последовательно
-            try:
-                deleted_indices = set(parser_data.get('deleted_category_indices', []))
-                resolutions = _safe_parse_birth_conflict_resolutions(
-                    request.form.get('birth_conflict_resolutions', '')
-                )
+            parser_data['birth_conflict_resolutions'] = _safe_parse_birth_conflict_resolutions(
+                request.form.get('birth_conflict_resolutions', '')
+            )
+            _save_staged_import(staged)
 
-                parsers_bundle = list(iter_ready_parsers(parser_data, categories_analysis, deleted_indices))
-                if parsers_bundle:
-                    apply_birth_conflict_resolutions_json(
-                        resolutions, [p for p, _fp, _fn in parsers_bundle]
-                    )
-                    db.session.flush()
-
-                total_athletes = 0
-                up_folder = current_app.config['UPLOAD_FOLDER']
-                for parser, filepath, original_filename in parsers_bundle:
-                    save_to_database(parser)
-                    total_athletes += len(parser.get_athletes_with_results())
-                    archive_imported_xml(
-                        filepath,
-                        original_filename or os.path.basename(filepath),
-                        up_folder,
-                    )
-                    if os.path.exists(filepath):
-                        try:
-                            os.remove(filepath)
-                        except OSError as e:
-                            logger.warning(f"Не удалось удалить файл {filepath}: {str(e)}")
-                    else:
-                        logger.warning(f"Файл уже не существует при попытке удаления: {filepath}")
-
-                # Очищаем сессию
-                session.pop('parser_data', None)
-                session.pop('uploaded_files', None)
-                deleted_count = len(deleted_indices)
-                if deleted_count > 0:
-                    flash(f'Успешно загружено файлов: {len(parser_data["files"])}. Добавлено спортсменов: {total_athletes}. Исключено категорий: {deleted_count}', 'success')
-                else:
-                    flash(f'Успешно загружено файлов: {len(parser_data["files"])}. Добавлено спортсменов: {total_athletes}', 'success')
-                return redirect(url_for('public.index'))
-            except Exception as e:
-                logger.error(f"Ошибка при сохранении нормализованных данных: {str(e)}")
-                flash(f'Ошибка при сохранении данных: {str(e)}', 'error')
+            # Файлы записываются фоновой задачей импорта, как и /upload-to-database
+            response = _submit_normalized_import(parser_data)
+            if response is not None:
+                return response
         
         all_ranks = []
         from services.rank_service import RANK_DICTIONARY
@@ -587,64 +513,26 @@ def normalize_categories():
                 if index < len(categories_analysis):
                     categories_analysis[index]['deleted'] = True
             
-            session['parser_data']['categories_analysis'] = categories_analysis
-            session['parser_data']['deleted_category_indices'] = list(deleted_indices)
-            
-            try:
-                filepath = parser_data.get('filepath')
-                if not filepath:
-                    flash('Ошибка: путь к файлу не найден в данных сессии. Попробуйте загрузить файл заново.', 'error')
-                    return redirect(url_for('admin.upload_file'))
-                
-                if not os.path.exists(filepath):
-                    logger.error(f"Файл не найден: {filepath}")
-                    flash(f'Ошибка: файл {os.path.basename(filepath)} не найден. Возможно, он был удален. Попробуйте загрузить файл заново.', 'error')
-                    session.pop('parser_data', None)
-                    return redirect(url_for('admin.upload_file'))
-
-                resolutions = _safe_parse_birth_conflict_resolutions(
-                    request.form.get('birth_conflict_resolutions', '')
-                )
-
-                parsers_bundle = list(iter_ready_parsers(parser_data, categories_analysis, deleted_indices))
-                if parsers_bundle:
-                    apply_birth_conflict_resolutions_json(
-                        resolutions, [p for p, _fp, _fn in parsers_bundle]
-                    )
-                    db.session.flush()
-
-                deleted_count = len(deleted_indices)
-                up_folder = current_app.config['UPLOAD_FOLDER']
-                if parsers_bundle:
-                    parser, filepath, original_filename = parsers_bundle[0]
-                    save_to_database(parser)
-                    if deleted_count > 0:
-                        flash(f'Файл успешно загружен и обработан с нормализацией категорий! Исключено категорий: {deleted_count}', 'success')
-                    else:
-                        flash('Файл успешно загружен и обработан с нормализацией категорий!', 'success')
-                else:
-                    flash('Файл обработан, но все категории были исключены из импорта.', 'warning')
-
-                if parsers_bundle:
-                    _parser, fp_del, orig_fn = parsers_bundle[0]
-                    archive_imported_xml(
-                        fp_del,
-                        orig_fn or os.path.basename(fp_del),
-                        up_folder,
-                    )
-                    if os.path.exists(fp_del):
-                        try:
-                            os.remove(fp_del)
-                        except OSError as e:
-                            logger.warning(f"Не удалось удалить файл {fp_del}: {str(e)}")
-                    else:
-                        logger.warning(f"Файл уже не существует при попытке удаления: {fp_del}")
-
-                session.pop('parser_data', None)
-                return redirect(url_for('public.index'))
-            except Exception as e:
-                logger.error(f"Ошибка при сохранении нормализованных данных: {str(e)}")
-                flash(f'Ошибка при сохранении данных: {str(e)}', 'error')
+            parser_data['deleted_category_indices'] = sorted(deleted_indices)
+            parser_data['birth_conflict_resolutions'] = _safe_parse_birth_conflict_resolutions(
+                request.form.get('birth_conflict_resolutions', '')
+            )
+            _save_staged_import(staged)
+
+            filepath = parser_data.get('filepath')
+            if not filepath:
+                flash('Ошибка: путь к файлу не найден в данных сессии. Попробуйте загрузить файл заново.', 'error')
+                return redirect(url_for('admin.upload_file'))
+
+            if not os.path.exists(filepath):
+                logger.error(f"Файл не найден: {filepath}")
+                flash(f'Ошибка: файл {os.path.basename(filepath)} не найден. Возможно, он был удален. Попробуйте загрузить файл заново.', 'error')
+                _discard_staged_import()
+                return redirect(url_for('admin.upload_file'))
+
+            response = _submit_normalized_import(parser_data)
+            if response is not None:
+                return response
         all_ranks = []
         from services.rank_service import RANK_DICTIONARY
         for rank_data in RANK_DICTIONARY.values():
@@ -706,80 +594,37 @@ def admin_site_reader_login_log():
 @admin_bp.route('/upload-to-database', methods=['POST'])
 @admin_required
 def upload_to_database():
-    """Финальная загрузка данных в базу после нормализации"""
-    if 'parser_data' not in session:
+    """Финальная загрузка данных в базу после нормализации: ставит фоновую задачу импорта"""
+    parser_data = _staged_import().get('parser_data')
+    if not parser_data:
         return jsonify({'error': 'Нет данных для загрузки'}), 400
-    parser_data = session['parser_data']
     
     try:
-        # Поддержка множественных файлов
-        if 'files' in parser_data:
-            category_index = 0
-            total_athletes = 0
-            processed_files = []
-            
-            for file_info in parser_data['files']:
-                parser = ISUCalcFSParser(file_info['filepath'])
-                parser.parse()
-                
-                # Применяем нормализацию к категориям этого файла
-                file_categories_count = file_info['categories_count']
-                categories_analysis = parser_data['categories_analysis']
-                
-                for i, category in enumerate(parser.categories):
-                    if category_index < len(categories_analysis):
-                        category['normalized_name'] = categories_analysis[category_index]['normalized']
-                        category_index += 1
-                
-                save_to_database(parser)
-                athletes_count = len(parser.get_athletes_with_results())
-                total_athletes += athletes_count
-                archive_imported_xml(
-                    file_info['filepath'],
-                    file_info.get('filename') or os.path.basename(file_info['filepath']),
-                    current_app.config['UPLOAD_FOLDER'],
-                )
-                processed_files.append({
-                    'filename': file_info['filename'],
-                    'athletes': athletes_count
-                })
-                os.remove(file_info['filepath'])
-            
-            session.pop('parser_data', None)
-            session.pop('uploaded_files', None)
-            
-            files_info = ', '.join([f"{f['filename']} ({f['athletes']} спортсменов)" for f in processed_files])
-            return jsonify({
-                'success': True,
-                'message': f'Успешно загружено файлов: {len(processed_files)}. Всего добавлено спортсменов: {total_athletes}.',
-                'files_info': files_info,
-                'total_athletes': total_athletes
-            })
-        else:
-            # Один файл (старая логика)
-            parser = ISUCalcFSParser(parser_data['filepath'])
-            parser.parse()
-            categories_analysis = parser_data['categories_analysis']
-            for i, category in enumerate(parser.categories):
-                if i < len(categories_analysis):
-                    category['normalized_name'] = categories_analysis[i]['normalized']
-            save_to_database(parser)
-            athletes_count = len(parser.get_athletes_with_results())
-            archive_imported_xml(
-                parser_data['filepath'],
-                parser_data.get('upload_original_filename') or os.path.basename(parser_data['filepath']),
-                current_app.config['UPLOAD_FOLDER'],
-            )
-            os.remove(parser_data['filepath'])
-            session.pop('parser_data', None)
-            return jsonify({
-                'success': True,
-                'message': f'Файл успешно загружен в базу данных! Добавлено {athletes_count} спортсменов.'
-            })
+        job_id = submit_import_job(current_app._get_current_object(), parser_data)
     except Exception as e:
-        logger.error(f"Ошибка при загрузке в базу: {str(e)}")
+        logger.error(f"Ошибка при постановке задачи импорта: {str(e)}", exc_info=True)
         return jsonify({'error': f'Ошибка при загрузке в базу: {str(e)}'}), 500
 
+    # Файлы и настройки теперь принадлежат задаче — черновик больше не нужен
+    _discard_staged_import()
+    return jsonify({
+        'success': True,
+        'started': True,
+        'job_id': job_id,
+        'status_url': url_for('admin.import_job_status_view', job_id=job_id),
+        'message': 'Импорт запущен. Прогресс обновляется автоматически...'
+    })
+
+
+@admin_bp.route('/admin/import-jobs/<int:job_id>', methods=['GET'])
+@admin_required
+def import_job_status_view(job_id):
+    """Статус фоновой задачи импорта для polling из UI."""
+    status = import_job_status(current_app._get_current_object(), job_id)
+    if status is None:
+        return jsonify({'error': 'Задача импорта не найдена'}), 404
+    return jsonify(status)
+
 @admin_bp.route('/admin/login', methods=['GET', 'POST'])
 @limiter.limit("10 per minute")
 def admin_login():
@@ -814,7 +659,7 @@ def admin_logout():
 @admin_required
 def admin_export_google_sheets():
     """Экспорт данных в Google Sheets и подготовка ссылок PDF по ключевым таблицам."""
-    from google_sheets_sync import export_to_google_sheets, DEFAULT_SPREADSHEET_ID
+    from google_sheets_sync import DEFAULT_SPREADSHEET_ID
     
     # Проверяем наличие файла credentials (используем тот же способ, что и в google_sheets_sync.py)
     import os
@@ -851,29 +696,36 @@ def admin_export_google_sheets():
                     pdf_urls={}
                 )
         
+        # Полная перезапись всех листов вместо отправки только изменений
+        payload = request.get_json(silent=True) or {}
+        full_sync = bool(payload.get('full_sync')) or request.form.get('full_sync') == '1'
+
         if wants_json:
             # Для AJAX запускаем задачу в фоне и сразу возвращаем JSON, чтобы не упереться в timeout прокси
-            started = _start_google_export_background(current_app._get_current_object())
-            if started:
+            job_id = submit_export_job(current_app._get_current_object(), full_sync=full_sync)
+            if job_id is not None:
                 return jsonify({
                     'success': True,
                     'started': True,
                     'running': True,
+                    'job_id': job_id,
                     'message': 'Экспорт запущен. Это может занять несколько минут...'
                 })
-            with _export_job_lock:
-                state = _read_export_state(current_app._get_current_object())
-                return jsonify({
-                    'success': True,
-                    'started': False,
-                    'running': bool(state.get('running')),
-                    'message': state.get('message') or 'Экспорт уже выполняется'
-                })
+            status = export_job_status() or {}
+            return jsonify({
+                'success': True,
+                'started': False,
+                'running': bool(status.get('running')),
+                'job_id': status.get('id'),
+                'message': status.get('message') or 'Экспорт уже выполняется'
+            })
 
         # Для обычного POST оставляем синхронное поведение
         try:
-            result = export_to_google_sheets()
-            if result.get('success'):
+            result = run_export_job(full_sync=full_sync)
+            if result is None:
+                flash('Экспорт уже выполняется', 'warning')
+            elif result.get('success'):
                 flash('Данные успешно экспортированы в Google Sheets!', 'success')
             else:
                 flash(f'Ошибка экспорта: {result.get("message", "Неизвестная ошибка")}', 'error')
@@ -886,24 +738,40 @@ def admin_export_google_sheets():
         'admin_export_google_sheets.html',
         credentials_exists=credentials_exists,
         spreadsheet_id=DEFAULT_SPREADSHEET_ID,
-        pdf_urls=pdf_urls
+        pdf_urls=pdf_urls,
+        export_history=recent_export_jobs()
+    )
+
+
+@admin_bp.route('/admin/export-xlsx', methods=['GET'])
+@admin_required
+def admin_export_xlsx():
+    """Те же листы, что и в Google Sheets, одним .xlsx (без сети и лимитов Google API)."""
+    from google_sheets_sync import export_to_xlsx
+    from services.xlsx_export import XLSX_MIMETYPE
+
+    buffer = io.BytesIO()
+    result = export_to_xlsx(buffer)
+    if not result.get('success'):
+        flash(f'Ошибка экспорта: {result.get("message", "Неизвестная ошибка")}', 'error')
+        return redirect(url_for('admin.admin_export_google_sheets'))
+    buffer.seek(0)
+    return send_file(
+        buffer,
+        mimetype=XLSX_MIMETYPE,
+        as_attachment=True,
+        download_name=f'reports-{date.today().isoformat()}.xlsx',
     )
 
 
 @admin_bp.route('/admin/export-google-sheets-status', methods=['GET'])
 @admin_required
 def admin_export_google_sheets_status():
-    """Статус фонового экспорта в Google Sheets для polling из UI."""
-    with _export_job_lock:
-        state = _read_export_state(current_app._get_current_object())
-        return jsonify({
-            'running': bool(state.get('running')),
-            'success': state.get('success'),
-            'message': state.get('message'),
-            'url': state.get('url'),
-            'started_at': state.get('started_at'),
-            'finished_at': state.get('finished_at'),
-        })
+    """Статус последнего экспорта в Google Sheets для polling из UI (прогресс по листам)."""
+    status = export_job_status()
+    if status is None:
+        status = {'running': False, 'success': None, 'message': None, 'url': None, 'sheets': []}
+    return jsonify(status)
 
 
 @admin_bp.route('/admin/event-rank-update', methods=['POST'])
@@ -929,6 +797,7 @@ def admin_event_rank_update():
 
     event.event_rank = selected_rank or None
     try:
+        bump_data_version()
         db.session.commit()
         return jsonify({
             'success': True,
@@ -1027,6 +896,7 @@ def admin_event_ranks():
 
         event.event_rank = selected_rank or None
         try:
+            bump_data_version()
             db.session.commit()
             flash(f'Ранг турнира "{event.name}" обновлён', 'success')
         except Exception as e:
@@ -1069,6 +939,8 @@ def admin_free_participation():
                     updated_count += 1
             
             try:
+                refresh_event_athlete_rank_stats(event_id)
+                bump_data_version()
                 db.session.commit()
                 event = Event.query.get(event_id)
                 flash(f'Успешно установлено бесплатное участие для {updated_count} спортсменов в турнире "{event.name}"', 'success')
@@ -1088,6 +960,8 @@ def admin_free_participation():
                 updated_count += 1
             
             try:
+                refresh_event_athlete_rank_stats(event_id)
+                bump_data_version()
                 db.session.commit()
                 event = Event.query.get(event_id)
                 flash(f'Успешно убрано бесплатное участие для {updated_count} спортсменов в турнире "{event.name}"', 'success')
@@ -1109,6 +983,8 @@ def admin_free_participation():
             event.exclude_free_from_reports = new_value
 
             try:
+                refresh_event_athlete_rank_stats(event.id)
+                bump_data_version()
                 db.session.commit()
                 if new_value:
                     flash(
@@ -1168,6 +1044,8 @@ def participant_free_report_toggle():
 
     participant.exclude_free_from_reports = not include_in_reports
     try:
+        refresh_athlete_rank_stats([participant.athlete_id])
+        bump_data_version()
         db.session.commit()
         if include_in_reports:
             flash('Участие снова учитывается как БЕСП в отчетах', 'success')
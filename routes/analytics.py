@@ -12,6 +12,8 @@ from flask import Blueprint, render_template, request, send_file, url_for, sessi
 from sqlalchemy import func
 from extensions import db
 from models import Athlete, Participant, Event, Category, JudgeHelperFreeAudit
+from services.athlete_name_index import get_athlete_name_index, name_words
+from services.response_cache import get_or_compute
 from utils.access_control import SESSION_SITE_READER_KEY
 from utils.client_ip import get_client_ip
 
@@ -23,13 +25,6 @@ logger = logging.getLogger(__name__)
 _JUDGE_HELPER_NAMES_RAW_MAX = int(os.environ.get('JUDGE_HELPER_NAMES_RAW_MAX', '600000'))
 
 
-def _normalize_words(s):
-    if not s or not isinstance(s, str):
-        return []
-    s = re.sub(r'\s+', ' ', (s or '').strip()).lower()
-    return s.split() if s else []
-
-
 def _is_year(s):
     """Строка — год (4 цифры)."""
     s = (s or '').strip()
@@ -86,7 +81,7 @@ def _parse_pasted_list(text):
             continue
         if not _looks_like_fio(ln):
             continue
-        words = _normalize_words(ln)
+        words = name_words(ln)
         if len(words) < 2:
             continue
         # Не схлопываем разных людей с одинаковыми фамилией+именем:
@@ -113,7 +108,7 @@ def _check_names_against_db(names):
     # - base_key (2 слова) для случая без отчества
     name_keys = []
     for fio in names:
-        words = _normalize_words(fio)
+        words = name_words(fio)
         if len(words) >= 2:
             base_key = frozenset(words[:2])
             full_key = frozenset(words[:3]) if len(words) >= 3 else None
@@ -121,13 +116,8 @@ def _check_names_against_db(names):
             name_keys.append((fio, base_key, full_key, dedup_key))
     if not name_keys:
         return [], [], list(names)
-    # Все спортсмены из БД: (id, full_name, set слов)
-    athletes_data = []
-    for a in Athlete.query.all():
-        name = a.full_name
-        words = set(_normalize_words(name))
-        if words:
-            athletes_data.append((a.id, name, words))
+    # Инвертированный индекс слов ФИО всех спортсменов (кешируется до следующего импорта)
+    name_index = get_athlete_name_index()
     found = []
     fio_only_matches = []
     not_found = []
@@ -139,17 +129,17 @@ def _check_names_against_db(names):
 
         # Если ввели отчество — ищем точное совпадение по 3 словам.
         if full_key:
-            raw_matches = [(aid, db_name) for aid, db_name, name_words in athletes_data if full_key <= name_words]
+            raw_matches = name_index.match(full_key)
             if not raw_matches:
                 # Мягкий fallback: точного ФИО нет, но есть совпадения по ФИ.
-                base_matches = [(aid, db_name) for aid, db_name, name_words in athletes_data if base_key <= name_words]
+                base_matches = name_index.match(base_key)
                 matches = _enrich_matches(base_matches)
                 if matches:
                     fio_only_matches.append((fio, matches))
                     continue
         else:
             # Без отчества показываем все варианты с одинаковыми фамилией и именем.
-            raw_matches = [(aid, db_name) for aid, db_name, name_words in athletes_data if base_key <= name_words]
+            raw_matches = name_index.match(base_key)
 
         matches = _enrich_matches(raw_matches)
         if matches:
@@ -293,14 +283,19 @@ def school_segment_event_ranks():
         count_distinct_athletes_filtered,
     )
 
-    reports = {
-        'overall': build_event_rank_school_segment_report(db.session),
-        'events': build_per_event_school_segment_report(db.session),
-        'categories': build_per_category_school_segment_report(db.session),
-        'event_categories': build_per_event_category_school_segment_report(db.session),
-    }
-
-    distinct_athletes_filtered = count_distinct_athletes_filtered(db.session)
+    def compute():
+        reports = {
+            'overall': build_event_rank_school_segment_report(db.session),
+            'events': build_per_event_school_segment_report(db.session),
+            'categories': build_per_category_school_segment_report(db.session),
+            'event_categories': build_per_event_category_school_segment_report(db.session),
+        }
+        return reports, count_distinct_athletes_filtered(db.session)
+
+    # В отчётах есть generated_date — ключ меняется каждый день.
+    reports, distinct_athletes_filtered = get_or_compute(
+        'school_segment_event_ranks', {'date': date.today().isoformat()}, compute
+    )
     return render_template(
         'school_segment_event_rank.html',
         reports=reports,
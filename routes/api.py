@@ -9,8 +9,8 @@ from flask import Blueprint, jsonify, request, Response, abort
 from extensions import db
 from utils.access_control import request_has_api_access
 from event_rank_constants import CATEGORY_RANKS_MS_KMS
-from models import Event, Category, Athlete, Participant, Club, Segment, Performance, Coach, CoachAssignment, Element, ComponentScore
-from season_utils import get_season_from_date
+from models import Event, Category, Athlete, AthleteRankStats, Participant, Club, Segment, Performance, Coach, CoachAssignment, Element, ComponentScore
+from season_utils import get_current_season, get_season_from_date
 from services.rank_service import (
     normalize_category_name,
     get_rank_weight,
@@ -18,7 +18,9 @@ from services.rank_service import (
     athlete_display_name,
     compute_rank_unique_participation_stats,
 )
-from utils.search_utils import normalize_search_term, create_multi_field_search_filter
+from services.response_cache import cached_json_view
+from services.search_index import build_search_filter
+from utils.search_utils import normalize_search_term
 from utils.normalizers import normalize_string
 
 logger = logging.getLogger(__name__)
@@ -187,24 +189,22 @@ def api_statistics():
     })
 
 @api_bp.route('/analytics/top-athletes')
+@cached_json_view
 def api_top_athletes():
     """API для получения топ спортсменов, сгруппированных по разрядам"""
     try:
+        # Готовые агрегаты по паре спортсмен+разряд (services/athlete_rank_stats.py)
         athletes_query = db.session.query(
             Athlete.id,
             Athlete.first_name,
             Athlete.last_name,
             Athlete.full_name_xml,
-            Category.name.label('category_name'),
-            Category.gender.label('category_gender'),
-            Category.normalized_name.label('normalized_name'),
-            db.func.count(Participant.id).label('participations'),
-            db.func.min(Participant.total_place).label('best_place'),
-            db.func.max(Participant.total_points).label('best_points')
-        ).select_from(Athlete).join(
-            Participant, Athlete.id == Participant.athlete_id
-        ).join(Category, Participant.category_id == Category.id).group_by(
-            Athlete.id, Category.name, Category.gender, Category.normalized_name
+            AthleteRankStats.rank,
+            AthleteRankStats.participations,
+            AthleteRankStats.best_place,
+            AthleteRankStats.best_points
+        ).select_from(AthleteRankStats).join(
+            Athlete, AthleteRankStats.athlete_id == Athlete.id
         ).all()
 
         def get_athlete_name(athlete):
@@ -214,8 +214,9 @@ def api_top_athletes():
 
         ranks_data = {}
         total_participations = {}
+        best_places = {}
         for row in athletes_query:
-            rank = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
+            rank = row.rank
             rank_weight = get_rank_weight(rank)
             if rank not in ranks_data:
                 ranks_data[rank] = {'name': rank, 'weight': rank_weight, 'athletes': []}
@@ -235,6 +236,8 @@ def api_top_athletes():
             if athlete_id not in total_participations:
                 total_participations[athlete_id] = 0
             total_participations[athlete_id] += row.participations
+            if row.best_place is not None and (best_places.get(athlete_id) is None or row.best_place < best_places[athlete_id]):
+                best_places[athlete_id] = row.best_place
         for rank in ranks_data:
             ranks_data[rank]['athletes'].sort(
                 key=lambda x: (x['best_place'] or 999, -x['best_points'])
@@ -243,7 +246,7 @@ def api_top_athletes():
         all_athletes = []
         for row in athletes_query:
             athlete_id = row.id
-            rank = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
+            rank = row.rank
             if not any(a['id'] == athlete_id for a in all_athletes):
                 all_athletes.append({
                     'id': athlete_id,
@@ -261,20 +264,12 @@ def api_top_athletes():
         # Формируем список топ спортсменов по участиям с разрядами
         by_participations = []
         for athlete in top_participants:
-            # Находим лучшее место для этого спортсмена
-            best_place_row = db.session.query(
-                db.func.min(Participant.total_place)
-            ).filter(
-                Participant.athlete_id == athlete['id'],
-                Participant.total_place.isnot(None)
-            ).scalar()
-            
             by_participations.append({
                 'id': athlete['id'],
                 'name': athlete['name'],
                 'participations': athlete['participations'],
                 'rank': athlete['rank'],
-                'best_place': best_place_row
+                'best_place': best_places.get(athlete['id'])
             })
         
         return jsonify({
@@ -288,6 +283,7 @@ def api_top_athletes():
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/analytics/club-statistics')
+@cached_json_view
 def api_club_statistics():
     """API для получения статистики по клубам"""
     club_athlete_stats = db.session.query(
@@ -319,6 +315,7 @@ def api_club_statistics():
     return jsonify(result)
 
 @api_bp.route('/analytics/category-statistics')
+@cached_json_view
 def api_category_statistics():
     """API для получения статистики по категориям"""
     category_stats = db.session.query(
@@ -368,6 +365,7 @@ FREE_PARTICIPATION_EXCLUDED_RANKS = CATEGORY_RANKS_MS_KMS
 
 
 @api_bp.route('/analytics/free-participation')
+@cached_json_view
 def api_free_participation():
     """API для получения спортсменов с бесплатным участием (без МС и КМС, только 3 юн–1 сп)."""
     try:
@@ -515,6 +513,7 @@ def api_free_participation():
         return jsonify({'error': str(e)}), 500
 
 @api_bp.route('/analytics/club-free-participation')
+@cached_json_view
 def api_club_free_participation():
     """API для получения статистики бесплатного участия по школам/клубам"""
     try:
@@ -612,13 +611,7 @@ def api_athletes():
     search_filter = None
     if search and search.strip():
         normalized = normalize_search_term(search)
-        search_filter = create_multi_field_search_filter(
-            search,
-            Athlete.first_name,
-            Athlete.last_name,
-            Athlete.full_name_xml,
-            Athlete.patronymic
-        )
+        search_filter = build_search_filter(Athlete, search)
         if search_filter is None:
             logger.info(f"Поисковый фильтр не создан для запроса длиной {len(normalized)}")
     
@@ -877,7 +870,15 @@ def api_clubs():
         for club in clubs_data
     ])
 
+def _free_participation_key_params():
+    """season=current разрешается по сегодняшней дате — в ключ кеша идёт сам сезон."""
+    if request.args.get('season') == 'current':
+        return {'current_season': get_current_season()}
+    return {}
+
+
 @api_bp.route('/analytics/free-participation-analysis')
+@cached_json_view(key_params=_free_participation_key_params)
 def api_free_participation_analysis():
     """API для анализа бесплатного участия с фильтрацией по количеству участий"""
     try:
@@ -1060,7 +1061,7 @@ def api_coaches():
         
         # Поиск с нормализацией
         if search:
-            search_filter = create_multi_field_search_filter(search, Coach.name)
+            search_filter = build_search_filter(Coach, search)
             if search_filter is not None:
                 query = query.filter(search_filter)
         
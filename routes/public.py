@@ -10,6 +10,8 @@ from extensions import db
 from models import Event, Category, Athlete, Participant, Club, Coach, CoachAssignment, SiteReaderLoginLog
 from season_utils import get_all_seasons_from_events
 from services.rank_service import build_rank_groups, build_best_results
+from services.response_cache import get_or_compute
+from services.search_index import build_search_filter
 from utils.access_control import SESSION_SITE_READER_KEY, safe_same_site_redirect_path
 from utils.client_ip import get_client_ip
 
@@ -18,13 +20,6 @@ logger = logging.getLogger(__name__)
 public_bp = Blueprint('public', __name__)
 
 
-def _normalize_search_text(value):
-    """Нормализация строки для гибкого поиска (регистр/е-ё)."""
-    if not value:
-        return ''
-    return str(value).casefold().replace('ё', 'е')
-
-
 @public_bp.route('/')
 def index():
     """Главная страница"""
@@ -111,6 +106,10 @@ def events():
             )
         except (ValueError, AttributeError):
             pass
+    if search:
+        search_filter = build_search_filter(Event, search, min_word_length=1)
+        if search_filter is not None:
+            query = query.filter(search_filter)
     sql_sort_fields = {
         'name': Event.name,
         'place': Event.place,
@@ -131,21 +130,6 @@ def events():
         elif sort_by == 'participants_count':
             events_list = sorted(events_list, key=lambda event: len(event.participants or []), reverse=reverse)
 
-    if search:
-        normalized_terms = [_normalize_search_text(term) for term in search.split() if term.strip()]
-        if normalized_terms:
-            filtered_events = []
-            for event in events_list:
-                searchable_text = _normalize_search_text(' '.join([
-                    event.name or '',
-                    event.long_name or '',
-                    event.place or '',
-                    event.venue or '',
-                ]))
-                if all(term in searchable_text for term in normalized_terms):
-                    filtered_events.append(event)
-            events_list = filtered_events
-
     seasons = get_all_seasons_from_events(events_list)
     all_ranks = db.session.query(Category.normalized_name).distinct().filter(
         Category.normalized_name.isnot(None),
@@ -185,7 +169,7 @@ def categories():
     """Страница с группировкой по разрядам и спортсменам"""
     event_id = request.args.get('event', type=int)
     events_list = Event.query.order_by(Event.begin_date.desc()).all()
-    rank_groups = build_rank_groups(event_id=event_id)
+    rank_groups = get_or_compute('categories', {'event_id': event_id}, lambda: build_rank_groups(event_id=event_id))
     selected_event_obj = next((event for event in events_list if event.id == event_id), None)
     unique_athlete_ids = set()
     for group in rank_groups:
@@ -214,7 +198,9 @@ def categories():
 def best_results():
     """Страница лучших результатов по разрядам"""
     rank_name = request.args.get('rank', '').strip()
-    rank_groups = build_best_results(rank_name=rank_name or None)
+    rank_groups = get_or_compute(
+        'best_results', {'rank': rank_name}, lambda: build_best_results(rank_name=rank_name or None)
+    )
     selected_rank_obj = next((rank for rank in rank_groups if rank['display_name'] == rank_name), None)
     rank_summary = {
         'total_ranks': len(rank_groups),
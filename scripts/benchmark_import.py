@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Бенчмарк импорта на синтетическом турнире (без XML): показывает, как время
+save_to_database растёт с числом участников. Работает на временной SQLite БД,
+рабочая база не затрагивается.
+
+Запуск:
+    python scripts/benchmark_import.py            # 250, 500, 1000 участников
+    python scripts/benchmark_import.py 1000 2000
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+_TMP_DIR = tempfile.mkdtemp(prefix='import_bench_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_TMP_DIR, 'bench.db')
+
+from app import app, db  # noqa: E402
+from parsers.isu_calcfs_parser import ISUCalcFSParser  # noqa: E402
+from services.import_service import save_to_database  # noqa: E402
+
+SEGMENTS_PER_CATEGORY = 2
+PARTICIPANTS_PER_CATEGORY = 25
+CLUBS = 40
+
+
+def build_synthetic_parser(num_participants, event_no):
+    """Парсер с результатом, похожим на реальный XML: каждый участник повторяется в каждом сегменте."""
+    num_categories = max(1, num_participants // PARTICIPANTS_PER_CATEGORY)
+    result = {name: [] for name in ISUCalcFSParser.RESULT_FIELDS}
+    result.update({'persons_by_id': {}, '_pct_ppname_by_id': {}, 'performances_by_participant': {}})
+
+    result['events'].append({
+        'id': '1', 'name': f'Синтетический турнир {event_no}', 'begin_date': date(2025, 1, 1 + event_no % 28),
+        'end_date': date(2025, 1, 1 + event_no % 28),
+    })
+    for c in range(1, CLUBS + 1):
+        result['clubs'].append({'id': f'C{c}', 'name': f'СШОР Синтетика {c}', 'short_name': '', 'country': 'RUS', 'city': ''})
+
+    for cat in range(1, num_categories + 1):
+        gender = 'F' if cat % 2 else 'M'
+        result['categories'].append({
+            'id': str(cat), 'name': f'{1 + cat % 3} Спортивный разряд', 'gender': gender, 'type': 'S', 'level': '1',
+        })
+        segment_ids = []
+        for seg in range(SEGMENTS_PER_CATEGORY):
+            segment_id = str(cat * 10 + seg)
+            segment_ids.append(segment_id)
+            result['segments'].append({
+                'id': segment_id, 'category_id': str(cat), 'name': 'Короткая' if seg == 0 else 'Произвольная',
+                'type': 'S' if seg == 0 else 'F', 'factor': '100', 'component_factors': {},
+            })
+        for n in range(PARTICIPANTS_PER_CATEGORY):
+            pct_id = f'P{event_no}_{cat}_{n}'
+            par_id = f'{cat}_{n}'
+            person = {
+                'id': pct_id, 'type': 'PER', 'gender': gender, 'club_id': f'C{1 + n % CLUBS}',
+                'birth_date': date(2012, 1 + n % 12, 1 + n % 28),
+                'first_name': f'Имя{n}', 'last_name': f'Фамилия{cat}x{n}', 'patronymic': 'Отчество',
+                'coach': f'Тренер {n % 30}',
+            }
+            result['persons'].append(person)
+            result['persons_by_id'][pct_id] = person
+            for segment_id in segment_ids:
+                result['participants'].append({
+                    'id': par_id, 'category_id': str(cat), 'person_id': pct_id, 'bib_number': str(n + 1),
+                    'rank': str(n + 1), 'total_points': str(10000 - n), 'status': 'A', 'pct_ppname': None,
+                })
+                performance = {
+                    'segment_id': segment_id, 'participant_id': par_id, 'rank': str(n + 1), 'points': str(5000 - n),
+                    'status': 'A',
+                    'elements': [
+                        {'order_num': e, 'executed_code': '2A', 'base_value': '330', 'result': '350', 'judge_scores': {'J01': 6}}
+                        for e in range(1, 8)
+                    ],
+                    'components': [
+                        {'component_type': t, 'result': '700', 'judge_scores': {'J01': '700'}} for t in ('CO', 'PR', 'SK')
+                    ],
+                }
+                result['performances'].append(performance)
+                result['performances_by_participant'].setdefault(par_id, []).append(performance)
+    return ISUCalcFSParser.from_result(None, result)
+
+
+def scan_lookup_time(parser):
+    """Старый способ: полный проход по performances и persons на каждого участника."""
+    start = time.perf_counter()
+    for participant_data in parser.participants:
+        next((p for p in parser.persons if p['id'] == participant_data['person_id']), None)
+        for performance_data in parser.performances:
+            if performance_data.get('participant_id') == participant_data['id']:
+                pass
+    return time.perf_counter() - start
+
+
+def grouped_lookup_time(parser):
+    start = time.perf_counter()
+    for participant_data in parser.participants:
+        parser.persons_by_id.get(participant_data['person_id'])
+        for _performance_data in parser.performances_by_participant.get(participant_data['id'], ()):
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    sizes = [int(x) for x in sys.argv[1:]] or [250, 500, 1000]
+    print(f"{'участников':>11} | {'скан, с':>9} | {'группы, с':>9} | {'импорт, с':>9} | {'мс/участника':>12}")
+    with app.app_context():
+        db.create_all()
+        for event_no, size in enumerate(sizes, start=1):
+            parser = build_synthetic_parser(size, event_no)
+            scan = scan_lookup_time(parser)
+            grouped = grouped_lookup_time(parser)
+            start = time.perf_counter()
+            save_to_database(parser)
+            elapsed = time.perf_counter() - start
+            print(f"{size:>11} | {scan:>9.3f} | {grouped:>9.4f} | {elapsed:>9.2f} | {elapsed / size * 1000:>12.2f}")
+    print(f"\nВременная БД: {_TMP_DIR}")
+
+
+if __name__ == '__main__':
+    main()
@@ -5,7 +5,8 @@
 """
 
 from app import app, db
-from models import Event, Category, Segment, Club, Athlete, Participant, Performance
+from models import Event, Category, Segment, Club, Athlete, AthleteRankStats, Participant, Performance
+from services.data_version import bump_data_version
 
 def clear_database():
     """Полностью очищает базу данных"""
@@ -19,6 +20,9 @@ def clear_database():
         print("Удаление участников...")
         Participant.query.delete()
         
+        print("Удаление агрегатов по разрядам...")
+        AthleteRankStats.query.delete()
+        
         print("Удаление спортсменов...")
         Athlete.query.delete()
         
@@ -35,6 +39,7 @@ def clear_database():
         Event.query.delete()
         
         # Сохраняем изменения
+        bump_data_version()
         db.session.commit()
         
         print("✅ База данных полностью очищена")
@@ -20,6 +20,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Athlete, Participant, CoachAssignment, Club
+from services.athlete_rank_stats import refresh_changed_athletes
 
 ATHLETE_IDS_TO_DELETE = [143, 119]
 CLUB_ID_TO_DELETE = 15
@@ -105,6 +106,7 @@ def main():
             if club:
                 db.session.delete(club)
 
+            refresh_changed_athletes(ATHLETE_IDS_TO_DELETE)
             db.session.commit()
             print("✅ Спортсмены и школа удалены.")
             return 0
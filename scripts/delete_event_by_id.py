@@ -16,6 +16,7 @@ if project_root not in sys.path:
 from app_factory import create_app
 from extensions import db
 from models import Event, Category, Participant, CoachAssignment
+from services.athlete_rank_stats import refresh_changed_athletes
 
 
 def delete_event_by_id(event_id: int, backup: bool = True):
@@ -65,7 +66,11 @@ def delete_event_by_id(event_id: int, backup: bool = True):
         CoachAssignment.query.filter_by(event_id=event_id).delete()
         db.session.flush()
         # Затем удаляем сам турнир — каскадно удалятся Category, Participant, Segment, Performance, Element, ComponentScore, JudgePanel
+        athlete_ids = [row.athlete_id for row in Participant.query.filter_by(event_id=event_id).with_entities(Participant.athlete_id)]
         db.session.delete(event)
+        db.session.flush()
+        # Агрегаты по разрядам пересчитываются для спортсменов удалённого турнира
+        refresh_changed_athletes(athlete_ids)
         db.session.commit()
         print("Турнир и все связанные данные удалены.")
         return True
@@ -6,6 +6,7 @@
 
 from app import app, db
 from models import Event, Category, Participant, Performance, Segment
+from services.athlete_rank_stats import refresh_changed_athletes
 import os
 import shutil
 from datetime import datetime
@@ -110,11 +111,18 @@ def delete_event_by_name(event_name):
         # Удаляем
         print("\nУдаление...")
         
+        athlete_ids = [
+            row.athlete_id for row in
+            Participant.query.filter(Participant.event_id.in_([event.id for event in events_to_delete]))
+            .with_entities(Participant.athlete_id)
+        ]
         for event in events_to_delete:
             # SQLAlchemy автоматически удалит связанные данные благодаря cascade
             db.session.delete(event)
         
         try:
+            db.session.flush()
+            refresh_changed_athletes(athlete_ids)
             db.session.commit()
             
             print("\n" + "="*100)
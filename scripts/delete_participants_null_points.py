@@ -19,6 +19,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Participant, Athlete, Event, Category
+from services.athlete_rank_stats import refresh_changed_athletes
 
 
 def create_backup():
@@ -149,6 +150,7 @@ def delete_null_points_participants():
         
         # Сохраняем изменения
         try:
+            refresh_changed_athletes(p.athlete_id for p in participants_to_delete)
             db.session.commit()
             
             print("\n" + "=" * 80)
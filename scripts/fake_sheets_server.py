@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Локальный фейковый Sheets API для проверки services/sheets_scheduler.py без
+Google: принимает spreadsheets:batchUpdate и values:batchUpdate, хранит
+значения ячеек в памяти и запоминает все вызовы (GET /calls).
+Запросы с mergeCells, пересекающимися с уже объединёнными ячейками, отклоняются
+целиком (как в настоящем API), чтобы проверить повтор пакета частями.
+
+Запуск:
+    python scripts/fake_sheets_server.py              # сервер на 127.0.0.1:8765
+    python scripts/fake_sheets_server.py --port 9000
+    python scripts/fake_sheets_server.py --demo       # прогон планировщика на тестовом листе
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BASE_DIR not in sys.path:
+    sys.path.append(BASE_DIR)
+
+from services.sheets_scheduler import HttpTransport, SheetsScheduler, TokenBucket  # noqa: E402
+
+_PATH_RE = re.compile(r'^/v4/spreadsheets/([^/:]+)(/values)?:batchUpdate$')
+_CELL_RE = re.compile(r'^([A-Z]+)(\d+)')
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index
+
+
+class FakeSheets:
+    """Состояние фейковой таблицы: значения по листам, объединения и журнал вызовов."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = []
+        self.cells = {}  # (лист, строка, колонка) -> значение
+        self.merges = []  # GridRange
+
+    @staticmethod
+    def _overlaps(a, b):
+        if a.get('sheetId') != b.get('sheetId'):
+            return False
+        for start, end in (('startRowIndex', 'endRowIndex'), ('startColumnIndex', 'endColumnIndex')):
+            if a.get(end, 10 ** 9) <= b.get(start, 0) or b.get(end, 10 ** 9) <= a.get(start, 0):
+                return False
+        return True
+
+    def batch_update(self, spreadsheet_id, body):
+        requests = body.get('requests', [])
+        merges = list(self.merges)
+        for request in requests:
+            if 'unmergeCells' in request:
+                merges = [m for m in merges if not self._overlaps(m, request['unmergeCells']['range'])]
+            elif 'mergeCells' in request:
+                grid = request['mergeCells']['range']
+                if any(self._overlaps(m, grid) for m in merges):
+                    self.calls.append({'method': 'batchUpdate', 'spreadsheetId': spreadsheet_id,
+                                       'requests': len(requests), 'error': 'merge'})
+                    raise ValueError('You cannot merge cells that are already merged')
+                merges.append(grid)
+        self.merges = merges
+        self.calls.append({'method': 'batchUpdate', 'spreadsheetId': spreadsheet_id, 'requests': len(requests)})
+        return {'spreadsheetId': spreadsheet_id, 'replies': [{} for _ in requests]}
+
+    def values_batch_update(self, spreadsheet_id, body):
+        cells = 0
+        for entry in body.get('data', []):
+            title, _, a1 = entry['range'].rpartition('!')
+            title = title.strip("'").replace("''", "'")
+            match = _CELL_RE.match(a1)
+            first_row, first_col = int(match.group(2)), _column_index(match.group(1))
+            for r, row in enumerate(entry.get('values') or []):
+                for c, value in enumerate(row):
+                    self.cells[(title, first_row + r, first_col + c)] = value
+                    cells += 1
+        self.calls.append({
+            'method': 'values:batchUpdate',
+            'spreadsheetId': spreadsheet_id,
+            'valueInputOption': body.get('valueInputOption'),
+            'ranges': len(body.get('data', [])),
+        })
+        return {'spreadsheetId': spreadsheet_id, 'totalUpdatedCells': cells}
+
+
+def make_handler(state):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            raw = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(raw)))
+            self.end_headers()
+            self.wfile.write(raw)
+
+        def do_GET(self):
+            if self.path == '/calls':
+                with state.lock:
+                    self._reply(200, state.calls)
+            else:
+                self._reply(404, {'error': {'code': 404, 'message': 'Not found'}})
+
+        def do_POST(self):
+            match = _PATH_RE.match(self.path)
+            if not match:
+                self._reply(404, {'error': {'code': 404, 'message': 'Not found'}})
+                return
+            length = int(self.headers.get('Content-Length') or 0)
+            body = json.loads(self.rfile.read(length).decode('utf-8') or '{}')
+            spreadsheet_id, is_values = match.group(1), bool(match.group(2))
+            try:
+                with state.lock:
+                    if is_values:
+                        payload = state.values_batch_update(spreadsheet_id, body)
+                    else:
+                        payload = state.batch_update(spreadsheet_id, body)
+            except ValueError as e:
+                self._reply(400, {'error': {'code': 400, 'message': str(e), 'status': 'INVALID_ARGUMENT'}})
+                return
+            self._reply(200, payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def run_demo(server, state):
+    """Два листа как в экспорте: очистка, заголовок, данные, форматы, объединения, ширины, заморозка."""
+    base_url = f'http://{server.server_address[0]}:{server.server_address[1]}'
+    scheduler = SheetsScheduler(HttpTransport(base_url, 'demo'), bucket=TokenBucket(60))
+    for sheet_id, title in ((1, 'Спортсмены'), (2, 'Школы')):
+        sheet = scheduler.sheet(str(sheet_id), sheet_id, title)
+        sheet.batch_update({'requests': [{'unmergeCells': {'range': {'sheetId': sheet_id}}}]})
+        sheet.update_acell('A1', f'{title.upper()} - Обновлено: 01.01.2026 12:00')
+        sheet.format('A1:G1', {'textFormat': {'bold': True, 'fontSize': 14}})
+        rows = [[f'Спортсмен {i}', i, 'МС'] for i in range(1, 201)]
+        sheet.update('A3:C202', rows)
+        sheet.batch_format([{'range': f'A{row}:C{row}', 'format': {'textFormat': {'bold': True}}} for row in range(3, 203, 20)])
+        sheet.format('A:Z', {'wrapStrategy': 'WRAP'})
+        sheet.batch_update({'requests': [
+            {'mergeCells': {'range': {'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1,
+                                      'startColumnIndex': 0, 'endColumnIndex': 7}, 'mergeType': 'MERGE_ALL'}},
+            # Повторное объединение той же строки: API отклонит весь пакет
+            {'mergeCells': {'range': {'sheetId': sheet_id, 'startRowIndex': 0, 'endRowIndex': 1,
+                                      'startColumnIndex': 0, 'endColumnIndex': 3}, 'mergeType': 'MERGE_ALL'}},
+            {'updateDimensionProperties': {'range': {'sheetId': sheet_id, 'dimension': 'COLUMNS',
+                                                     'startIndex': 0, 'endIndex': 1},
+                                           'properties': {'pixelSize': 250}, 'fields': 'pixelSize'}},
+        ]})
+        sheet.freeze(rows=1)
+    scheduler.flush()
+    for call in state.calls:
+        print(call)
+    print(f'Вызовов API: {scheduler.api_calls}, ячеек в таблице: {len(state.cells)}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Фейковый Sheets API для проверки планировщика записей')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--demo', action='store_true', help='прогнать планировщик на тестовых листах и выйти')
+    args = parser.parse_args()
+
+    state = FakeSheets()
+    server = ThreadingHTTPServer((args.host, 0 if args.demo else args.port), make_handler(state))
+    if args.demo:
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            run_demo(server, state)
+        finally:
+            server.shutdown()
+        return
+    print(f'Фейковый Sheets API: http://{args.host}:{args.port}/v4/spreadsheets/<id>:batchUpdate')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
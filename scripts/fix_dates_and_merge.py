@@ -6,6 +6,7 @@
 
 from app import app, db
 from models import Athlete, Participant
+from services.athlete_rank_stats import refresh_changed_athletes
 from datetime import datetime, date
 import os
 import shutil
@@ -125,6 +126,7 @@ def fix_and_merge():
         
         merged_total = 0
         removed_total = 0
+        changed_athlete_ids = set()
         
         for i, fix in enumerate(fixes, 1):
             print(f"\n[{i}/{len(fixes)}] {fix['name']}...")
@@ -167,11 +169,13 @@ def fix_and_merge():
                     print(f"   ID {wrong_athlete.id} -> ID {correct_athlete.id} (перенесено {len(participations)} участий)")
                     
                     # Удаляем неправильного
+                    changed_athlete_ids.update((correct_athlete.id, wrong_athlete.id))
                     db.session.delete(wrong_athlete)
                     removed_total += 1
         
         # Сохраняем
         try:
+            refresh_changed_athletes(changed_athlete_ids)
             db.session.commit()
             
             print("\n" + "="*100)
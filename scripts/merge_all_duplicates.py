@@ -7,6 +7,7 @@
 
 from app import app, db
 from models import Athlete, Participant, Event, Club
+from services.athlete_rank_stats import refresh_changed_athletes
 from sqlalchemy import func
 from datetime import datetime
 import os
@@ -197,6 +198,9 @@ def merge_all_duplicates(auto_confirm=False):
             print("СОХРАНЕНИЕ ИЗМЕНЕНИЙ В БАЗУ ДАННЫХ...")
             print("="*100)
             
+            refresh_changed_athletes(
+                athlete_id for r in results for athlete_id in [r['main_id'], *r['removed_ids']]
+            )
             db.session.commit()
             
             print("\nУСПЕШНО!")
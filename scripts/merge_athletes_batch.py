@@ -19,6 +19,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Athlete, Participant, CoachAssignment
+from services.athlete_rank_stats import refresh_changed_athletes
 
 # Пары: (удалить_id, оставить_id) — объединить удаляемого в оставляемого
 MERGE_PAIRS = [
@@ -94,6 +95,8 @@ def merge_one(keep_id, remove_id):
     if len(rf) > len(kf):
         keep.full_name_xml = rf
     db.session.delete(remove)
+    db.session.flush()
+    refresh_changed_athletes([keep_id, remove_id])
     db.session.commit()
     return True
 
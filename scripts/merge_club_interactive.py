@@ -17,6 +17,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Club, Athlete
+from services.data_version import bump_data_version
 from difflib import SequenceMatcher
 
 # Словарь расшифровок распространенных аббревиатур
@@ -464,6 +465,7 @@ def interactive_merge_club():
                 continue
             
             try:
+                bump_data_version()
                 db.session.commit()
                 
                 print("\n" + "=" * 80)
@@ -6,6 +6,7 @@
 
 from app import app, db
 from models import Athlete, Participant
+from services.athlete_rank_stats import refresh_changed_athletes
 from datetime import date
 
 def merge_vasilisa():
@@ -68,6 +69,7 @@ def merge_vasilisa():
             # Удаляем дубликат
             print(f"🗑️  Удаляю дубликат (ID: {athlete2_id})...")
             db.session.delete(athlete2)
+            refresh_changed_athletes([athlete1_id, athlete2_id])
             
             # Сохраняем изменения
             db.session.commit()
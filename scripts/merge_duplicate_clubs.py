@@ -18,6 +18,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Club, Athlete
+from services.data_version import bump_data_version
 from utils.normalizers import normalize_string, fix_latin_to_cyrillic
 from difflib import SequenceMatcher
 
@@ -231,6 +232,7 @@ def merge_duplicate_clubs():
                     db.session.delete(remove_club)
                     merged_count += 1
                 
+                bump_data_version()
                 db.session.commit()
                 print(f"  ✅ Группа объединена")
                 print()
@@ -7,6 +7,7 @@
 
 from app import app, db
 from models import Athlete, Participant
+from services.athlete_rank_stats import refresh_changed_athletes
 from sqlalchemy import func
 from datetime import datetime
 from difflib import SequenceMatcher
@@ -121,6 +122,7 @@ def merge_all():
         
         merged = 0
         removed = 0
+        changed_athlete_ids = set()
         
         for i, group in enumerate(all_groups, 1):
             # Основной = с длинным ФИО
@@ -138,6 +140,7 @@ def merge_all():
                     merged += 1
                 
                 # Удаляем
+                changed_athlete_ids.update((main.id, dup.id))
                 db.session.delete(dup)
                 removed += 1
             
@@ -145,6 +148,7 @@ def merge_all():
                 print(f"  Обработано {i}/{len(all_groups)}...")
         
         # Сохраняем
+        refresh_changed_athletes(changed_athlete_ids)
         db.session.commit()
         
         print("\n" + "="*100)
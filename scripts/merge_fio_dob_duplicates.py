@@ -23,6 +23,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Athlete, Participant, CoachAssignment
+from services.athlete_rank_stats import refresh_changed_athletes
 
 
 def normalize_fio_for_compare(name):
@@ -188,8 +189,11 @@ def main():
             return 1
 
         try:
+            changed_athlete_ids = set()
             for keep_id, remove_ids, display_name, birth in to_merge:
                 merge_group(keep_id, remove_ids, choose_best_name=True)
+                changed_athlete_ids.update([keep_id, *remove_ids])
+            refresh_changed_athletes(changed_athlete_ids)
             db.session.commit()
             print("\n✅ Все группы объединены успешно.")
             print(f"📦 Бэкап: backups/{os.path.basename(backup_file)}")
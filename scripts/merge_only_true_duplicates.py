@@ -7,6 +7,7 @@
 
 from app import app, db
 from models import Athlete, Participant
+from services.athlete_rank_stats import refresh_changed_athletes
 from sqlalchemy import func
 from datetime import datetime
 from difflib import SequenceMatcher
@@ -258,6 +259,7 @@ def merge_true_duplicates():
         print("Объединение...")
         merged_count = 0
         removed_count = 0
+        changed_athlete_ids = set()
         
         for group in groups_to_merge:
             athletes = group['athletes']
@@ -274,11 +276,13 @@ def merge_true_duplicates():
             
             # Объединяем
             merge_athlete(keep.id, [a.id for a in remove])
+            changed_athlete_ids.update(a.id for a in athletes)
             merged_count += 1
             removed_count += len(remove)
         
         # Сохраняем
         try:
+            refresh_changed_athletes(changed_athlete_ids)
             db.session.commit()
             
             print("\n" + "="*100)
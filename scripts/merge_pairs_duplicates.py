@@ -7,6 +7,7 @@
 
 from app import app, db
 from models import Athlete, Participant
+from services.athlete_rank_stats import refresh_changed_athletes
 from sqlalchemy import func
 from datetime import datetime
 from difflib import SequenceMatcher
@@ -152,6 +153,7 @@ def merge_pairs():
         print("Объединение...")
         merged_count = 0
         removed_count = 0
+        changed_athlete_ids = set()
         
         for group in groups_to_merge:
             athletes = group['athletes']
@@ -165,6 +167,7 @@ def merge_pairs():
             athletes_with_stats.sort(key=lambda x: x[1], reverse=True)
             keep = athletes_with_stats[0][0]
             remove = [a[0] for a in athletes_with_stats[1:]]
+            changed_athlete_ids.update(a.id for a in athletes)
             
             # Переносим участия
             for remove_athlete in remove:
@@ -180,6 +183,7 @@ def merge_pairs():
         
         # Сохраняем
         try:
+            refresh_changed_athletes(changed_athlete_ids)
             db.session.commit()
             
             print("\n" + "="*100)
@@ -33,6 +33,8 @@ if project_root not in sys.path:
 from app_factory import create_app
 from extensions import db
 from models import Club, Athlete, CoachAssignment
+from services.athlete_rank_stats import refresh_changed_athletes
+from services.data_version import bump_data_version
 
 
 def get_db_path(app):
@@ -170,6 +172,7 @@ def cmd_merge(app, keep_id, remove_id, yes=False, no_delete=False):
                 Athlete.query.filter_by(club_id=remove_id).update({'club_id': keep_id})
             if not no_delete:
                 db.session.delete(remove)
+            bump_data_version()
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -252,6 +255,7 @@ def cmd_merge_many(app, keep_id, remove_ids, yes=False, no_delete=False):
                     Athlete.query.filter_by(club_id=rid).update({'club_id': keep_id})
                 if not no_delete:
                     db.session.delete(c)
+            bump_data_version()
             db.session.commit()
         except Exception as e:
             db.session.rollback()
@@ -289,6 +293,7 @@ def cmd_unassign(app, athlete_id, yes=False):
                 return 0
         try:
             athlete.club_id = None
+            bump_data_version()
             db.session.commit()
             print(f"Готово. У спортсмена {athlete_id} теперь club_id = NULL.")
             if club:
@@ -322,6 +327,7 @@ def cmd_delete_athlete(app, athlete_id, yes=False):
         try:
             CoachAssignment.query.filter_by(athlete_id=athlete_id).delete()
             db.session.delete(athlete)
+            refresh_changed_athletes([athlete_id])
             db.session.commit()
             print(f"Спортсмен ID {athlete_id} удалён из базы.")
             if club:
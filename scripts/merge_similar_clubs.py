@@ -17,6 +17,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Club, Athlete
+from services.data_version import bump_data_version
 from difflib import SequenceMatcher
 
 
@@ -364,6 +365,7 @@ def merge_similar_clubs_interactive():
         
         # Сохраняем изменения
         try:
+            bump_data_version()
             db.session.commit()
             
             print("\n" + "=" * 80)
@@ -7,6 +7,7 @@
 
 from app import app, db
 from models import Athlete, Participant, Event, Club
+from services.athlete_rank_stats import refresh_changed_athletes
 from sqlalchemy import func
 from datetime import datetime
 import os
@@ -196,6 +197,7 @@ def merge_smart_duplicates():
         
         merged_count = 0
         removed_count = 0
+        changed_athlete_ids = set()
         
         for i, group in enumerate(groups, 1):
             print(f"\n[{i}/{len(groups)}] {group['lastname_normalized']}...")
@@ -218,6 +220,7 @@ def merge_smart_duplicates():
                     merged_count += 1
                 
                 # Удаляем дубликат
+                changed_athlete_ids.update((main.id, dup.id))
                 db.session.delete(dup)
                 removed_count += 1
                 
@@ -225,6 +228,7 @@ def merge_smart_duplicates():
         
         # Сохраняем
         try:
+            refresh_changed_athletes(changed_athlete_ids)
             db.session.commit()
             print("\n" + "="*100)
             print("УСПЕШНО!")
@@ -17,6 +17,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Club, Athlete, Participant, CoachAssignment
+from services.athlete_rank_stats import refresh_changed_athletes
 
 
 def create_backup():
@@ -193,6 +194,10 @@ def merge_two_athletes(keep_athlete_id, remove_athlete_id, use_full_name=None, s
             
             # Удаляем дубликат
             db.session.delete(remove_athlete)
+            db.session.flush()
+            
+            # Пересчитываем агрегаты по разрядам для обоих id
+            refresh_changed_athletes([keep_athlete_id, remove_athlete_id])
             
             # Коммитим изменения
             db.session.commit()
@@ -18,6 +18,7 @@ if project_root not in sys.path:
 
 from app import app, db
 from models import Club, Athlete
+from services.data_version import bump_data_version
 
 
 def create_backup():
@@ -122,6 +123,7 @@ def merge_two_clubs(keep_club_id, remove_club_id, skip_confirm=False):
             db.session.delete(remove_club)
             
             # Коммитим изменения
+            bump_data_version()
             db.session.commit()
             
             # Проверяем результат
@@ -2,162 +2,130 @@
 # -*- coding: utf-8 -*-
 """
 Скрипт для заполнения таблиц тренеров из существующих данных участников
-Использование: python scripts/populate_coaches_from_participants.py
+Использование:
+    python scripts/populate_coaches_from_participants.py            # восстановить недостающие назначения
+    python scripts/populate_coaches_from_participants.py --rebuild  # пересобрать всю хронологию заново
+
+Используется тот же механизм, что и при импорте XML (CoachTimelineBuilder):
+участники читаются одним запросом в хронологическом порядке, переходы
+считаются в памяти и записываются пакетно.
+По умолчанию хронология пересобирается только для спортсменов, у которых
+записанные назначения расходятся с участиями (например, пропущено раннее
+участие): их назначения удаляются и строятся заново с самого раннего турнира,
+остальные спортсмены не затрагиваются.
 """
 
 import os
 import sys
-from datetime import datetime
+import argparse
 
 # Добавляем текущую директорию в путь
 project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
 
+from sqlalchemy import func
+
 from app import app, db
-from models import Coach, CoachAssignment, Participant, Athlete, Event
+from models import Coach, CoachAssignment, Participant, Event
+from services.coach_assignment_service import LOOKUP_CHUNK_SIZE, CoachTimelineBuilder
 from services.coach_registry import CoachRegistry
-from utils.normalizers import normalize_string, fix_latin_to_cyrillic
 
-def populate_coaches():
+
+def _assignment_key(row):
+    return (
+        row['coach_id'], row['participant_id'], row['event_id'],
+        row['start_date'], row['end_date'], bool(row['is_current']),
+    )
+
+
+def populate_coaches(rebuild=False):
     """Заполняет таблицы тренеров из существующих данных участников"""
     with app.app_context():
         print("=" * 80)
         print("ЗАПОЛНЕНИЕ ТАБЛИЦ ТРЕНЕРОВ ИЗ СУЩЕСТВУЮЩИХ ДАННЫХ")
         print("=" * 80)
         print()
-        
-        coach_registry = CoachRegistry()
-        
-        # Получаем всех участников с тренерами, отсортированных по дате события
+
+        if rebuild:
+            deleted = CoachAssignment.query.delete(synchronize_session=False)
+            print(f"Удалено назначений для пересборки: {deleted}")
+
+        event_date = func.coalesce(Event.begin_date, Event.end_date)
+        # Все участники с тренерами в хронологическом порядке
         participants_with_coaches = db.session.query(
-            Participant, Athlete, Event
-        ).join(
-            Athlete, Participant.athlete_id == Athlete.id
+            Participant.id, Participant.athlete_id, Participant.coach, Event.id, event_date
         ).join(
             Event, Participant.event_id == Event.id
         ).filter(
             Participant.coach.isnot(None),
-            Participant.coach != ''
+            Participant.coach != '',
+            event_date.isnot(None)
         ).order_by(
-            Event.begin_date.asc(),
-            Athlete.id.asc()
+            event_date.asc(),
+            Event.id.asc(),
+            Participant.athlete_id.asc(),
+            Participant.id.asc()
         ).all()
-        
+
         print(f"Найдено участников с тренерами: {len(participants_with_coaches)}")
         print()
-        
-        # Словарь для отслеживания текущих тренеров спортсменов
-        athlete_current_coaches = {}  # {athlete_id: (coach_id, event_date)}
-        
-        processed = 0
-        transitions = 0
-        
-        for participant, athlete, event in participants_with_coaches:
-            coach_name = participant.coach.strip()
-            if not coach_name:
-                continue
-            
-            # Получаем или создаем тренера
-            coach = coach_registry.get_or_create(coach_name)
-            if not coach:
-                continue
-            
-            db.session.flush()
-            
-            # Получаем дату события
-            event_date = event.begin_date or event.end_date
-            if not event_date:
-                continue
-            
-            athlete_id = athlete.id
-            coach_id = coach.id
-            
-            # Проверяем, есть ли уже назначение для этого спортсмена с этим тренером на это событие
-            existing_assignment = CoachAssignment.query.filter_by(
-                athlete_id=athlete_id,
-                coach_id=coach_id,
-                event_id=event.id
-            ).first()
-            
-            if existing_assignment:
-                continue  # Уже обработано
-            
-            # Проверяем текущего тренера спортсмена
-            current_coach_info = athlete_current_coaches.get(athlete_id)
-            
-            if current_coach_info:
-                current_coach_id, current_event_date = current_coach_info
-                
-                # Если тренер изменился - это переход
-                if current_coach_id != coach_id:
-                    # Закрываем предыдущее назначение
-                    previous_assignment = CoachAssignment.query.filter_by(
-                        athlete_id=athlete_id,
-                        coach_id=current_coach_id,
-                        is_current=True
-                    ).first()
-                    
-                    if previous_assignment:
-                        previous_assignment.end_date = event_date
-                        previous_assignment.is_current = False
-                        transitions += 1
-                    
-                    # Создаем новое назначение
-                    new_assignment = CoachAssignment(
-                        coach_id=coach_id,
-                        athlete_id=athlete_id,
-                        participant_id=participant.id,
-                        event_id=event.id,
-                        start_date=event_date,
-                        is_current=True
-                    )
-                    db.session.add(new_assignment)
-                    
-                    # Обновляем информацию о текущем тренере
-                    athlete_current_coaches[athlete_id] = (coach_id, event_date)
-                # Если тренер тот же, но дата раньше - обновляем start_date
-                elif event_date < current_event_date:
-                    # Находим назначение с более поздней датой и обновляем
-                    assignment = CoachAssignment.query.filter_by(
-                        athlete_id=athlete_id,
-                        coach_id=coach_id,
-                        is_current=True
-                    ).first()
-                    
-                    if assignment and assignment.start_date > event_date:
-                        assignment.start_date = event_date
-                        assignment.participant_id = participant.id
-                        assignment.event_id = event.id
-                        athlete_current_coaches[athlete_id] = (coach_id, event_date)
-            else:
-                # Первое назначение тренера для этого спортсмена
-                new_assignment = CoachAssignment(
-                    coach_id=coach_id,
-                    athlete_id=athlete_id,
-                    participant_id=participant.id,
-                    event_id=event.id,
-                    start_date=event_date,
-                    is_current=True
-                )
-                db.session.add(new_assignment)
-                athlete_current_coaches[athlete_id] = (coach_id, event_date)
-            
-            processed += 1
-            
-            if processed % 100 == 0:
-                db.session.commit()
-                print(f"Обработано: {processed} участников, переходов: {transitions}")
-        
+
+        coach_registry = CoachRegistry()
+        coach_registry.resolve_many(row[2] for row in participants_with_coaches)
+
+        def build_timeline(rows):
+            timeline = CoachTimelineBuilder()
+            for participant_id, athlete_id, coach_name, event_id, date in rows:
+                coach = coach_registry.get_or_create(coach_name)
+                if coach:
+                    timeline.record(athlete_id, coach.id, participant_id, event_id, date)
+            return timeline
+
+        timeline = build_timeline(participants_with_coaches)
+        if not rebuild:
+            # Участие может оказаться раньше уже записанных назначений, поэтому хронологию
+            # не дописываем, а пересобираем целиком у спортсменов, у которых она расходится с базой
+            expected = {
+                athlete_id: {_assignment_key(row) for row in rows}
+                for athlete_id, rows in timeline.new_rows_by_athlete().items()
+            }
+            athlete_ids = sorted({row[1] for row in participants_with_coaches})
+            stored = {}
+            for start in range(0, len(athlete_ids), LOOKUP_CHUNK_SIZE):
+                rows = db.session.query(
+                    CoachAssignment.athlete_id, CoachAssignment.coach_id, CoachAssignment.participant_id,
+                    CoachAssignment.event_id, CoachAssignment.start_date, CoachAssignment.end_date,
+                    CoachAssignment.is_current,
+                ).filter(CoachAssignment.athlete_id.in_(athlete_ids[start:start + LOOKUP_CHUNK_SIZE]))
+                for row in rows:
+                    stored.setdefault(row.athlete_id, set()).add(_assignment_key(row._asdict()))
+            affected = [a for a in athlete_ids if expected.get(a, set()) != stored.get(a, set())]
+            print(f"Спортсменов с расходящейся хронологией: {len(affected)}")
+
+            deleted = 0
+            for start in range(0, len(affected), LOOKUP_CHUNK_SIZE):
+                deleted += CoachAssignment.query.filter(
+                    CoachAssignment.athlete_id.in_(affected[start:start + LOOKUP_CHUNK_SIZE])
+                ).delete(synchronize_session=False)
+            print(f"Удалено назначений для пересборки: {deleted}")
+            affected = set(affected)
+            timeline = build_timeline(row for row in participants_with_coaches if row[1] in affected)
+
+        created, closed = timeline.write()
         db.session.commit()
-        
+
         print()
         print("=" * 80)
-        print(f"✅ Обработано участников: {processed}")
-        print(f"✅ Найдено переходов: {transitions}")
-        print(f"✅ Создано тренеров: {Coach.query.count()}")
-        print(f"✅ Создано назначений: {CoachAssignment.query.count()}")
+        print(f"✅ Создано назначений: {created}")
+        print(f"✅ Найдено переходов: {timeline.transitions} (закрыто прежних назначений: {closed})")
+        print(f"✅ Тренеров в базе: {Coach.query.count()}")
+        print(f"✅ Назначений в базе: {CoachAssignment.query.count()}")
         print("=" * 80)
 
+
 if __name__ == '__main__':
-    populate_coaches()
+    parser = argparse.ArgumentParser(description='Заполнение хронологии тренеров из Participant.coach')
+    parser.add_argument('--rebuild', action='store_true', help='удалить все назначения и построить хронологию заново')
+    args = parser.parse_args()
+    populate_coaches(rebuild=args.rebuild)
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Полный пересчёт таблицы athlete_rank_stats (агрегаты участий по спортсмену и разряду).
+Нужно после скриптов, которые меняют участия в обход services/athlete_rank_stats.py
+(массовые объединения спортсменов, ручные правки БД).
+"""
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_factory import create_app
+from extensions import db
+from services.athlete_rank_stats import rebuild_athlete_rank_stats
+from services.data_version import bump_data_version
+
+app = create_app()
+
+with app.app_context():
+    total = rebuild_athlete_rank_stats()
+    bump_data_version()
+    db.session.commit()
+    print(f"athlete_rank_stats пересчитана: {total} строк")
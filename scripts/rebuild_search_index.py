@@ -0,0 +1,30 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Пересчёт колонок search_key и перестроение полнотекстового индекса поиска (FTS5)
+по спортсменам, тренерам, клубам и турнирам.
+Нужно после правок БД в обход ORM (массовые UPDATE/DELETE в скриптах).
+"""
+import sys
+import os
+
+# Добавляем корневую директорию в путь
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app_factory import create_app
+from extensions import db
+from services.search_index import create_search_tables, backfill_search_keys, rebuild_search_index
+
+app = create_app()
+
+with app.app_context():
+    connection = db.session.connection()
+    changed = backfill_search_keys(connection)
+    print(f"search_key пересчитан: {changed} записей изменено")
+    if connection.dialect.name == 'sqlite':
+        create_search_tables(connection)
+        total = rebuild_search_index(connection)
+        print(f"Индекс поиска перестроен: {total} записей")
+    else:
+        print("Полнотекстовый индекс поддерживается только для SQLite — поиск идёт по search_key")
+    db.session.commit()
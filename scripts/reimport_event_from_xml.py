@@ -8,6 +8,7 @@ from app import app, db
 from models import Event, Category, Participant, Performance, Segment, Athlete, Club
 from parsers.isu_calcfs_parser import ISUCalcFSParser
 from services.import_service import save_to_database
+from services.athlete_rank_stats import refresh_changed_athletes
 import os
 import shutil
 from datetime import datetime
@@ -113,7 +114,13 @@ def reimport_event(xml_path, event_name_pattern):
         print("\nУдаление старых данных турнира...")
         
         # Удаляем турнир (cascade удалит категории, участия, выступления)
+        athlete_ids = [
+            athlete_id for (athlete_id,) in
+            db.session.query(Participant.athlete_id).filter(Participant.event_id == db_event.id).distinct()
+        ]
         db.session.delete(db_event)
+        # Спортсмены, которых нет в новом XML, иначе сохранят строки удалённого турнира
+        refresh_changed_athletes(athlete_ids)
         db.session.commit()
         
         print("Импорт новых данных из XML...")
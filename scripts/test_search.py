@@ -12,7 +12,8 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from app_factory import create_app
 from extensions import db
 from models import Athlete
-from utils.search_utils import normalize_search_term, create_multi_field_search_filter
+from services.search_index import build_search_filter
+from utils.search_utils import normalize_search_term
 
 app = create_app()
 
@@ -34,13 +35,7 @@ with app.app_context():
         print(f"Нормализовано: '{normalized}' (длина: {len(normalized)})")
         
         # Создаем фильтр
-        search_filter = create_multi_field_search_filter(
-            search_term,
-            Athlete.first_name,
-            Athlete.last_name,
-            Athlete.full_name_xml,
-            Athlete.patronymic
-        )
+        search_filter = build_search_filter(Athlete, search_term)
         
         if search_filter is None:
             print("❌ Фильтр не создан")
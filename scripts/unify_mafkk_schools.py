@@ -4,6 +4,7 @@
 import os
 from flask import Flask
 from models import db, Club, Athlete
+from services.data_version import bump_data_version
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -98,6 +99,7 @@ def unify_mafkk_schools():
         
         # Сохраняем изменения
         print(f"\n💾 Сохранение изменений...")
+        bump_data_version()
         db.session.commit()
         
         # Проверяем результат
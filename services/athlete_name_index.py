@@ -0,0 +1,85 @@
+"""Process-wide inverted index of athlete name words for the judge helper.
+
+word -> set of athlete ids, built from one column query (no ORM objects).
+"All words of the pasted FIO occur in the athlete's full_name" becomes an
+intersection of posting lists, starting from the shortest one.
+The index is rebuilt when services.data_version changes (bumped on import).
+"""
+
+import re
+import threading
+
+from extensions import db
+from models import Athlete
+from services.data_version import get_data_version
+
+
+def name_words(s):
+    """Слова ФИО: пробелы схлопнуты, нижний регистр."""
+    if not s or not isinstance(s, str):
+        return []
+    s = re.sub(r'\s+', ' ', (s or '').strip()).lower()
+    return s.split() if s else []
+
+
+class AthleteNameIndex:
+    """Inverted index: name word -> athlete ids, plus id -> full_name for display."""
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.names = {}
+        self.postings = {}
+        for athlete_id, full_name in rows:
+            words = set(name_words(full_name))
+            if not words:
+                continue
+            self.names[athlete_id] = full_name
+            for word in words:
+                self.postings.setdefault(word, set()).add(athlete_id)
+
+    def match(self, words):
+        """[(id, full_name), ...] спортсменов, в ФИО которых есть все слова words (по возрастанию id)."""
+        postings = []
+        for word in set(words):
+            ids = self.postings.get(word)
+            if not ids:
+                return []
+            postings.append(ids)
+        if not postings:
+            return []
+        postings.sort(key=len)
+        ids = set(postings[0])
+        for other in postings[1:]:
+            ids &= other
+            if not ids:
+                return []
+        return [(athlete_id, self.names[athlete_id]) for athlete_id in sorted(ids)]
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def _load_rows():
+    query = db.session.query(
+        Athlete.id,
+        Athlete.full_name_xml,
+        Athlete.last_name,
+        Athlete.first_name,
+        Athlete.patronymic,
+    )
+    for athlete_id, full_name_xml, last_name, first_name, patronymic in query:
+        yield athlete_id, Athlete.compose_full_name(full_name_xml, last_name, first_name, patronymic)
+
+
+def get_athlete_name_index():
+    """Индекс для текущей версии данных; перестраивается, если версия изменилась."""
+    global _index
+    version = get_data_version()
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _index_lock:
+        if _index is None or _index.version != version:
+            _index = AthleteNameIndex(version, _load_rows())
+        return _index
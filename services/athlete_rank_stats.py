@@ -0,0 +1,150 @@
+"""Materialized per-(athlete, rank) participation aggregates.
+
+athlete_rank_stats holds what /categories, /best_results and the rank analytics
+used to re-aggregate from Participant ⋈ Category ⋈ Event on every request.
+Rows are recomputed only for the athletes touched by a change:
+- save_to_database (participants of the imported event);
+- free-participation toggles in the admin;
+- scripts that merge, delete or re-import athletes and participants
+  (through refresh_changed_athletes, which also bumps the data version).
+rebuild_athlete_rank_stats() recomputes the whole table
+(scripts/rebuild_athlete_rank_stats.py; the migration keeps its own frozen copy).
+"""
+
+from sqlalchemy import insert
+
+from extensions import db
+from models import AthleteRankStats, Participant, Category, Event
+from services.data_version import bump_data_version
+from utils.rank_names import normalize_category_name
+
+# IN-list chunk size (stays below SQLite's bound-parameter limit)
+REFRESH_CHUNK_SIZE = 900
+BULK_INSERT_BATCH_SIZE = 500
+
+
+def _is_free(row):
+    """БЕСП-участие, турнир не исключён из отчётов (как free_participations в build_rank_groups)."""
+    return row.pct_ppname == 'БЕСП' and not row.event_excluded
+
+
+def _participation_rows(session, athlete_ids=None):
+    query = session.query(
+        Participant.athlete_id,
+        Participant.event_id,
+        Participant.total_place,
+        Participant.total_points,
+        Participant.pct_ppname,
+        Participant.exclude_free_from_reports.label('participant_excluded'),
+        Category.name.label('category_name'),
+        Category.gender.label('category_gender'),
+        Category.normalized_name,
+        Event.begin_date,
+        Event.exclude_free_from_reports.label('event_excluded'),
+    ).join(
+        Category, Participant.category_id == Category.id
+    ).join(
+        Event, Category.event_id == Event.id
+    ).order_by(Participant.id)
+    if athlete_ids is None:
+        return query.yield_per(2000)
+    return query.filter(Participant.athlete_id.in_(athlete_ids)).all()
+
+
+def _aggregate(rows):
+    """(athlete_id, rank) -> строка athlete_rank_stats."""
+    stats = {}
+    for row in rows:
+        rank = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
+        entry = stats.get((row.athlete_id, rank))
+        if entry is None:
+            entry = {
+                'athlete_id': row.athlete_id,
+                'rank': rank,
+                'category_gender': row.category_gender,
+                'participations': 0,
+                'events': set(),
+                'best_place': None,
+                'best_points': None,
+                'last_event_date': None,
+                'free_participations': 0,
+                'free_reported_participations': 0,
+                'best_result_event_id': None,
+                'best_result_place': None,
+                'best_result_points': None,
+            }
+            stats[(row.athlete_id, rank)] = entry
+        entry['participations'] += 1
+        entry['events'].add(row.event_id)
+        if row.total_place is not None and (entry['best_place'] is None or row.total_place < entry['best_place']):
+            entry['best_place'] = row.total_place
+        if row.total_points is not None and (entry['best_points'] is None or row.total_points > entry['best_points']):
+            entry['best_points'] = row.total_points
+        if row.begin_date is not None and (entry['last_event_date'] is None or row.begin_date > entry['last_event_date']):
+            entry['last_event_date'] = row.begin_date
+        if _is_free(row):
+            entry['free_participations'] += 1
+            if not row.participant_excluded:
+                entry['free_reported_participations'] += 1
+        # Лучший результат — как в прежнем build_best_results: только категории с normalized_name
+        # и известным местом, первое участие с максимальными (округлёнными) баллами
+        if row.normalized_name and row.total_place is not None:
+            points = round(float(row.total_points), 2) if row.total_points is not None else 0
+            if entry['best_result_event_id'] is None or points > entry['best_result_points']:
+                entry['best_result_event_id'] = row.event_id
+                entry['best_result_place'] = row.total_place
+                entry['best_result_points'] = points
+
+    result = []
+    for entry in stats.values():
+        entry['events_count'] = len(entry.pop('events'))
+        result.append(entry)
+    return result
+
+
+def _insert(session, rows):
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        session.execute(insert(AthleteRankStats), rows[start:start + BULK_INSERT_BATCH_SIZE])
+
+
+def refresh_athlete_rank_stats(athlete_ids):
+    """Пересчитывает строки указанных спортсменов в текущей транзакции (коммитит вызывающий)."""
+    athlete_ids = sorted({int(x) for x in athlete_ids if x is not None})
+    for start in range(0, len(athlete_ids), REFRESH_CHUNK_SIZE):
+        chunk = athlete_ids[start:start + REFRESH_CHUNK_SIZE]
+        db.session.query(AthleteRankStats).filter(
+            AthleteRankStats.athlete_id.in_(chunk)
+        ).delete(synchronize_session=False)
+        _insert(db.session, _aggregate(_participation_rows(db.session, chunk)))
+
+
+def refresh_changed_athletes(athlete_ids):
+    """Пересчёт строк спортсменов и новая версия данных после правки скриптом (коммитит вызывающий).
+
+    В athlete_ids передаются и удалённые/объединённые id: их строки удаляются.
+    """
+    db.session.flush()
+    refresh_athlete_rank_stats(athlete_ids)
+    bump_data_version()
+
+
+def refresh_event_athlete_rank_stats(event_id):
+    """Пересчёт для всех спортсменов турнира (переключение флагов БЕСП)."""
+    athlete_ids = [
+        athlete_id for (athlete_id,) in
+        db.session.query(Participant.athlete_id).filter(Participant.event_id == event_id).distinct()
+    ]
+    refresh_athlete_rank_stats(athlete_ids)
+
+
+def rebuild_athlete_rank_stats(session=None):
+    """Полный пересчёт таблицы. Возвращает число строк.
+
+    session — другая сессия (например, на отдельном соединении), по умолчанию db.session.
+    """
+    if session is None:
+        session = db.session
+    session.query(AthleteRankStats).delete(synchronize_session=False)
+    rows = _aggregate(_participation_rows(session))
+    _insert(session, rows)
+    return len(rows)
@@ -3,6 +3,9 @@
 from models import db, Athlete
 from utils.normalizers import normalize_string
 
+# IN-list chunk size (stays below SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 900
+
 
 class AthleteRegistry:
     """Registry for athletes with safe merge logic."""
@@ -22,33 +25,23 @@ class AthleteRegistry:
             return True
         return len(str(new_value)) > len(str(old_value))
 
-    def get_or_create(self, person_data):
-        """Finds or creates an athlete with merge protection."""
-        if not person_data:
-            return None
-
-        lookup_key = self._make_lookup_key(person_data)
-
-        athlete = None
-        if lookup_key:
-            athlete = Athlete.query.filter_by(lookup_key=lookup_key).first()
+    def _new_athlete(self, person_data, lookup_key):
+        athlete = Athlete(
+            first_name=normalize_string(person_data.get('first_name', '')),
+            last_name=normalize_string(person_data.get('last_name', '')),
+            patronymic=normalize_string(person_data.get('patronymic', '')) or None,
+            full_name_xml=normalize_string(person_data.get('full_name_xml', '')) or None,
+            birth_date=person_data.get('birth_date'),
+            gender=normalize_string(person_data.get('gender', '')) or None,
+            country=normalize_string(person_data.get('country', '')) or None,
+            club_id=person_data.get('club_id'),
+            lookup_key=lookup_key,
+        )
+        db.session.add(athlete)
+        return athlete
 
-        if not athlete:
-            athlete = Athlete(
-                first_name=normalize_string(person_data.get('first_name', '')),
-                last_name=normalize_string(person_data.get('last_name', '')),
-                patronymic=normalize_string(person_data.get('patronymic', '')) or None,
-                full_name_xml=normalize_string(person_data.get('full_name_xml', '')) or None,
-                birth_date=person_data.get('birth_date'),
-                gender=normalize_string(person_data.get('gender', '')) or None,
-                country=normalize_string(person_data.get('country', '')) or None,
-                club_id=person_data.get('club_id'),
-                lookup_key=lookup_key,
-            )
-            db.session.add(athlete)
-            return athlete
-
-        # Merge data without overwriting with empty values
+    def _merge(self, athlete, person_data, lookup_key):
+        """Merge data without overwriting with empty values."""
         if self._should_update(athlete.first_name, person_data.get('first_name')):
             athlete.first_name = normalize_string(person_data.get('first_name', ''))
         if self._should_update(athlete.last_name, person_data.get('last_name')):
@@ -68,4 +61,59 @@ class AthleteRegistry:
         if not athlete.lookup_key and lookup_key:
             athlete.lookup_key = lookup_key
 
+    def get_or_create(self, person_data):
+        """Finds or creates an athlete with merge protection."""
+        if not person_data:
+            return None
+
+        lookup_key = self._make_lookup_key(person_data)
+
+        athlete = None
+        if lookup_key:
+            athlete = Athlete.query.filter_by(lookup_key=lookup_key).first()
+
+        if not athlete:
+            return self._new_athlete(person_data, lookup_key)
+
+        self._merge(athlete, person_data, lookup_key)
         return athlete
+
+    def _fetch_by_lookup_keys(self, lookup_keys):
+        """lookup_key -> athlete (with the smallest id) via chunked IN queries."""
+        found = {}
+        lookup_keys = list(lookup_keys)
+        for start in range(0, len(lookup_keys), LOOKUP_CHUNK_SIZE):
+            chunk = lookup_keys[start:start + LOOKUP_CHUNK_SIZE]
+            query = Athlete.query.filter(Athlete.lookup_key.in_(chunk)).order_by(Athlete.id)
+            for athlete in query:
+                found.setdefault(athlete.lookup_key, athlete)
+        return found
+
+    def resolve_many(self, payloads):
+        """Batch version of get_or_create.
+
+        Returns athletes in the order of payloads (None for empty payloads).
+        Existing athletes are fetched by lookup_key in chunks, all payloads are merged
+        in memory with the same rules, and new athletes are inserted with a single flush.
+        Payloads sharing a lookup_key resolve to the same athlete, as sequential
+        get_or_create + flush calls would.
+        """
+        keys = [self._make_lookup_key(p) if p else None for p in payloads]
+        by_key = self._fetch_by_lookup_keys({key for key in keys if key})
+
+        athletes = []
+        for person_data, lookup_key in zip(payloads, keys):
+            if not person_data:
+                athletes.append(None)
+                continue
+            athlete = by_key.get(lookup_key) if lookup_key else None
+            if athlete is None:
+                athlete = self._new_athlete(person_data, lookup_key)
+                if lookup_key:
+                    by_key[lookup_key] = athlete
+            else:
+                self._merge(athlete, person_data, lookup_key)
+            athletes.append(athlete)
+
+        db.session.flush()
+        return athletes
@@ -1,18 +1,142 @@
 """Club registry with overwrite protection."""
 
 import logging
+from collections import Counter, defaultdict
 from difflib import SequenceMatcher
+from sqlalchemy import case, func
 from models import db, Club, Athlete
 from utils.normalizers import normalize_string, fix_latin_to_cyrillic
 
 logger = logging.getLogger(__name__)
 
+# Порог схожести для автоматического объединения клубов (85%)
+SIMILARITY_THRESHOLD = 0.85
+# Размер пачки id для IN-запросов при объединении (лимит переменных SQLite)
+MERGE_QUERY_CHUNK_SIZE = 900
+
+
+def _club_match_key(name):
+    """Строка, которую сравнивает _calculate_similarity (нормализованная, в нижнем регистре)."""
+    return normalize_string(fix_latin_to_cyrillic(name)).lower()
+
+
+def _bigrams(text):
+    return Counter(text[i:i + 2] for i in range(len(text) - 1))
+
+
+class ClubMatchIndex:
+    """Индекс клубов для отбора кандидатов перед _calculate_similarity.
+
+    Загружается один раз на импорт и обновляется при добавлении/переименовании клубов.
+    Отбор не теряет ни одной пары со схожестью >= SIMILARITY_THRESHOLD:
+    - одинаковые строки находятся по ключу (точному и в нижнем регистре);
+    - SequenceMatcher.ratio() <= 2*min(l1, l2) / (l1 + l2) — фильтр по длине;
+    - при ratio >= 0.85 совпадающие блоки дают не меньше 0.275*(l1 + l2) - 1 общих
+      биграмм (M совпавших символов лежат не более чем в (l1 + l2 - 2M) + 1 блоках).
+    Вхождение «≥90% длины» (оценка 0.95) проходит оба фильтра автоматически.
+    Кандидаты возвращаются в порядке загрузки (по id), как при переборе Club.query.all().
+    """
+
+    def __init__(self):
+        self._order = {}  # id(club) -> порядковый номер (по id в БД, новые — в конце)
+        self._clubs = {}  # id(club) -> Club
+        self._keys = {}  # id(club) -> (exact, match_key, bigrams)
+        self._by_exact = defaultdict(set)
+        self._by_match_key = defaultdict(set)
+        self._postings = defaultdict(dict)  # биграмма -> {id(club): количество}
+        self._next_order = 0
+
+    @classmethod
+    def load(cls):
+        index = cls()
+        for club in Club.query.order_by(Club.id).all():
+            index.add(club)
+        return index
+
+    def add(self, club):
+        """Добавляет клуб или переиндексирует его после изменения названия."""
+        ref = id(club)
+        if ref in self._keys:
+            self._unindex(ref)
+        else:
+            self._order[ref] = self._next_order
+            self._next_order += 1
+            self._clubs[ref] = club
+        if not club.name:
+            self._keys[ref] = None
+            return
+        exact = normalize_string(fix_latin_to_cyrillic(club.name))
+        match_key = exact.lower()
+        grams = _bigrams(match_key)
+        self._keys[ref] = (exact, match_key, grams)
+        self._by_exact[exact].add(ref)
+        self._by_match_key[match_key].add(ref)
+        for gram, count in grams.items():
+            self._postings[gram][ref] = count
+
+    def remove(self, club):
+        ref = id(club)
+        if ref not in self._keys:
+            return
+        self._unindex(ref)
+        del self._keys[ref]
+        del self._clubs[ref]
+        del self._order[ref]
+
+    def _unindex(self, ref):
+        keys = self._keys.get(ref)
+        if not keys:
+            return
+        exact, match_key, grams = keys
+        self._by_exact[exact].discard(ref)
+        self._by_match_key[match_key].discard(ref)
+        for gram in grams:
+            self._postings[gram].pop(ref, None)
+
+    def _sorted(self, refs):
+        return [self._clubs[ref] for ref in sorted(refs, key=self._order.__getitem__)]
+
+    def exact_match(self, name):
+        """Первый клуб, у которого нормализованное название (с учётом регистра) равно name."""
+        refs = self._by_exact.get(name)
+        return self._sorted(refs)[0] if refs else None
+
+    def candidates(self, name):
+        """Клубы, схожесть которых с name может достигать SIMILARITY_THRESHOLD."""
+        match_key = _club_match_key(name)
+        if not match_key:
+            return []
+        query_len = len(match_key)
+        common = defaultdict(int)
+        for gram, count in _bigrams(match_key).items():
+            for ref, other_count in self._postings.get(gram, {}).items():
+                common[ref] += min(count, other_count)
+        selected = set(self._by_match_key.get(match_key, ()))
+        half_threshold = SIMILARITY_THRESHOLD / 2
+        for ref, shared in common.items():
+            other_len = len(self._keys[ref][1])
+            total = query_len + other_len
+            if 2 * min(query_len, other_len) < SIMILARITY_THRESHOLD * total - 1e-9:
+                continue
+            if shared < (3 * half_threshold - 1) * total - 1 - 1e-9:
+                continue
+            selected.add(ref)
+        return self._sorted(selected)
+
 
 class ClubRegistry:
     """Cache/registry for clubs to prevent overwrite by empty values."""
 
     def __init__(self):
         self._cache_by_name = {}
+        self._index = None
+        self._touched = {}  # id(club) -> Club: созданные или найденные в текущем импорте
+        self.merged_into = {}  # id удалённого дубликата -> id клуба, в который он слит
+
+    def _get_index(self):
+        if self._index is None:
+            self._index = ClubMatchIndex.load()
+        return self._index
 
     def _should_update(self, old_value, new_value):
         if not new_value:
@@ -92,25 +216,18 @@ class ClubRegistry:
         # Также применяем fix_latin_to_cyrillic для существующих клубов
         # И используем fuzzy matching для похожих названий
         if not club:
-            all_clubs = Club.query.all()
+            index = self._get_index()
+            # Сначала проверяем точное совпадение
+            club = index.exact_match(name)
             best_match = None
-            best_similarity = 0.85  # Порог схожести для автоматического объединения (85%)
-            
-            for existing_club in all_clubs:
-                if not existing_club.name:
-                    continue
-                
-                # Сначала проверяем точное совпадение
-                normalized_existing = normalize_string(fix_latin_to_cyrillic(existing_club.name))
-                if normalized_existing == name:
-                    club = existing_club
-                    break
-                
-                # Если точного совпадения нет, проверяем схожесть
-                similarity = self._calculate_similarity(existing_club.name, raw_name)
-                if similarity >= best_similarity:
-                    if not best_match or similarity > best_match[1]:
-                        best_match = (existing_club, similarity)
+
+            # Если точного совпадения нет, проверяем схожесть только у кандидатов из индекса
+            if not club:
+                for existing_club in index.candidates(raw_name):
+                    similarity = self._calculate_similarity(existing_club.name, raw_name)
+                    if similarity >= SIMILARITY_THRESHOLD:
+                        if not best_match or similarity > best_match[1]:
+                            best_match = (existing_club, similarity)
             
             # Если нашли достаточно похожий клуб, используем его
             if not club and best_match:
@@ -130,9 +247,11 @@ class ClubRegistry:
                 city=city or None,
             )
             db.session.add(club)
+            self._get_index().add(club)
         else:
             if self._should_update(club.name, name):
                 club.name = name
+                self._get_index().add(club)
             if self._should_update(club.short_name, short_name):
                 club.short_name = short_name
             if self._should_update(club.country, country):
@@ -141,93 +260,154 @@ class ClubRegistry:
                 club.city = city
 
         self._cache_by_name[name] = club
+        self._touched[id(club)] = club
         return club
-    
+
+    def merge_touched_duplicates(self):
+        """Инкрементальное объединение дубликатов после импорта.
+
+        Сравниваются только клубы, созданные или найденные в этом импорте, и только
+        с кандидатами из ClubMatchIndex — без попарного перебора всей таблицы.
+        """
+        if not self._touched:
+            return 0
+        db.session.flush()  # новым клубам нужны id
+        index = self._get_index()
+        processed_clubs = set()
+        groups = []
+
+        for club1 in sorted(self._touched.values(), key=lambda c: c.id):
+            if not club1.name or club1.id in processed_clubs:
+                continue
+            similar_clubs = [club1]
+            for club2 in index.candidates(club1.name):
+                if club2 is club1 or not club2.name or club2.id in processed_clubs:
+                    continue
+                if self._calculate_similarity(club1.name, club2.name) >= SIMILARITY_THRESHOLD:
+                    similar_clubs.append(club2)
+                    processed_clubs.add(club2.id)
+            processed_clubs.add(club1.id)
+            if len(similar_clubs) > 1:
+                groups.append(similar_clubs)
+
+        self._touched.clear()
+        return self._merge_groups(groups)
+
     def merge_all_duplicates(self):
-        """Объединяет все дубликаты клубов в базе данных (вызывается после регистрации всех клубов)"""
-        all_clubs = Club.query.all()
+        """Объединяет все дубликаты клубов в базе данных (полный попарный проход)"""
+        all_clubs = Club.query.order_by(Club.id).all()
         processed_clubs = set()
-        similarity_threshold = 0.85  # Порог схожести 85%
-        merged_count = 0
-        
+        groups = []
+
         for i, club1 in enumerate(all_clubs):
             if not club1.name or club1.id in processed_clubs:
                 continue
-            
+
             similar_clubs = [club1]
-            
+
             for club2 in all_clubs[i+1:]:
                 if not club2.name or club2.id in processed_clubs:
                     continue
-                
+
                 similarity = self._calculate_similarity(club1.name, club2.name)
-                if similarity >= similarity_threshold:
+                if similarity >= SIMILARITY_THRESHOLD:
                     similar_clubs.append(club2)
                     processed_clubs.add(club2.id)
-            
-            # Если нашли похожие клубы, объединяем их
+
             if len(similar_clubs) > 1:
-                keep_club, remove_clubs = self._merge_club_group(similar_clubs)
-                
-                for remove_club in remove_clubs:
-                    try:
-                        # Подсчитываем спортсменов
-                        remove_athletes = Athlete.query.filter_by(club_id=remove_club.id).count()
-                        
-                        # Переносим спортсменов
-                        Athlete.query.filter_by(club_id=remove_club.id).update({
-                            'club_id': keep_club.id
-                        })
-                        
-                        # Обновляем данные клуба, если нужно
-                        if not keep_club.country and remove_club.country:
-                            keep_club.country = remove_club.country
-                        if not keep_club.city and remove_club.city:
-                            keep_club.city = remove_club.city
-                        if not keep_club.short_name and remove_club.short_name:
-                            keep_club.short_name = remove_club.short_name
-                        
-                        # Обновляем кеш, если удаляемый клуб был в кеше
-                        for cached_name, cached_club in list(self._cache_by_name.items()):
-                            if cached_club.id == remove_club.id:
-                                self._cache_by_name[cached_name] = keep_club
-                        
-                        # Удаляем дубликат
-                        db.session.delete(remove_club)
-                        db.session.flush()
-                        
-                        merged_count += 1
-                        
-                        logger.info(
-                            f"Автоматическое объединение дубликатов клубов: "
-                            f"'{remove_club.name}' объединен с '{keep_club.name}' "
-                            f"(перенесено спортсменов: {remove_athletes})"
-                        )
-                        
-                    except Exception as e:
-                        logger.error(f"Ошибка при объединении клубов '{remove_club.name}' и '{keep_club.name}': {e}")
-                        db.session.rollback()
-                        continue
-                
+                groups.append(similar_clubs)
                 processed_clubs.add(club1.id)
-        
-        if merged_count > 0:
-            logger.info(f"Автоматически объединено {merged_count} дубликатов клубов")
-        
+
+        return self._merge_groups(groups)
+
+    def _athlete_counts(self, club_ids):
+        """Количество спортсменов по клубам — один сгруппированный запрос на пачку id."""
+        counts = {}
+        club_ids = list(club_ids)
+        for start in range(0, len(club_ids), MERGE_QUERY_CHUNK_SIZE):
+            chunk = club_ids[start:start + MERGE_QUERY_CHUNK_SIZE]
+            rows = (
+                db.session.query(Athlete.club_id, func.count(Athlete.id))
+                .filter(Athlete.club_id.in_(chunk))
+                .group_by(Athlete.club_id)
+                .all()
+            )
+            counts.update(rows)
+        return counts
+
+    def _merge_groups(self, groups):
+        """Объединяет найденные группы: один UPDATE спортсменов и один DELETE клубов."""
+        if not groups:
+            return 0
+
+        athlete_counts = self._athlete_counts(club.id for group in groups for club in group)
+        reassign = {}  # id удаляемого клуба -> id сохраняемого
+        removed = []
+
+        for group in groups:
+            keep_club, remove_clubs = self._merge_club_group(group, athlete_counts)
+            for remove_club in remove_clubs:
+                reassign[remove_club.id] = keep_club.id
+                removed.append(remove_club)
+
+                # Обновляем данные клуба, если нужно
+                if not keep_club.country and remove_club.country:
+                    keep_club.country = remove_club.country
+                if not keep_club.city and remove_club.city:
+                    keep_club.city = remove_club.city
+                if not keep_club.short_name and remove_club.short_name:
+                    keep_club.short_name = remove_club.short_name
+
+                logger.info(
+                    f"Автоматическое объединение дубликатов клубов: "
+                    f"'{remove_club.name}' объединен с '{keep_club.name}' "
+                    f"(перенесено спортсменов: {athlete_counts.get(remove_club.id, 0)})"
+                )
+
+        # Обновляем кеш: удаляемые клубы заменяются сохраняемыми
+        keep_by_id = {club.id: club for group in groups for club in group}
+        for cached_name, cached_club in list(self._cache_by_name.items()):
+            if cached_club.id in reassign:
+                self._cache_by_name[cached_name] = keep_by_id[reassign[cached_club.id]]
+
+        remove_ids = list(reassign)
+        for start in range(0, len(remove_ids), MERGE_QUERY_CHUNK_SIZE):
+            chunk = remove_ids[start:start + MERGE_QUERY_CHUNK_SIZE]
+            mapping = {club_id: reassign[club_id] for club_id in chunk}
+            Athlete.query.filter(Athlete.club_id.in_(chunk)).update(
+                {Athlete.club_id: case(mapping, value=Athlete.club_id)},
+                synchronize_session='fetch',
+            )
+
+        for remove_club in removed:
+            if self._index is not None:
+                self._index.remove(remove_club)
+            self._touched.pop(id(remove_club), None)
+        for start in range(0, len(remove_ids), MERGE_QUERY_CHUNK_SIZE):
+            chunk = remove_ids[start:start + MERGE_QUERY_CHUNK_SIZE]
+            Club.query.filter(Club.id.in_(chunk)).delete(synchronize_session='evaluate')
+        db.session.flush()
+
+        self.merged_into.update(reassign)
+        # Цепочки: клуб, в который раньше слили другие, сам может быть удалён
+        for removed_id, keep_id in self.merged_into.items():
+            while keep_id in self.merged_into:
+                keep_id = self.merged_into[keep_id]
+            self.merged_into[removed_id] = keep_id
+
+        merged_count = len(removed)
+        logger.info(f"Автоматически объединено {merged_count} дубликатов клубов")
         return merged_count
-    
-    def _merge_club_group(self, clubs):
+
+    def _merge_club_group(self, clubs, athlete_counts):
         """Объединяет группу клубов в один - выбирает клуб для сохранения"""
         if not clubs or len(clubs) < 2:
             return None, []
-        
+
         # Выбираем клуб для сохранения: тот, у которого больше спортсменов
         # Если одинаково - выбираем тот, у которого более длинное название
-        clubs_with_counts = []
-        for club in clubs:
-            athlete_count = Athlete.query.filter_by(club_id=club.id).count()
-            clubs_with_counts.append((club, athlete_count))
-        
+        clubs_with_counts = [(club, athlete_counts.get(club.id, 0)) for club in clubs]
+
         # Сортируем: больше спортсменов -> более длинное название
         clubs_with_counts.sort(
             key=lambda x: (
@@ -235,8 +415,8 @@ class ClubRegistry:
                 -len(x[0].name or '')  # Более длинное название
             )
         )
-        
+
         keep_club = clubs_with_counts[0][0]
         remove_clubs = [club for club, _ in clubs_with_counts[1:]]
-        
+
         return keep_club, remove_clubs
@@ -0,0 +1,124 @@
+"""Coach assignment timeline (CoachAssignment) computed in memory and written in bulk."""
+
+import logging
+
+from sqlalchemy import insert, update
+
+from models import db, CoachAssignment
+
+logger = logging.getLogger(__name__)
+
+# IN-list chunk size (stays below SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 900
+BULK_WRITE_BATCH_SIZE = 500
+
+
+class CoachTimelineBuilder:
+    """Builds coach transitions for a sequence of participations.
+
+    Current assignments of the affected athletes are loaded once (load_current),
+    every participation is then applied in memory via record(), and write() issues
+    one bulk UPDATE for closed existing assignments and bulk INSERTs for new ones.
+    Participations must be recorded in chronological order; write() is called once.
+    A participation dated before the athlete's current assignment (an older event
+    imported later) never closes that assignment: it is skipped, and the history
+    can be rebuilt with scripts/populate_coaches_from_participants.py.
+    """
+
+    def __init__(self):
+        self._current = {}  # athlete_id -> строка текущего назначения (существующая или новая)
+        self._seen = set()  # (athlete_id, coach_id, event_id)
+        self._new_rows = []
+        self._closed = {}  # id существующего назначения -> end_date
+        self.transitions = 0
+
+    def load_current(self, athlete_ids):
+        """Loads current assignments of the athletes (the one with the smallest id wins)."""
+        athlete_ids = list(set(athlete_ids))
+        for start in range(0, len(athlete_ids), LOOKUP_CHUNK_SIZE):
+            chunk = athlete_ids[start:start + LOOKUP_CHUNK_SIZE]
+            rows = (
+                db.session.query(
+                    CoachAssignment.id, CoachAssignment.athlete_id,
+                    CoachAssignment.coach_id, CoachAssignment.start_date,
+                )
+                .filter(CoachAssignment.is_current.is_(True), CoachAssignment.athlete_id.in_(chunk))
+                .order_by(CoachAssignment.id)
+            )
+            for assignment_id, athlete_id, coach_id, start_date in rows:
+                self._current.setdefault(
+                    athlete_id, {'id': assignment_id, 'coach_id': coach_id, 'start_date': start_date}
+                )
+
+    def load_event_assignments(self, event_ids):
+        """Marks assignments already stored for these events, so they are not created twice."""
+        event_ids = list(set(event_ids))
+        for start in range(0, len(event_ids), LOOKUP_CHUNK_SIZE):
+            chunk = event_ids[start:start + LOOKUP_CHUNK_SIZE]
+            rows = (
+                db.session.query(CoachAssignment.athlete_id, CoachAssignment.coach_id, CoachAssignment.event_id)
+                .filter(CoachAssignment.event_id.in_(chunk))
+            )
+            self._seen.update(tuple(row) for row in rows)
+
+    def new_rows_by_athlete(self):
+        """New assignment rows grouped by athlete_id (in recording order)."""
+        by_athlete = {}
+        for row in self._new_rows:
+            by_athlete.setdefault(row['athlete_id'], []).append(row)
+        return by_athlete
+
+    def record(self, athlete_id, coach_id, participant_id, event_id, event_date):
+        """Applies one participation. Returns True if a new assignment was created."""
+        if (athlete_id, coach_id, event_id) in self._seen:
+            return False
+
+        current = self._current.get(athlete_id)
+        if current and current['coach_id'] == coach_id:
+            return False
+        if current and current.get('start_date') and event_date < current['start_date']:
+            # Участие раньше текущего назначения: более позднее назначение не закрываем
+            logger.debug(
+                f"Участие спортсмена {athlete_id} у тренера {coach_id} на дату {event_date} "
+                f"раньше текущего назначения с {current['start_date']}, пропущено"
+            )
+            return False
+        if current:
+            # Текущий тренер отличается от нового - это переход: закрываем предыдущее назначение
+            if 'id' in current:
+                self._closed[current['id']] = event_date
+            else:
+                current['end_date'] = event_date
+                current['is_current'] = False
+            self.transitions += 1
+            logger.info(
+                f"Переход спортсмена {athlete_id} от тренера {current['coach_id']} "
+                f"к тренеру {coach_id} на дату {event_date}"
+            )
+
+        row = {
+            'coach_id': coach_id,
+            'athlete_id': athlete_id,
+            'participant_id': participant_id,
+            'event_id': event_id,
+            'start_date': event_date,
+            'end_date': None,
+            'is_current': True,
+        }
+        self._new_rows.append(row)
+        self._current[athlete_id] = row
+        self._seen.add((athlete_id, coach_id, event_id))
+        return True
+
+    def write(self):
+        """Writes the computed timeline. Returns (created, closed) counts."""
+        closed_rows = [
+            {'id': assignment_id, 'end_date': end_date, 'is_current': False}
+            for assignment_id, end_date in self._closed.items()
+        ]
+        for start in range(0, len(closed_rows), BULK_WRITE_BATCH_SIZE):
+            db.session.execute(update(CoachAssignment), closed_rows[start:start + BULK_WRITE_BATCH_SIZE])
+        for start in range(0, len(self._new_rows), BULK_WRITE_BATCH_SIZE):
+            db.session.execute(insert(CoachAssignment), self._new_rows[start:start + BULK_WRITE_BATCH_SIZE])
+
+        return len(self._new_rows), len(closed_rows)
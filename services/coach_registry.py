@@ -6,6 +6,9 @@ from utils.normalizers import normalize_string, fix_latin_to_cyrillic
 
 logger = logging.getLogger(__name__)
 
+# IN-list chunk size (stays below SQLite's bound-parameter limit)
+LOOKUP_CHUNK_SIZE = 900
+
 
 class CoachRegistry:
     """Registry for coaches with deduplication."""
@@ -43,3 +46,37 @@ class CoachRegistry:
 
         self._cache_by_name[normalized_name] = coach
         return coach
+
+    def resolve_many(self, coach_names):
+        """Preloads coaches for all names with chunked IN queries; missing ones are created with one flush.
+
+        After this call get_or_create() for the same names is served from the cache.
+        """
+        pending = {}  # normalized_name -> исходное имя (первое встреченное)
+        for coach_name in coach_names:
+            if not coach_name or not coach_name.strip():
+                continue
+            normalized_name = normalize_string(fix_latin_to_cyrillic(coach_name))
+            if normalized_name and normalized_name not in self._cache_by_name:
+                pending.setdefault(normalized_name, coach_name)
+
+        names = list(pending)
+        for start in range(0, len(names), LOOKUP_CHUNK_SIZE):
+            chunk = names[start:start + LOOKUP_CHUNK_SIZE]
+            for coach in Coach.query.filter(Coach.normalized_name.in_(chunk)).order_by(Coach.id):
+                self._cache_by_name.setdefault(coach.normalized_name, coach)
+
+        created = False
+        for normalized_name, coach_name in pending.items():
+            if normalized_name in self._cache_by_name:
+                continue
+            coach = Coach(
+                name=coach_name.strip(),
+                normalized_name=normalized_name
+            )
+            db.session.add(coach)
+            self._cache_by_name[normalized_name] = coach
+            created = True
+            logger.info(f"Создан новый тренер: {coach_name}")
+        if created:
+            db.session.flush()
@@ -0,0 +1,39 @@
+"""Global data-version counter for process-wide caches.
+
+One row in data_version (id=1). Every path that changes reported data bumps it
+inside its own transaction, so the new value becomes visible together with the
+change: save_to_database, admin free-participation and event-rank edits, and the
+scripts that merge, delete or re-import athletes, participants and clubs. Caches remember the version they were built
+for (services/athlete_name_index.py, services/response_cache.py,
+services/participation_frame.py) and rebuild when it changes; checking costs
+one primary-key lookup per request.
+"""
+
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from extensions import db
+from models import DataVersion
+
+DATA_VERSION_ROW_ID = 1
+
+
+def get_data_version():
+    """Текущая версия данных (0, если счётчик ещё ни разу не увеличивался)."""
+    version = db.session.execute(
+        select(DataVersion.version).where(DataVersion.id == DATA_VERSION_ROW_ID)
+    ).scalar()
+    return version or 0
+
+
+def bump_data_version():
+    """Увеличивает версию в текущей транзакции (коммитит вызывающий)."""
+    result = db.session.execute(
+        update(DataVersion)
+        .where(DataVersion.id == DATA_VERSION_ROW_ID)
+        .values(version=DataVersion.version + 1, updated_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        db.session.add(DataVersion(id=DATA_VERSION_ROW_ID, version=1, updated_at=datetime.utcnow()))
+        db.session.flush()
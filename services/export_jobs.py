@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Задачи экспорта отчётов в Google Sheets: захват, прогресс по листам и история.
+
+Состояние хранится в таблице export_job (раньше — instance/google_export_state.json
+под threading.Lock, который не согласовывал воркеры Gunicorn):
+- claim_export_job() вставляет строку со status='running'. Частичный уникальный
+  индекс uq_export_job_running не даёт вставить вторую такую строку ни из
+  другого потока, ни из другого воркера — вставка и есть атомарный захват;
+- задача выполняется в отдельном потоке (пул из одного воркера, как импорт);
+- на каждом этапе (листы REPORT_SHEETS, затем отправка) и на каждом повторе после
+  429 в строку пишутся текущий лист, время и число повторов по каждому листу и
+  heartbeat_at. Прогресс пишется отдельным соединением, чтобы не коммитить сессию,
+  в которой работают построители листов;
+- задача без heartbeat дольше EXPORT_JOB_STALE_SECONDS (процесс упал или
+  перезапущен) помечается ошибкой при следующем захвате. Записи прогресса и итога
+  меняют строку только пока она 'running': если задачу уже закрыли по таймауту
+  (и захват освободился для нового экспорта), поток прекращает экспорт до отправки
+  и не перезаписывает её статус;
+- export_job_status() — один запрос по индексу (kind, id).
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+KIND_GOOGLE_SHEETS = 'google_sheets'
+DEFAULT_STALE_SECONDS = 30 * 60
+HISTORY_LIMIT = 10
+STALE_MESSAGE = 'Экспорт прерван: задача перестала отвечать (процесс остановлен?)'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _stale_seconds() -> int:
+    try:
+        return max(60, int(os.environ.get('EXPORT_JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)))
+    except ValueError:
+        return DEFAULT_STALE_SECONDS
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='export-job')
+        return _executor
+
+
+def _initial_sheets():
+    from google_sheets_sync import FINISH_STAGE, REPORT_SHEETS
+
+    return [
+        {'title': title, 'status': 'pending', 'seconds': None, 'retries': 0}
+        for title in REPORT_SHEETS + (FINISH_STAGE,)
+    ]
+
+
+def _is_stale(job, now=None):
+    if job.status != 'running' or job.heartbeat_at is None:
+        return False
+    return job.heartbeat_at < (now or datetime.utcnow()) - timedelta(seconds=_stale_seconds())
+
+
+def _expire_stale_jobs(kind):
+    now = datetime.utcnow()
+    db.session.execute(
+        update(ExportJob)
+        .where(
+            ExportJob.kind == kind,
+            ExportJob.status == 'running',
+            ExportJob.heartbeat_at < now - timedelta(seconds=_stale_seconds()),
+        )
+        .values(
+            status='error',
+            finished_at=now,
+            current_sheet=None,
+            message=STALE_MESSAGE,
+        )
+    )
+    db.session.commit()
+
+
+def claim_export_job(kind=KIND_GOOGLE_SHEETS, full_sync=False):
+    """Создаёт выполняющуюся задачу. Возвращает её id или None, если задача этого вида уже идёт."""
+    _expire_stale_jobs(kind)
+    now = datetime.utcnow()
+    sheets = _initial_sheets()
+    job = ExportJob(
+        kind=kind,
+        status='running',
+        full_sync=bool(full_sync),
+        started_at=now,
+        heartbeat_at=now,
+        sheets_total=len(sheets),
+        sheets_state=json.dumps(sheets, ensure_ascii=False),
+        message='Экспорт запущен. Это может занять несколько минут...',
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return None
+    return job.id
+
+
+class ExportJobExpired(Exception):
+    """Задача уже закрыта по таймауту heartbeat — продолжать экспорт нельзя."""
+
+
+class _ExportProgress:
+    """Этапы задачи: set_stage(лист) закрывает предыдущий этап и пишет прогресс в export_job."""
+
+    def __init__(self, job_id, sheets):
+        self.job_id = job_id
+        self.sheets = sheets
+        self.current = None
+        self.stage_started = None
+        self.retries = 0
+
+    def _write(self, **values):
+        """Пишет прогресс в строку задачи. False — строка уже не 'running' (закрыта по таймауту)."""
+        values.update(
+            sheets_state=json.dumps(self.sheets, ensure_ascii=False),
+            sheets_done=sum(1 for sheet in self.sheets if sheet['status'] == 'done'),
+            retries=self.retries,
+            heartbeat_at=datetime.utcnow(),
+        )
+        try:
+            with db.engine.begin() as conn:
+                result = conn.execute(
+                    update(ExportJob)
+                    .where(ExportJob.id == self.job_id, ExportJob.status == 'running')
+                    .values(**values)
+                )
+        except Exception as e:
+            logger.warning('Не удалось записать прогресс экспорта %s: %s', self.job_id, e)
+            return True
+        return result.rowcount > 0
+
+    def _check_alive(self, written):
+        if not written:
+            raise ExportJobExpired(f'Задача экспорта {self.job_id} закрыта по таймауту, экспорт остановлен')
+
+    def _close_stage(self, status):
+        if self.current is None:
+            return
+        sheet = self.sheets[self.current]
+        sheet['status'] = status
+        sheet['seconds'] = round(time.monotonic() - self.stage_started, 2)
+        self.current = None
+
+    def set_stage(self, title):
+        self._close_stage('done')
+        index = next((i for i, sheet in enumerate(self.sheets) if sheet['title'] == title), None)
+        if index is None:
+            self.sheets.append({'title': title, 'status': 'pending', 'seconds': None, 'retries': 0})
+            index = len(self.sheets) - 1
+        self.current = index
+        self.stage_started = time.monotonic()
+        self.sheets[index]['status'] = 'running'
+        self._check_alive(self._write(current_sheet=title, sheets_total=len(self.sheets)))
+
+    def retry(self):
+        self.retries += 1
+        if self.current is not None:
+            self.sheets[self.current]['retries'] += 1
+        # Повторы после 429 с backoff могут длиться долго — heartbeat обновляется и здесь
+        self._check_alive(self._write())
+
+    def finish(self, success, message, url=None):
+        self._close_stage('done' if success else 'error')
+        for sheet in self.sheets:
+            if sheet['status'] in ('pending', 'running'):
+                sheet['status'] = 'skipped'
+        written = self._write(
+            status='success' if success else 'error',
+            current_sheet=None,
+            finished_at=datetime.utcnow(),
+            message=message,
+            url=url,
+        )
+        if not written:
+            logger.warning('Задача экспорта %s уже закрыта по таймауту, итог не записан: %s', self.job_id, message)
+
+
+def _process_export_job(job_id):
+    from google_sheets_sync import export_to_google_sheets
+
+    job = db.session.get(ExportJob, job_id)
+    if job is None:
+        return None
+    full_sync = job.full_sync
+    tracker = _ExportProgress(job_id, json.loads(job.sheets_state or '[]'))
+    db.session.commit()
+    try:
+        result = export_to_google_sheets(full_sync=full_sync, progress=tracker.set_stage, on_retry=tracker.retry)
+    except Exception as e:
+        logger.error(f"Ошибка экспорта в Google Sheets (задача {job_id}): {e}", exc_info=True)
+        result = {'success': False, 'url': None, 'message': f'Ошибка экспорта: {str(e)}'}
+    tracker.finish(bool(result.get('success')), result.get('message') or 'Экспорт завершён', result.get('url'))
+    return result
+
+
+def _run_export_job(app_obj, job_id):
+    with app_obj.app_context():
+        try:
+            _process_export_job(job_id)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой задачи экспорта {job_id}: {e}", exc_info=True)
+        finally:
+            db.session.remove()
+
+
+def submit_export_job(app_obj, full_sync=False):
+    """Захватывает экспорт и запускает его в фоне. Возвращает id задачи или None, если экспорт уже идёт."""
+    job_id = claim_export_job(KIND_GOOGLE_SHEETS, full_sync)
+    if job_id is None:
+        return None
+    _get_executor().submit(_run_export_job, app_obj, job_id)
+    return job_id
+
+
+def run_export_job(full_sync=False):
+    """Тот же экспорт синхронно (обычный POST). Возвращает результат export_to_google_sheets или None, если экспорт уже идёт."""
+    job_id = claim_export_job(KIND_GOOGLE_SHEETS, full_sync)
+    if job_id is None:
+        return None
+    return _process_export_job(job_id)
+
+
+def _isoformat(value):
+    return value.isoformat() if value else None
+
+
+def _job_status(job):
+    status = job.status
+    message = job.message
+    if _is_stale(job):
+        status = 'error'
+        message = STALE_MESSAGE
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'status': status,
+        'running': status == 'running',
+        'success': True if status == 'success' else (False if status == 'error' else None),
+        'message': message,
+        'url': job.url,
+        'full_sync': job.full_sync,
+        'current_sheet': job.current_sheet if status == 'running' else None,
+        'sheets_total': job.sheets_total,
+        'sheets_done': job.sheets_done,
+        'retries': job.retries,
+        'sheets': json.loads(job.sheets_state or '[]'),
+        'created_at': _isoformat(job.created_at),
+        'started_at': _isoformat(job.started_at),
+        'finished_at': _isoformat(job.finished_at),
+    }
+
+
+def export_job_status(kind=KIND_GOOGLE_SHEETS):
+    """Статус последней задачи вида kind для polling (None, если экспортов ещё не было)."""
+    job = (
+        db.session.query(ExportJob)
+        .filter(ExportJob.kind == kind)
+        .order_by(ExportJob.id.desc())
+        .first()
+    )
+    return _job_status(job) if job is not None else None
+
+
+def recent_export_jobs(kind=KIND_GOOGLE_SHEETS, limit=HISTORY_LIMIT):
+    """Последние задачи вида kind, новые первыми (история на странице экспорта)."""
+    jobs = (
+        db.session.query(ExportJob)
+        .filter(ExportJob.kind == kind)
+        .order_by(ExportJob.id.desc())
+        .limit(limit)
+        .all()
+    )
+    return [_job_status(job) for job in jobs]
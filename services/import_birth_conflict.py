@@ -4,13 +4,15 @@
 
 from __future__ import annotations
 
+from collections import defaultdict
 from datetime import date
 
-from sqlalchemy import func
-
 from models import Athlete
 from utils.date_parsing import parse_date
-from utils.normalizers import normalize_string, remove_duplication
+from utils.normalizers import normalize_name_key, normalize_string, remove_duplication
+
+# Размер пачки фамилий в одном IN-запросе (лимит переменных SQLite)
+LAST_NAME_CHUNK_SIZE = 900
 
 
 def _person_display_fio(person_data: dict) -> str:
@@ -64,17 +66,30 @@ def _coerce_xml_date(raw) -> date | None:
     return None
 
 
+def _candidates_by_last_name(last_names) -> dict[str, list[Athlete]]:
+    """Спортсмены БД по ключу фамилии (Athlete.last_name_norm), пачками IN-запросов."""
+    by_last_name: dict[str, list[Athlete]] = defaultdict(list)
+    last_names = sorted(last_names)
+    for start in range(0, len(last_names), LAST_NAME_CHUNK_SIZE):
+        chunk = last_names[start:start + LAST_NAME_CHUNK_SIZE]
+        for a in Athlete.query.filter(Athlete.last_name_norm.in_(chunk)).order_by(Athlete.id):
+            by_last_name[a.last_name_norm].append(a)
+    return by_last_name
+
+
 def find_birth_date_conflicts(parser) -> list[dict]:
     """
     Ищет участников XML: то же отображаемое ФИО, что у спортсмена в БД,
     но дата рождения в файле и в профиле различаются (обе заданы).
+    Кандидаты из БД загружаются одним пакетом по фамилиям всего файла.
     """
     conflicts: list[dict] = []
     seen_pairs: set[tuple[str, int]] = set()
 
+    entries = []
     for participant_data in parser.participants:
         person_id = participant_data.get('person_id')
-        person_data = next((p for p in parser.persons if p['id'] == person_id), None)
+        person_data = parser.persons_by_id.get(person_id)
         if not person_data:
             continue
 
@@ -85,17 +100,22 @@ def find_birth_date_conflicts(parser) -> list[dict]:
         display = _person_display_fio(person_data)
         if not display.strip():
             continue
-        pkey = _fio_key(display)
 
         last_raw = person_data.get('last_name_cyrillic') or person_data.get('last_name')
-        last_clean = normalize_string(remove_duplication(last_raw or '')).strip()
-        if not last_clean:
+        ln = normalize_name_key(remove_duplication(last_raw or ''))
+        if not ln:
             continue
-        ln = last_clean.lower()
-        candidates = Athlete.query.filter(func.lower(func.trim(Athlete.last_name)) == ln).all()
+        entries.append((person_id, display, _fio_key(display), ln, xml_date))
+
+    candidates = _candidates_by_last_name({ln for _pid, _d, _k, ln, _x in entries})
+    athlete_keys: dict[int, str] = {}
 
-        for a in candidates:
-            if _fio_key(_athlete_display_fio(a)) != pkey:
+    for person_id, display, pkey, ln, xml_date in entries:
+        for a in candidates.get(ln, ()):
+            akey = athlete_keys.get(a.id)
+            if akey is None:
+                akey = athlete_keys[a.id] = _fio_key(_athlete_display_fio(a))
+            if akey != pkey:
                 continue
             adb = a.birth_date
             if not adb or adb == xml_date:
@@ -140,7 +160,7 @@ def apply_birth_conflict_resolutions_json(resolutions: list[dict], parsers: list
         athlete = Athlete.query.get(aid)
         person_data = None
         for parser in parsers:
-            person_data = next((p for p in parser.persons if str(p['id']) == person_id), None)
+            person_data = parser.persons_by_id.get(person_id)
             if person_data:
                 break
         if not athlete or not person_data:
@@ -165,6 +185,6 @@ def apply_birth_conflict_resolutions_json(resolutions: list[dict], parsers: list
             continue
         db_d = athlete.birth_date
         for parser in parsers:
-            person_data = next((p for p in parser.persons if str(p['id']) == person_id), None)
+            person_data = parser.persons_by_id.get(person_id)
             if person_data:
                 person_data['birth_date'] = db_d
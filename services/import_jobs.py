@@ -0,0 +1,337 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Фоновый импорт XML: очередь задач, пул воркеров и прогресс по файлам и этапам.
+
+/upload-to-database и POST /normalize-categories только ставят задачу (таблица
+import_job) и сразу отвечают, страница загрузки опрашивает статус. Выбор даты
+рождения при конфликтах ФИО (birth_conflict_resolutions в черновике) применяется
+к каждому файлу перед его записью. Итог по каждому файлу пишется в import_job
+после его коммита. Текущий этап (parse / clubs / athletes / performances / commit)
+пишется в instance/import_jobs/<id>.json: строку import_job нельзя обновить, пока
+открыта транзакция импорта (SQLite держит блокировку записи). Файл виден всем
+воркерам Gunicorn.
+Размер пула: IMPORT_JOB_WORKERS (по умолчанию 1 — записи в SQLite всё равно
+идут по одной).
+Пул живёт в процессе воркера: после его перезапуска задача осталась бы
+queued/running навсегда. Поэтому задача отмечается в heartbeat_at (постановка,
+старт, каждый файл), а этапы — во времени файла прогресса; если ни того, ни
+другого не было дольше IMPORT_JOB_STALE_SECONDS, задача помечается ошибкой
+при опросе статуса или постановке новой задачи.
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import update
+
+from extensions import db
+from models import ImportJob
+from services.import_birth_conflict import apply_birth_conflict_resolutions_json
+from services.import_service import save_to_database
+from services.xml_archive import archive_imported_xml
+from services.xml_import_prepare import iter_ready_parsers
+
+logger = logging.getLogger(__name__)
+
+IMPORT_STAGES = ('parse', 'clubs', 'athletes', 'performances', 'commit')
+DEFAULT_WORKERS = 1
+DEFAULT_STALE_SECONDS = 30 * 60
+ACTIVE_STATUSES = ('queued', 'running')
+STALE_MESSAGE = 'Импорт прерван: задача перестала отвечать (процесс остановлен?). Загрузите файлы заново.'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _workers() -> int:
+    try:
+        return max(1, int(os.environ.get('IMPORT_JOB_WORKERS', DEFAULT_WORKERS)))
+    except ValueError:
+        return DEFAULT_WORKERS
+
+
+def _stale_seconds() -> int:
+    try:
+        return max(60, int(os.environ.get('IMPORT_JOB_STALE_SECONDS', DEFAULT_STALE_SECONDS)))
+    except ValueError:
+        return DEFAULT_STALE_SECONDS
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_workers(), thread_name_prefix='import-job')
+        return _executor
+
+
+def _progress_path(app_obj, job_id):
+    return os.path.join(app_obj.instance_path, 'import_jobs', f'{int(job_id)}.json')
+
+
+def _read_progress(app_obj, job_id):
+    try:
+        with open(_progress_path(app_obj, job_id), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class _ProgressTracker:
+    """Живой прогресс задачи в JSON-файле (атомарная замена)."""
+
+    def __init__(self, app_obj, job_id, files):
+        self.path = _progress_path(app_obj, job_id)
+        self.files = files
+        self.current = None
+        self.stage = None
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def _write(self):
+        state = {
+            'stage': self.stage,
+            'current_file': self.files[self.current]['filename'] if self.current is not None else None,
+            'files': self.files,
+            'updated_at': int(time.time()),
+        }
+        tmp_path = f'{self.path}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(state, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.warning('Не удалось записать прогресс импорта %s: %s', self.path, e)
+
+    def next_file(self):
+        """Начало разбора очередного файла (первого ещё не обработанного)."""
+        self.current = next((i for i, f in enumerate(self.files) if f['status'] == 'pending'), None)
+        self.set_stage('parse')
+
+    def start_file(self, index):
+        if index is not None:
+            # Более ранние файлы iter_ready_parsers пропустил (нет на диске или все категории исключены)
+            for file_state in self.files[:index]:
+                if file_state['status'] in ('pending', 'running'):
+                    file_state['status'] = 'skipped'
+                    file_state['stage'] = None
+        self.current = index
+        self.set_stage('parse')
+
+    def set_stage(self, stage):
+        self.stage = stage
+        if self.current is not None:
+            self.files[self.current]['status'] = 'running'
+            self.files[self.current]['stage'] = stage
+        self._write()
+
+    def finish_file(self, status, athletes=0):
+        if self.current is not None:
+            self.files[self.current]['status'] = status
+            self.files[self.current]['stage'] = None
+            self.files[self.current]['athletes'] = athletes
+        self.current = None
+        self.stage = None
+        self._write()
+
+    def close(self):
+        for file_state in self.files:
+            if file_state['status'] in ('pending', 'running'):
+                file_state['status'] = 'skipped'
+                file_state['stage'] = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _files_from_parser_data(parser_data):
+    if 'files' in parser_data:
+        return [
+            {'filename': f.get('filename'), 'filepath': f.get('filepath'), 'status': 'pending', 'stage': None, 'athletes': 0}
+            for f in parser_data['files']
+        ]
+    filepath = parser_data.get('filepath')
+    return [{
+        'filename': parser_data.get('upload_original_filename') or os.path.basename(filepath or ''),
+        'filepath': filepath,
+        'status': 'pending',
+        'stage': None,
+        'athletes': 0,
+    }]
+
+
+def submit_import_job(app_obj, parser_data):
+    """Создаёт задачу импорта для черновика parser_data и ставит её в пул. Возвращает id задачи."""
+    _expire_stale_jobs(app_obj)
+    files = _files_from_parser_data(parser_data)
+    job = ImportJob(
+        status='queued',
+        heartbeat_at=datetime.utcnow(),
+        files_total=len(files),
+        payload=json.dumps(parser_data, ensure_ascii=False, default=str),
+        files_state=json.dumps(files, ensure_ascii=False),
+        message='Импорт поставлен в очередь',
+    )
+    db.session.add(job)
+    db.session.commit()
+    _get_executor().submit(_run_import_job, app_obj, job.id)
+    return job.id
+
+
+def _run_import_job(app_obj, job_id):
+    with app_obj.app_context():
+        try:
+            _process_import_job(app_obj, job_id)
+        except Exception as e:
+            logger.error(f"Ошибка фоновой задачи импорта {job_id}: {e}", exc_info=True)
+        finally:
+            db.session.remove()
+
+
+def _process_import_job(app_obj, job_id):
+    now = datetime.utcnow()
+    # Берём только задачу, которая всё ещё в очереди (не помечена ошибкой как зависшая)
+    claimed = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == 'queued')
+        .values(status='running', started_at=now, heartbeat_at=now, message='Импорт выполняется')
+    ).rowcount
+    db.session.commit()
+    if not claimed:
+        return
+    job = db.session.get(ImportJob, job_id)
+    parser_data = json.loads(job.payload or '{}')
+    files = json.loads(job.files_state or '[]')
+
+    tracker = _ProgressTracker(app_obj, job_id, files)
+    file_index = {f['filepath']: i for i, f in enumerate(files)}
+    # Выбор даты рождения при конфликтах ФИО (форма нормализации категорий)
+    resolutions = parser_data.get('birth_conflict_resolutions') or []
+    up_folder = app_obj.config['UPLOAD_FOLDER']
+    bundle = iter_ready_parsers(
+        parser_data,
+        parser_data.get('categories_analysis', []),
+        set(parser_data.get('deleted_category_indices', [])),
+    )
+    try:
+        while True:
+            tracker.next_file()
+            try:
+                parser, filepath, original_filename = next(bundle)
+            except StopIteration:
+                break
+            tracker.start_file(file_index.get(filepath))
+
+            apply_birth_conflict_resolutions_json(resolutions, [parser])
+            save_to_database(parser, progress=tracker.set_stage)
+            athletes_count = len(parser.get_athletes_with_results())
+            archive_imported_xml(filepath, original_filename or os.path.basename(filepath), up_folder)
+            if os.path.exists(filepath):
+                try:
+                    os.remove(filepath)
+                except OSError as e:
+                    logger.warning(f"Не удалось удалить файл {filepath}: {str(e)}")
+            tracker.finish_file('done', athletes_count)
+
+            job.files_done += 1
+            job.athletes_total += athletes_count
+            job.files_state = json.dumps(files, ensure_ascii=False)
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+
+        job.status = 'success'
+        job.message = (
+            f'Успешно загружено файлов: {job.files_done}. '
+            f'Всего добавлено спортсменов: {job.athletes_total}.'
+        )
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ошибка при загрузке в базу (задача {job_id}): {str(e)}", exc_info=True)
+        tracker.finish_file('error')
+        job = db.session.get(ImportJob, job_id)
+        job.status = 'error'
+        job.message = f'Ошибка при загрузке в базу: {str(e)}'
+    tracker.close()
+    job.files_state = json.dumps(files, ensure_ascii=False)
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+
+def _last_alive(job, live):
+    """Последний признак жизни задачи: heartbeat_at или запись этапа в файл прогресса."""
+    last = job.heartbeat_at or job.started_at or job.created_at
+    if live and live.get('updated_at'):
+        last = max(last, datetime.utcfromtimestamp(live['updated_at']))
+    return last
+
+
+def _expire_job(job, now):
+    """Помечает зависшую задачу ошибкой, если она всё ещё queued/running. Возвращает True, если пометила."""
+    expired = db.session.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job.id, ImportJob.status.in_(ACTIVE_STATUSES))
+        .values(status='error', finished_at=now, message=STALE_MESSAGE)
+    ).rowcount
+    db.session.commit()
+    if expired:
+        logger.warning(f"Задача импорта {job.id} помечена ошибкой: нет признаков жизни с {_last_alive(job, None)}")
+    return bool(expired)
+
+
+def _is_stale(app_obj, job, now):
+    if job.status not in ACTIVE_STATUSES:
+        return False
+    live = _read_progress(app_obj, job.id) if job.status == 'running' else None
+    return _last_alive(job, live) < now - timedelta(seconds=_stale_seconds())
+
+
+def _expire_stale_jobs(app_obj):
+    now = datetime.utcnow()
+    for job in ImportJob.query.filter(ImportJob.status.in_(ACTIVE_STATUSES)).all():
+        if _is_stale(app_obj, job, now):
+            _expire_job(job, now)
+
+
+def import_job_status(app_obj, job_id):
+    """Статус задачи для polling: итог из import_job + текущий этап из файла прогресса."""
+    job = db.session.get(ImportJob, job_id)
+    if job is None:
+        return None
+    now = datetime.utcnow()
+    if _is_stale(app_obj, job, now):
+        _expire_job(job, now)
+        db.session.refresh(job)
+    files = json.loads(job.files_state or '[]')
+    stage = None
+    current_file = None
+    if job.status == 'running':
+        live = _read_progress(app_obj, job_id)
+        if live:
+            files = live.get('files') or files
+            stage = live.get('stage')
+            current_file = live.get('current_file')
+    return {
+        'id': job.id,
+        'status': job.status,
+        'running': job.status in ('queued', 'running'),
+        'success': True if job.status == 'success' else (False if job.status == 'error' else None),
+        'message': job.message,
+        'stage': stage,
+        'stages': list(IMPORT_STAGES),
+        'current_file': current_file,
+        'files_total': job.files_total,
+        'files_done': job.files_done,
+        'athletes_total': job.athletes_total,
+        'files': [
+            {k: f.get(k) for k in ('filename', 'status', 'stage', 'athletes')}
+            for f in files
+        ],
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+    }
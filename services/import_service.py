@@ -4,17 +4,37 @@
 import json
 import logging
 
+from sqlalchemy import insert
+
 from extensions import db
-from models import Event, Category, Segment, Club, Athlete, Participant, Performance, Element, ComponentScore, Judge, JudgePanel, Coach, CoachAssignment
+from models import Event, Category, Segment, Club, Athlete, Participant, Performance, Element, ComponentScore, JudgePanel
 from services.club_registry import ClubRegistry
 from services.athlete_registry import AthleteRegistry
+from services.athlete_rank_stats import refresh_athlete_rank_stats
+from services.judge_registry import JudgeRegistry
 from services.coach_registry import CoachRegistry
+from services.coach_assignment_service import CoachTimelineBuilder
+from services.data_version import bump_data_version
 from services.rank_service import normalize_category_name
 from utils.date_parsing import parse_date, parse_time, parse_datetime
 from utils.normalizers import remove_duplication
 
 logger = logging.getLogger(__name__)
 
+# Размер пачки для INSERT ... VALUES (...), (...) при массовой вставке
+BULK_INSERT_BATCH_SIZE = 500
+
+_PARTICIPANT_STATUS_FIELDS = (
+    'status',
+    'status_segment1',
+    'status_segment2',
+    'status_segment3',
+    'status_segment4',
+    'status_segment5',
+    'status_segment6',
+)
+
+
 def _parse_score(raw_value):
     if raw_value is None or raw_value == '':
         return None
@@ -23,8 +43,136 @@ def _parse_score(raw_value):
     except (ValueError, TypeError):
         return None
 
-def save_to_database(parser):
-    """Сохраняет данные из парсера в базу данных."""
+
+def _parse_int(raw_value):
+    return int(raw_value) if raw_value else None
+
+
+def _bulk_insert_returning_ids(model, rows):
+    """INSERT пачками через Core insert() с RETURNING; id возвращаются в порядке rows."""
+    ids = []
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        batch = rows[start:start + BULK_INSERT_BATCH_SIZE]
+        result = db.session.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            batch,
+        )
+        ids.extend(result.all())
+    return ids
+
+
+def _bulk_insert(model, rows):
+    """INSERT пачками (executemany) без возврата id."""
+    for start in range(0, len(rows), BULK_INSERT_BATCH_SIZE):
+        db.session.execute(insert(model), rows[start:start + BULK_INSERT_BATCH_SIZE])
+
+
+def _fill_missing(row, values):
+    """Дополняет строку только пустыми полями — как при повторной встрече записи в XML."""
+    for key, value in values.items():
+        row[key] = row[key] or value
+
+
+def _participant_values(participant_data):
+    values = {
+        'bib_number': _parse_int(participant_data.get('bib_number')),
+        'total_points': _parse_score(participant_data.get('total_points')),
+        'total_place': _parse_int(participant_data.get('rank')),
+        'pct_ppname': participant_data.get('pct_ppname'),
+    }
+    for field in _PARTICIPANT_STATUS_FIELDS:
+        values[field] = participant_data.get(field)
+    return values
+
+
+def _performance_row(participant_id, segment_id, performance_data):
+    return {
+        'participant_id': participant_id,
+        'segment_id': segment_id,
+        'index': _parse_int(performance_data.get('starting_number')),
+        'status': performance_data.get('status'),
+        'qualification': performance_data.get('qualification'),
+        'start_time': parse_time(performance_data.get('start_time')),
+        'duration': parse_time(performance_data.get('duration')),
+        'judge_time': parse_time(performance_data.get('judge_time')),
+        'place': _parse_int(performance_data.get('rank')),
+        'points': _parse_score(performance_data.get('points')),
+        'total_1': _parse_score(performance_data.get('total_1')),
+        'result_1': _parse_score(performance_data.get('result_1')),
+        'total_2': _parse_score(performance_data.get('total_2')),
+        'result_2': _parse_score(performance_data.get('result_2')),
+        'tes_total': performance_data.get('tes_sum') or performance_data.get('tes_result'),
+        'pcs_total': performance_data.get('pcs_sum') or performance_data.get('pcs_result'),
+        'deductions': performance_data.get('deductions'),
+        'bonus': performance_data.get('bonus'),
+        'judge_scores': json.dumps({
+            'elements': performance_data.get('elements', []),
+            'components': performance_data.get('components', []),
+            'meta': {
+                'start_group': performance_data.get('start_group'),
+                'performance_index': performance_data.get('performance_index'),
+                'locked': performance_data.get('locked'),
+                'tes_sum': performance_data.get('tes_sum'),
+                'tes_result': performance_data.get('tes_result'),
+                'pcs_sum': performance_data.get('pcs_sum'),
+                'pcs_result': performance_data.get('pcs_result'),
+                'tech_target': performance_data.get('tech_target'),
+                'points_needed_1': performance_data.get('points_needed_1'),
+                'points_needed_2': performance_data.get('points_needed_2'),
+                'points_needed_3': performance_data.get('points_needed_3')
+            }
+        }),
+    }
+
+
+def _element_row(performance_id, elem):
+    judge_scores = elem.get('judge_scores') or {}
+    if elem.get('planned_norm'):
+        judge_scores['planned_norm'] = elem.get('planned_norm')
+    if elem.get('confirmed') is not None:
+        judge_scores['confirmed'] = elem.get('confirmed')
+    if elem.get('time_code') is not None:
+        judge_scores['time_code'] = elem.get('time_code')
+    return {
+        'performance_id': performance_id,
+        'order_num': elem.get('order_num'),
+        'planned_code': elem.get('planned_code'),
+        'executed_code': elem.get('executed_code'),
+        'info_code': elem.get('info_code'),
+        'base_value': int(elem['base_value']) if elem.get('base_value') else None,
+        'goe_result': int(elem['goe_result']) if elem.get('goe_result') else None,
+        'penalty': int(elem['penalty']) if elem.get('penalty') else None,
+        'result': int(elem['result']) if elem.get('result') else None,
+        'judge_scores': judge_scores,
+    }
+
+
+def _component_row(performance_id, comp):
+    return {
+        'performance_id': performance_id,
+        'component_type': comp.get('component_type'),
+        'factor': comp.get('factor'),
+        'judge_scores': comp.get('judge_scores'),
+        'penalty': int(comp['penalty']) if comp.get('penalty') else None,
+        'result': int(comp['result']) if comp.get('result') else None,
+    }
+
+
+def _no_progress(stage):
+    pass
+
+
+def save_to_database(parser, progress=None):
+    """Сохраняет данные из парсера в базу данных.
+
+    Турнир новый (дубликат отклоняется), поэтому категории, сегменты, бригады, участия
+    и выступления не могут уже существовать в БД: повторы внутри XML склеиваются в памяти,
+    а затем каждая таблица пишется массовым INSERT.
+    progress — необязательный callback(stage), вызывается перед этапами
+    'clubs', 'athletes', 'performances' и 'commit' (см. services/import_jobs.py).
+    """
+    if progress is None:
+        progress = _no_progress
     event_data = parser.events[0] if parser.events else {}
     event_begin_date = parse_date(event_data.get('begin_date'))
     event_name = event_data.get('name')
@@ -55,6 +203,7 @@ def save_to_database(parser):
     db.session.add(event)
     db.session.flush()
 
+    progress('clubs')
     club_mapping = {}
     club_registry = ClubRegistry()
     for club_data in parser.clubs:
@@ -62,16 +211,19 @@ def save_to_database(parser):
         if club:
             db.session.flush()
             club_mapping[club_data['id']] = club.id
-    
-    # После регистрации всех клубов автоматически объединяем дубликаты
-    merged_count = club_registry.merge_all_duplicates()
+
+    # После регистрации всех клубов объединяем дубликаты среди клубов этого импорта
+    merged_count = club_registry.merge_touched_duplicates()
     if merged_count > 0:
         logger.info(f"Автоматически объединено {merged_count} дубликатов клубов при импорте")
+        # club_mapping не должен ссылаться на удалённые дубликаты
+        for xml_club_id, club_id in club_mapping.items():
+            club_mapping[xml_club_id] = club_registry.merged_into.get(club_id, club_id)
 
     # Инициализируем реестр тренеров
     coach_registry = CoachRegistry()
 
-    category_mapping = {}
+    category_rows = []
     for category_data in parser.categories:
         normalized_name = category_data.get('normalized_name')
         if not normalized_name:
@@ -79,85 +231,75 @@ def save_to_database(parser):
                 category_data.get('name'),
                 category_data.get('gender')
             )
+        category_rows.append({
+            'external_id': category_data.get('external_id'),
+            'event_id': event.id,
+            'name': category_data.get('name'),
+            'tv_name': category_data.get('short_name'),
+            'normalized_name': normalized_name,
+            'num_entries': _parse_int(category_data.get('num_entries')),
+            'num_participants': _parse_int(category_data.get('num_participants')),
+            'level': category_data.get('level'),
+            'gender': category_data.get('gender'),
+            'category_type': category_data.get('type'),
+            'status': category_data.get('status'),
+        })
+    category_ids = _bulk_insert_returning_ids(Category, category_rows)
+    category_mapping = {
+        category_data['id']: category_id
+        for category_data, category_id in zip(parser.categories, category_ids)
+    }
 
-        category = Category(
-            external_id=category_data.get('external_id'),
-            event_id=event.id,
-            name=category_data.get('name'),
-            tv_name=category_data.get('short_name'),
-            normalized_name=normalized_name,
-            num_entries=int(category_data.get('num_entries', 0)) if category_data.get('num_entries') else None,
-            num_participants=int(category_data.get('num_participants', 0)) if category_data.get('num_participants') else None,
-            level=category_data.get('level'),
-            gender=category_data.get('gender'),
-            category_type=category_data.get('type'),
-            status=category_data.get('status')
-        )
-        db.session.add(category)
-        db.session.flush()
-        category_mapping[category_data['id']] = category.id
-
-    segment_mapping = {}
-    for segment_data in parser.segments:
-        segment = Segment(
-            category_id=category_mapping.get(segment_data.get('category_id')),
-            name=segment_data.get('name'),
-            tv_name=segment_data.get('tv_name'),
-            short_name=segment_data.get('short_name'),
-            segment_type=segment_data.get('type'),
-            factor=float(segment_data.get('factor', 0)) if segment_data.get('factor') else None,
-            status=segment_data.get('status')
-        )
-        db.session.add(segment)
-        db.session.flush()
-        segment_mapping[segment_data['id']] = segment.id
-
-    judge_mapping = {}
-    for judge_data in parser.judges:
-        judge = Judge.query.filter_by(
-            first_name=judge_data.get('first_name'),
-            last_name=judge_data.get('last_name'),
-            full_name_xml=judge_data.get('full_name_xml')
-        ).first()
-        if not judge:
-            judge = Judge(
-                first_name=judge_data.get('first_name') or None,
-                last_name=judge_data.get('last_name') or None,
-                full_name_xml=judge_data.get('full_name_xml') or None,
-                short_name=judge_data.get('short_name') or None,
-                gender=judge_data.get('gender') or None,
-                country=judge_data.get('country') or None,
-                city=judge_data.get('city') or None,
-                qualification=judge_data.get('qualification') or None,
-            )
-            db.session.add(judge)
-            db.session.flush()
-        judge_mapping[judge_data.get('id')] = judge.id
+    segment_rows = [
+        {
+            'category_id': category_mapping.get(segment_data.get('category_id')),
+            'name': segment_data.get('name'),
+            'tv_name': segment_data.get('tv_name'),
+            'short_name': segment_data.get('short_name'),
+            'segment_type': segment_data.get('type'),
+            'factor': float(segment_data.get('factor', 0)) if segment_data.get('factor') else None,
+            'status': segment_data.get('status'),
+        }
+        for segment_data in parser.segments
+    ]
+    segment_ids = _bulk_insert_returning_ids(Segment, segment_rows)
+    segment_mapping = {
+        segment_data['id']: segment_id
+        for segment_data, segment_id in zip(parser.segments, segment_ids)
+    }
+
+    judge_mapping = JudgeRegistry().resolve_many(parser.judges)
 
+    # Сегменты только что созданы — бригад у них ещё нет, дубликаты бывают только внутри XML
+    panel_rows = {}
     for panel in parser.judge_panels:
         segment_id = segment_mapping.get(panel.get('segment_id'))
         category_id = category_mapping.get(panel.get('category_id'))
         judge_id = judge_mapping.get(panel.get('judge_id'))
         if not segment_id or not judge_id:
             continue
-        existing_panel = JudgePanel.query.filter_by(segment_id=segment_id, judge_id=judge_id).first()
-        if existing_panel:
+        if (segment_id, judge_id) in panel_rows:
             continue
-        db.session.add(JudgePanel(
-            segment_id=segment_id,
-            category_id=category_id,
-            judge_id=judge_id,
-            role_code=panel.get('role_code'),
-            panel_group=panel.get('panel_group'),
-            order_num=panel.get('order_num'),
-        ))
+        panel_rows[(segment_id, judge_id)] = {
+            'segment_id': segment_id,
+            'category_id': category_id,
+            'judge_id': judge_id,
+            'role_code': panel.get('role_code'),
+            'panel_group': panel.get('panel_group'),
+            'order_num': panel.get('order_num'),
+        }
+    _bulk_insert(JudgePanel, list(panel_rows.values()))
 
+    progress('athletes')
     athlete_registry = AthleteRegistry()
     category_gender_map = {
         c['id']: c.get('gender') for c in parser.categories
     }
+    # Вхождения участников в порядке XML и данные спортсменов для пакетного поиска
+    entries = []
+    athlete_payloads = []
     for participant_data in parser.participants:
-        person_data = next((p for p in parser.persons if p['id'] == participant_data['person_id']), None)
+        person_data = parser.persons_by_id.get(participant_data['person_id'])
         if not person_data:
             continue
 
@@ -170,10 +312,10 @@ def save_to_database(parser):
         first_name_raw = person_data.get('first_name_cyrillic') or person_data.get('first_name')
         last_name_raw = person_data.get('last_name_cyrillic') or person_data.get('last_name')
         patronymic_raw = person_data.get('patronymic_cyrillic') or person_data.get('patronymic')
-        
+
         # Приоритет для full_name_xml: PCT_PLNAME (имя для протоколов) > PCT_CNAME (полное имя)
         full_name_xml = person_data.get('full_name') or person_data.get('full_name_xml')
-        
+
         athlete_payload = {
             'external_id': person_data.get('external_id'),
             'first_name': remove_duplication(first_name_raw) if first_name_raw else None,
@@ -185,201 +327,94 @@ def save_to_database(parser):
             'country': person_data.get('nationality'),
             'club_id': club_id,
         }
-        athlete = athlete_registry.get_or_create(athlete_payload)
-        db.session.flush()
+        entries.append((participant_data, person_data))
+        athlete_payloads.append(athlete_payload)
 
+    athletes = athlete_registry.resolve_many(athlete_payloads)
+
+    # (category_id, athlete_id) -> строка участия; одно участие встречается в XML в каждом сегменте
+    participant_rows = {}
+    # Вхождения участников в порядке XML: (ключ участия, participant_data, person_data, athlete)
+    occurrences = []
+    for (participant_data, person_data), athlete in zip(entries, athletes):
         category_id = category_mapping.get(participant_data.get('category_id'))
-        participant = Participant.query.filter_by(
-            event_id=event.id,
-            category_id=category_id,
-            athlete_id=athlete.id
-        ).first()
-        if not participant:
-            participant = Participant(
-                external_id=participant_data.get('id'),
-                event_id=event.id,
-                category_id=category_id,
-                athlete_id=athlete.id,
-                bib_number=int(participant_data.get('bib_number', 0)) if participant_data.get('bib_number') else None,
-                total_points=_parse_score(participant_data.get('total_points')),
-                total_place=int(participant_data.get('rank', 0)) if participant_data.get('rank') else None,
-                status=participant_data.get('status'),
-                status_segment1=participant_data.get('status_segment1'),
-                status_segment2=participant_data.get('status_segment2'),
-                status_segment3=participant_data.get('status_segment3'),
-                status_segment4=participant_data.get('status_segment4'),
-                status_segment5=participant_data.get('status_segment5'),
-                status_segment6=participant_data.get('status_segment6'),
-                pct_ppname=participant_data.get('pct_ppname'),
-                coach=person_data.get('coach')
-            )
-            db.session.add(participant)
-            db.session.flush()
+        key = (category_id, athlete.id)
+        values = _participant_values(participant_data)
+        row = participant_rows.get(key)
+        if row is None:
+            row = {
+                'external_id': participant_data.get('id'),
+                'event_id': event.id,
+                'category_id': category_id,
+                'athlete_id': athlete.id,
+                'coach': person_data.get('coach'),
+                **values,
+            }
+            participant_rows[key] = row
         else:
-            participant.bib_number = participant.bib_number or (int(participant_data.get('bib_number', 0)) if participant_data.get('bib_number') else None)
-            participant.total_points = participant.total_points or _parse_score(participant_data.get('total_points'))
-            participant.total_place = participant.total_place or (int(participant_data.get('rank', 0)) if participant_data.get('rank') else None)
-            participant.status = participant.status or participant_data.get('status')
-            participant.status_segment1 = participant.status_segment1 or participant_data.get('status_segment1')
-            participant.status_segment2 = participant.status_segment2 or participant_data.get('status_segment2')
-            participant.status_segment3 = participant.status_segment3 or participant_data.get('status_segment3')
-            participant.status_segment4 = participant.status_segment4 or participant_data.get('status_segment4')
-            participant.status_segment5 = participant.status_segment5 or participant_data.get('status_segment5')
-            participant.status_segment6 = participant.status_segment6 or participant_data.get('status_segment6')
-            participant.pct_ppname = participant.pct_ppname or participant_data.get('pct_ppname')
+            _fill_missing(row, values)
             # Обновляем тренера если он изменился
             new_coach_name = person_data.get('coach')
-            if new_coach_name and new_coach_name != participant.coach:
-                participant.coach = new_coach_name
-        
-        # Обрабатываем тренера и отслеживаем переходы
-        coach_name = person_data.get('coach')
-        if coach_name and coach_name.strip():
-            coach = coach_registry.get_or_create(coach_name)
-            if coach:
-                db.session.flush()
-                
-                # Получаем дату события для отслеживания переходов
-                event_date = event.begin_date or event.end_date
-                if event_date:
-                    # Проверяем, есть ли уже назначение для этого спортсмена с этим тренером на эту дату
-                    existing_assignment = CoachAssignment.query.filter_by(
-                        athlete_id=athlete.id,
-                        coach_id=coach.id,
-                        event_id=event.id
-                    ).first()
-                    
-                    if not existing_assignment:
-                        # Проверяем, есть ли текущий тренер у спортсмена
-                        current_assignment = CoachAssignment.query.filter_by(
-                            athlete_id=athlete.id,
-                            is_current=True
-                        ).first()
-                        
-                        if current_assignment:
-                            # Если текущий тренер отличается от нового - это переход
-                            if current_assignment.coach_id != coach.id:
-                                # Закрываем предыдущее назначение
-                                current_assignment.end_date = event_date
-                                current_assignment.is_current = False
-                                
-                                # Создаем новое назначение
-                                new_assignment = CoachAssignment(
-                                    coach_id=coach.id,
-                                    athlete_id=athlete.id,
-                                    participant_id=participant.id,
-                                    event_id=event.id,
-                                    start_date=event_date,
-                                    is_current=True
-                                )
-                                db.session.add(new_assignment)
-                                logger.info(
-                                    f"Переход спортсмена {athlete.id} от тренера {current_assignment.coach_id} "
-                                    f"к тренеру {coach.id} на дату {event_date}"
-                                )
-                        else:
-                            # Первое назначение тренера
-                            new_assignment = CoachAssignment(
-                                coach_id=coach.id,
-                                athlete_id=athlete.id,
-                                participant_id=participant.id,
-                                event_id=event.id,
-                                start_date=event_date,
-                                is_current=True
-                            )
-                            db.session.add(new_assignment)
-
-        for performance_data in parser.performances:
-            if performance_data.get('participant_id') == participant_data['id']:
-                segment_id = segment_mapping.get(performance_data.get('segment_id'))
-                performance = Performance.query.filter_by(
-                    participant_id=participant.id,
-                    segment_id=segment_id
-                ).first()
-                is_new_performance = False
-                if not performance:
-                    performance = Performance(
-                        participant_id=participant.id,
-                        segment_id=segment_id,
-                        index=int(performance_data.get('starting_number', 0)) if performance_data.get('starting_number') else None,
-                        status=performance_data.get('status'),
-                        qualification=performance_data.get('qualification'),
-                        start_time=parse_time(performance_data.get('start_time')),
-                        duration=parse_time(performance_data.get('duration')),
-                        judge_time=parse_time(performance_data.get('judge_time')),
-                        place=int(performance_data.get('rank', 0)) if performance_data.get('rank') else None,
-                        points=_parse_score(performance_data.get('points')),
-                        total_1=_parse_score(performance_data.get('total_1')),
-                        result_1=_parse_score(performance_data.get('result_1')),
-                        total_2=_parse_score(performance_data.get('total_2')),
-                        result_2=_parse_score(performance_data.get('result_2')),
-                        tes_total=performance_data.get('tes_sum') or performance_data.get('tes_result'),
-                        pcs_total=performance_data.get('pcs_sum') or performance_data.get('pcs_result'),
-                        deductions=performance_data.get('deductions'),
-                        bonus=performance_data.get('bonus'),
-                        judge_scores=json.dumps({
-                            'elements': performance_data.get('elements', []),
-                            'components': performance_data.get('components', []),
-                            'meta': {
-                                'start_group': performance_data.get('start_group'),
-                                'performance_index': performance_data.get('performance_index'),
-                                'locked': performance_data.get('locked'),
-                                'tes_sum': performance_data.get('tes_sum'),
-                                'tes_result': performance_data.get('tes_result'),
-                                'pcs_sum': performance_data.get('pcs_sum'),
-                                'pcs_result': performance_data.get('pcs_result'),
-                                'tech_target': performance_data.get('tech_target'),
-                                'points_needed_1': performance_data.get('points_needed_1'),
-                                'points_needed_2': performance_data.get('points_needed_2'),
-                                'points_needed_3': performance_data.get('points_needed_3')
-                            }
-                        })
-                    )
-                    db.session.add(performance)
-                    db.session.flush()  # Получаем performance.id перед созданием элементов
-                    is_new_performance = True
-                else:
-                    performance.status = performance.status or performance_data.get('status')
-                    performance.qualification = performance.qualification or performance_data.get('qualification')
-                    performance.place = performance.place or (int(performance_data.get('rank', 0)) if performance_data.get('rank') else None)
-                    performance.points = performance.points or _parse_score(performance_data.get('points'))
-
-                if not is_new_performance:
-                    continue
-
-                for elem in performance_data.get('elements', []):
-                    judge_scores = elem.get('judge_scores') or {}
-                    if elem.get('planned_norm'):
-                        judge_scores['planned_norm'] = elem.get('planned_norm')
-                    if elem.get('confirmed') is not None:
-                        judge_scores['confirmed'] = elem.get('confirmed')
-                    if elem.get('time_code') is not None:
-                        judge_scores['time_code'] = elem.get('time_code')
-                    element = Element(
-                        performance_id=performance.id,
-                        order_num=elem.get('order_num'),
-                        planned_code=elem.get('planned_code'),
-                        executed_code=elem.get('executed_code'),
-                        info_code=elem.get('info_code'),
-                        base_value=int(elem['base_value']) if elem.get('base_value') else None,
-                        goe_result=int(elem['goe_result']) if elem.get('goe_result') else None,
-                        penalty=int(elem['penalty']) if elem.get('penalty') else None,
-                        result=int(elem['result']) if elem.get('result') else None,
-                        judge_scores=judge_scores,
-                    )
-                    db.session.add(element)
-
-                for comp in performance_data.get('components', []):
-                    component = ComponentScore(
-                        performance_id=performance.id,
-                        component_type=comp.get('component_type'),
-                        factor=comp.get('factor'),
-                        judge_scores=comp.get('judge_scores'),
-                        penalty=int(comp['penalty']) if comp.get('penalty') else None,
-                        result=int(comp['result']) if comp.get('result') else None,
-                    )
-                    db.session.add(component)
+            if new_coach_name and new_coach_name != row['coach']:
+                row['coach'] = new_coach_name
+        occurrences.append((key, participant_data, person_data, athlete))
+
+    participant_keys = list(participant_rows)
+    participant_ids = _bulk_insert_returning_ids(Participant, list(participant_rows.values()))
+    participant_mapping = dict(zip(participant_keys, participant_ids))
+
+    # Тренеры и переходы: тренеры и текущие назначения загружаются двумя запросами,
+    # хронология считается в памяти и пишется пакетно
+    event_date = event.begin_date or event.end_date
+    coach_registry.resolve_many(person_data.get('coach') for _, _, person_data, _ in occurrences)
+    if event_date:
+        timeline = CoachTimelineBuilder()
+        timeline.load_current(athlete.id for _, _, _, athlete in occurrences)
+        for key, participant_data, person_data, athlete in occurrences:
+            coach = coach_registry.get_or_create(person_data.get('coach'))
+            if not coach:
+                continue
+            timeline.record(athlete.id, coach.id, participant_mapping[key], event.id, event_date)
+        timeline.write()
+
+    progress('performances')
+    # (participant_id, segment_id) -> строка выступления; элементы и компоненты пишутся только для новых
+    performance_rows = {}
+    performance_sources = []
+    for key, participant_data, _person_data, _athlete in occurrences:
+        participant_id = participant_mapping[key]
+        for performance_data in parser.performances_by_participant.get(participant_data['id'], ()):
+            segment_id = segment_mapping.get(performance_data.get('segment_id'))
+            row = performance_rows.get((participant_id, segment_id))
+            if row is None:
+                performance_rows[(participant_id, segment_id)] = _performance_row(
+                    participant_id, segment_id, performance_data
+                )
+                performance_sources.append(performance_data)
+            else:
+                _fill_missing(row, {
+                    'status': performance_data.get('status'),
+                    'qualification': performance_data.get('qualification'),
+                    'place': _parse_int(performance_data.get('rank')),
+                    'points': _parse_score(performance_data.get('points')),
+                })
+
+    performance_ids = _bulk_insert_returning_ids(Performance, list(performance_rows.values()))
+
+    element_rows = []
+    component_rows = []
+    for performance_id, performance_data in zip(performance_ids, performance_sources):
+        for elem in performance_data.get('elements', []):
+            element_rows.append(_element_row(performance_id, elem))
+        for comp in performance_data.get('components', []):
+            component_rows.append(_component_row(performance_id, comp))
+    _bulk_insert(Element, element_rows)
+    _bulk_insert(ComponentScore, component_rows)
+
+    refresh_athlete_rank_stats(athlete_id for _, athlete_id in participant_keys)
 
+    progress('commit')
+    bump_data_version()
     try:
         db.session.commit()
     except Exception:
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Серверное хранилище черновиков импорта XML (instance/import_staging/).
+
+Мастер импорта (загрузка → анализ → нормализация категорий → загрузка в БД)
+хранит здесь список загруженных файлов, сводки разбора, выбранные нормализации
+и исключённые категории. В cookie-сессии остаётся только непрозрачный import_id,
+поэтому размер сессии не зависит от числа файлов. Черновики старше
+IMPORT_STAGING_TTL секунд удаляются.
+"""
+
+import json
+import logging
+import os
+import re
+import secrets
+import time
+
+logger = logging.getLogger(__name__)
+
+# Ключ в Flask-сессии, под которым хранится import_id текущего черновика
+SESSION_KEY = 'import_id'
+DEFAULT_TTL_SECONDS = 24 * 3600
+_SUFFIX = '.json'
+_IMPORT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{16,64}$')
+
+
+def _staging_ttl() -> int:
+    try:
+        return int(os.environ.get('IMPORT_STAGING_TTL', DEFAULT_TTL_SECONDS))
+    except ValueError:
+        return DEFAULT_TTL_SECONDS
+
+
+def _default_staging_dir() -> str:
+    from flask import current_app
+
+    return os.path.join(current_app.instance_path, 'import_staging')
+
+
+def _entry_path(staging_dir: str, import_id: str) -> str | None:
+    if not import_id or not _IMPORT_ID_RE.match(import_id):
+        return None
+    return os.path.join(staging_dir, f'{import_id}{_SUFFIX}')
+
+
+def evict_expired(staging_dir: str | None = None, ttl: int | None = None) -> int:
+    """Удаляет черновики старше TTL. Возвращает количество удалённых файлов."""
+    staging_dir = staging_dir or _default_staging_dir()
+    ttl = _staging_ttl() if ttl is None else ttl
+    if not os.path.isdir(staging_dir):
+        return 0
+    now = time.time()
+    removed = 0
+    for name in os.listdir(staging_dir):
+        if not name.endswith(_SUFFIX):
+            continue
+        path = os.path.join(staging_dir, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def save_import(import_id: str, data: dict, staging_dir: str | None = None) -> None:
+    """Перезаписывает черновик (атомарно, через временный файл)."""
+    staging_dir = staging_dir or _default_staging_dir()
+    path = _entry_path(staging_dir, import_id)
+    if path is None:
+        raise ValueError(f'Некорректный import_id: {import_id!r}')
+    os.makedirs(staging_dir, exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, default=str)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def create_import(data: dict, staging_dir: str | None = None) -> str:
+    """Создаёт черновик и возвращает его import_id."""
+    staging_dir = staging_dir or _default_staging_dir()
+    evict_expired(staging_dir)
+    import_id = secrets.token_urlsafe(24)
+    save_import(import_id, data, staging_dir)
+    return import_id
+
+
+def load_import(import_id: str | None, staging_dir: str | None = None) -> dict | None:
+    """Данные черновика или None, если его нет, он истёк или повреждён."""
+    staging_dir = staging_dir or _default_staging_dir()
+    path = _entry_path(staging_dir, import_id)
+    if path is None:
+        return None
+    try:
+        if time.time() - os.path.getmtime(path) > _staging_ttl():
+            os.remove(path)
+            return None
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning('Повреждённый черновик импорта %s: %s', path, e)
+        return None
+
+
+def discard_import(import_id: str | None, staging_dir: str | None = None) -> None:
+    """Удаляет черновик (файлы XML не трогает)."""
+    staging_dir = staging_dir or _default_staging_dir()
+    path = _entry_path(staging_dir, import_id)
+    if path is None:
+        return
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning('Не удалось удалить черновик импорта %s: %s', path, e)
@@ -0,0 +1,60 @@
+"""Judge registry: batch lookup by (first_name, last_name, full_name_xml)."""
+
+from sqlalchemy import or_
+
+from models import db, Judge
+
+
+class JudgeRegistry:
+    """Registry for judges of one import, resolved with a single query."""
+
+    @staticmethod
+    def _make_key(first_name, last_name, full_name_xml):
+        # Пустые строки сохраняются как NULL, поэтому и сравниваются как NULL
+        return (first_name or None, last_name or None, full_name_xml or None)
+
+    def _fetch_candidates(self, keys):
+        """key -> judge (with the smallest id) for all judges sharing a last name with keys."""
+        last_names = {key[1] for key in keys if key[1]}
+        conditions = []
+        if last_names:
+            conditions.append(Judge.last_name.in_(last_names))
+        if any(key[1] is None for key in keys):
+            conditions.append(Judge.last_name.is_(None))
+        if not conditions:
+            return {}
+
+        found = {}
+        for judge in Judge.query.filter(or_(*conditions)).order_by(Judge.id):
+            key = self._make_key(judge.first_name, judge.last_name, judge.full_name_xml)
+            found.setdefault(key, judge)
+        return found
+
+    def resolve_many(self, judges_data):
+        """Returns {XML judge id: Judge.id}; missing judges are created with one flush."""
+        keys = [
+            self._make_key(j.get('first_name'), j.get('last_name'), j.get('full_name_xml'))
+            for j in judges_data
+        ]
+        by_key = self._fetch_candidates(set(keys))
+
+        resolved = []
+        for judge_data, key in zip(judges_data, keys):
+            judge = by_key.get(key)
+            if judge is None:
+                judge = Judge(
+                    first_name=judge_data.get('first_name') or None,
+                    last_name=judge_data.get('last_name') or None,
+                    full_name_xml=judge_data.get('full_name_xml') or None,
+                    short_name=judge_data.get('short_name') or None,
+                    gender=judge_data.get('gender') or None,
+                    country=judge_data.get('country') or None,
+                    city=judge_data.get('city') or None,
+                    qualification=judge_data.get('qualification') or None,
+                )
+                db.session.add(judge)
+                by_key[key] = judge
+            resolved.append((judge_data.get('id'), judge))
+
+        db.session.flush()
+        return {judge_id: judge.id for judge_id, judge in resolved}
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Кеш результатов разбора XML по хешу содержимого (instance/parse_cache/).
+
+Мастер импорта читает один и тот же файл несколько раз: /analyze-xml,
+/check-import-birth-conflicts и финальная загрузка. Результат разбора сохраняется
+один раз (pickle + gzip) и дальше только загружается. Файлы кеша пишет только само
+приложение; записи старше XML_PARSE_CACHE_TTL секунд удаляются.
+Отключить: XML_PARSE_CACHE=0 в окружении.
+
+Несколько файлов (parse_xml_files) разбираются параллельно в пуле процессов:
+разбор — чистый CPU (ElementTree + регулярные выражения normalize_string), а результат
+get_result() сериализуется pickle. Число процессов: XML_PARSE_WORKERS
+(по умолчанию — число CPU); 1 — разбор в текущем процессе.
+"""
+
+import gzip
+import hashlib
+import logging
+import multiprocessing
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from parsers.isu_calcfs_parser import ISUCalcFSParser
+
+logger = logging.getLogger(__name__)
+
+# Увеличить при изменении формата результата ISUCalcFSParser — старые записи станут промахами
+PARSE_CACHE_VERSION = 2
+DEFAULT_TTL_SECONDS = 6 * 3600
+_CACHE_SUFFIX = '.pkl.gz'
+
+
+def _cache_enabled() -> bool:
+    flag = (os.environ.get('XML_PARSE_CACHE') or '1').strip().lower()
+    return flag not in ('0', 'false', 'no', 'off')
+
+
+def _cache_ttl() -> int:
+    try:
+        return int(os.environ.get('XML_PARSE_CACHE_TTL', DEFAULT_TTL_SECONDS))
+    except ValueError:
+        return DEFAULT_TTL_SECONDS
+
+
+def _parse_workers() -> int:
+    try:
+        return max(1, int(os.environ.get('XML_PARSE_WORKERS', os.cpu_count() or 1)))
+    except ValueError:
+        return 1
+
+
+def _default_cache_dir() -> str:
+    from flask import current_app
+
+    return os.path.join(current_app.instance_path, 'parse_cache')
+
+
+def file_content_hash(filepath: str) -> str:
+    """sha256 содержимого файла (hex)."""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _entry_path(cache_dir: str, content_hash: str) -> str:
+    return os.path.join(cache_dir, f'v{PARSE_CACHE_VERSION}_{content_hash}{_CACHE_SUFFIX}')
+
+
+def evict_expired(cache_dir: str | None = None, ttl: int | None = None) -> int:
+    """Удаляет записи старше TTL. Возвращает количество удалённых файлов."""
+    cache_dir = cache_dir or _default_cache_dir()
+    ttl = _cache_ttl() if ttl is None else ttl
+    if not os.path.isdir(cache_dir):
+        return 0
+    now = time.time()
+    removed = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(_CACHE_SUFFIX):
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.remove(path)
+                removed += 1
+        except OSError:
+            continue
+    return removed
+
+
+def _load_entry(path: str, ttl: int):
+    try:
+        if time.time() - os.path.getmtime(path) > ttl:
+            os.remove(path)
+            return None
+        with gzip.open(path, 'rb') as f:
+            return pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning('Повреждённая запись кеша разбора %s: %s', path, e)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        return None
+
+
+def _store_entry(path: str, result) -> None:
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        with gzip.open(tmp_path, 'wb', compresslevel=5) as f:
+            pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning('Не удалось записать кеш разбора %s: %s', path, e)
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+
+def parse_xml_cached(filepath: str, cache_dir: str | None = None) -> ISUCalcFSParser:
+    """
+    Возвращает ISUCalcFSParser с результатом разбора filepath.
+    При попадании в кеш XML не разбирается; каждый вызов отдаёт независимую копию,
+    поэтому вызывающий код может менять parser.categories / parser.persons.
+    """
+    if not _cache_enabled():
+        parser = ISUCalcFSParser(filepath)
+        parser.parse(streaming=True)
+        return parser
+
+    cache_dir = cache_dir or _default_cache_dir()
+    ttl = _cache_ttl()
+    content_hash = file_content_hash(filepath)
+    path = _entry_path(cache_dir, content_hash)
+
+    result = _load_entry(path, ttl)
+    if result is not None:
+        logger.debug('Кеш разбора: попадание для %s', os.path.basename(filepath))
+        return ISUCalcFSParser.from_result(filepath, result)
+
+    parser = ISUCalcFSParser(filepath)
+    parser.parse(streaming=True)
+
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+    except OSError as e:
+        logger.warning('Каталог кеша разбора недоступен %s: %s', cache_dir, e)
+        return parser
+    evict_expired(cache_dir, ttl)
+    _store_entry(path, parser.get_result())
+    return parser
+
+
+def _parse_result(filepath: str) -> dict:
+    """Разбор в дочернем процессе: возвращает picklable результат парсера."""
+    parser = ISUCalcFSParser(filepath)
+    parser.parse(streaming=True)
+    return parser.get_result()
+
+
+def _parse_results_parallel(filepaths: list[str]) -> list[dict]:
+    workers = min(_parse_workers(), len(filepaths))
+    if workers > 1:
+        try:
+            # forkserver: дочерние процессы не наследуют потоки и блокировки воркера приложения
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method)) as pool:
+                return list(pool.map(_parse_result, filepaths))
+        except (OSError, RuntimeError) as e:
+            # BrokenProcessPool — подкласс RuntimeError; например, запрет fork в окружении
+            logger.warning('Параллельный разбор XML недоступен, разбираем последовательно: %s', e)
+    return [_parse_result(filepath) for filepath in filepaths]
+
+
+def parse_xml_files(filepaths: list[str], cache_dir: str | None = None) -> list[ISUCalcFSParser]:
+    """
+    Разбирает несколько файлов: попадания берутся из кеша, остальные разбираются
+    параллельно в пуле процессов. Парсеры возвращаются в порядке filepaths.
+    """
+    if not filepaths:
+        return []
+    use_cache = _cache_enabled()
+    cache_dir = cache_dir or (_default_cache_dir() if use_cache else None)
+    ttl = _cache_ttl()
+
+    results = [None] * len(filepaths)
+    entry_paths = [None] * len(filepaths)
+    misses = []
+    if use_cache:
+        for i, filepath in enumerate(filepaths):
+            entry_paths[i] = _entry_path(cache_dir, file_content_hash(filepath))
+            results[i] = _load_entry(entry_paths[i], ttl)
+            if results[i] is None:
+                misses.append(i)
+    else:
+        misses = list(range(len(filepaths)))
+
+    if misses:
+        parsed = _parse_results_parallel([filepaths[i] for i in misses])
+        cache_ready = False
+        if use_cache:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                evict_expired(cache_dir, ttl)
+                cache_ready = True
+            except OSError as e:
+                logger.warning('Каталог кеша разбора недоступен %s: %s', cache_dir, e)
+        for i, result in zip(misses, parsed):
+            if cache_ready:
+                _store_entry(entry_paths[i], result)
+            results[i] = result
+
+    return [ISUCalcFSParser.from_result(filepath, result) for filepath, result in zip(filepaths, results)]
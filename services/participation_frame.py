@@ -0,0 +1,249 @@
+"""Columnar in-memory snapshot of all participations for the analytics reports.
+
+One row per Participant joined to its Event (participants without an event are
+not reported anywhere). Columns are typed NumPy arrays; string dimensions
+(category rank, event rank) are integer codes into small label lists, athlete
+clubs are club ids and seasons are the July-based start year, with -1 meaning
+"no value". Event names and dates for per-row details (lists of tournaments in
+the athlete, school, first-timers and exceedance sheets) are in the side lookup
+`events`. The frame is built with a single column query (plus one over the small
+event table) and cached per services.data_version, so every Google Sheets builder
+of an export reads the same snapshot instead of scanning participations again.
+
+Primitives:
+- codes_where(codes, labels, predicate) — a per-label predicate applied to a code column;
+- relabel(codes, labels, fn) — new codes after mapping labels (strip, "Без разряда", ...);
+- group_index(*keys) — dense group numbers for combinations of integer keys;
+- group_count / distinct_count / count_distinct — rows / distinct values per group or overall;
+- first_occurrence(groups, order) — row with the smallest order in each group.
+"""
+
+import threading
+from array import array
+
+import numpy as np
+
+from extensions import db
+from models import Athlete, Category, Event, Participant
+from services.data_version import get_data_version
+
+FREE_PCT_PPNAME = 'БЕСП'
+NO_VALUE = -1
+LOAD_BATCH_SIZE = 5000
+
+
+def season_start_year(d):
+    """Год начала сезона (сезон с 1 июля по 30 июня) или -1 без даты."""
+    if d is None:
+        return NO_VALUE
+    return d.year if d.month >= 7 else d.year - 1
+
+
+def season_label(start_year):
+    """'2024/25' для сезона, начавшегося в 2024 году."""
+    return f"{start_year}/{str(start_year + 1)[-2:]}"
+
+
+class _Coder:
+    """Строка -> целочисленный код в порядке первого появления; None -> -1."""
+
+    def __init__(self):
+        self.codes = {}
+        self.labels = []
+
+    def __call__(self, value):
+        if value is None:
+            return NO_VALUE
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.labels)
+            self.labels.append(value)
+        return code
+
+
+class ParticipationFrame:
+    """Колонки участий для версии данных version (массивы одинаковой длины)."""
+
+    def __init__(self, version, rows, events=()):
+        self.version = version
+        # event_id -> (Event.name, Event.begin_date)
+        self.events = {event_id: (name, begin_date) for event_id, name, begin_date in events}
+        rank_coder = _Coder()
+        event_rank_coder = _Coder()
+
+        participant_id = array('q')
+        athlete_id = array('q')
+        event_id = array('q')
+        club_id = array('q')
+        rank_code = array('i')
+        event_rank_code = array('i')
+        event_date = array('i')
+        season = array('i')
+        flags = array('B')
+
+        for row in rows:
+            participant_id.append(row.participant_id)
+            athlete_id.append(row.athlete_id if row.athlete_id is not None else NO_VALUE)
+            event_id.append(row.event_id)
+            club_id.append(row.club_id if row.club_id is not None else NO_VALUE)
+            rank_code.append(rank_coder(row.normalized_name))
+            event_rank_code.append(event_rank_coder(row.event_rank))
+            event_date.append(row.begin_date.toordinal() if row.begin_date else 0)
+            season.append(season_start_year(row.begin_date))
+            flags.append(
+                (row.category_id is not None)
+                | (row.pct_ppname == FREE_PCT_PPNAME) << 1
+                | bool(row.event_excluded) << 2
+                | bool(row.participant_excluded) << 3
+            )
+
+        self.participant_id = np.frombuffer(participant_id, dtype=np.int64)
+        self.athlete_id = np.frombuffer(athlete_id, dtype=np.int64)
+        self.event_id = np.frombuffer(event_id, dtype=np.int64)
+        self.club_id = np.frombuffer(club_id, dtype=np.int64)
+        self.rank_code = np.frombuffer(rank_code, dtype=np.int32)
+        self.event_rank_code = np.frombuffer(event_rank_code, dtype=np.int32)
+        # date.toordinal(); 0 — турнир без даты
+        self.event_date = np.frombuffer(event_date, dtype=np.int32)
+        self.season = np.frombuffer(season, dtype=np.int32)
+        flags = np.frombuffer(flags, dtype=np.uint8)
+        self.has_category = (flags & 1).astype(bool)
+        self.is_besp = (flags & 2).astype(bool)
+        self.event_excluded = (flags & 4).astype(bool)
+        self.participant_excluded = (flags & 8).astype(bool)
+        # Подписи кодов: Category.normalized_name и Event.event_rank как в БД (без обрезки)
+        self.rank_labels = rank_coder.labels
+        self.event_rank_labels = event_rank_coder.labels
+
+    def __len__(self):
+        return len(self.participant_id)
+
+    def free_mask(self, respect_participant_flag=True):
+        """БЕСП, турнир и участие не исключены из отчётов.
+
+        respect_participant_flag=False — без учёта исключения отдельного участия
+        (так считают листы Google Sheets, передающие только флаг турнира).
+        """
+        mask = self.is_besp & ~self.event_excluded
+        if respect_participant_flag:
+            mask &= ~self.participant_excluded
+        return mask
+
+    def rank_allowed_mask(self, excluded_ranks):
+        """Есть категория и normalized_name пуст или не входит в excluded_ranks (фильтр «без МС и КМС»)."""
+        excluded = frozenset(excluded_ranks)
+        return self.has_category & ~codes_where(self.rank_code, self.rank_labels, lambda label: label in excluded)
+
+
+def codes_where(codes, labels, predicate):
+    """Булев массив predicate(label) для каждой строки; для кода -1 вызывается predicate(None)."""
+    # Значение для None кладётся последним: индекс -1 как раз попадает на него
+    lookup = np.array([bool(predicate(label)) for label in labels] + [bool(predicate(None))], dtype=bool)
+    return lookup[codes]
+
+
+def relabel(codes, labels, fn):
+    """Коды после отображения подписей fn(label) (fn(None) для -1); совпавшие подписи сливаются.
+
+    Возвращает (новые коды, новые подписи).
+    """
+    coder = _Coder()
+    lookup = np.array([coder(fn(label)) for label in labels] + [coder(fn(None))], dtype=np.int32)
+    return lookup[codes], coder.labels
+
+
+def group_index(*keys):
+    """Номера групп 0..n-1 для сочетаний целочисленных ключей.
+
+    Возвращает (groups, uniques): uniques[g] — значения ключей группы g
+    (одномерный массив для одного ключа, иначе по строке на группу).
+    """
+    if len(keys) == 1:
+        uniques, groups = np.unique(keys[0], return_inverse=True)
+    else:
+        uniques, groups = np.unique(np.column_stack(keys), axis=0, return_inverse=True)
+    return groups.reshape(-1), uniques
+
+
+def group_count(groups, n_groups, mask=None):
+    """Число строк в каждой группе (только строки mask, если задан)."""
+    if mask is not None:
+        groups = groups[mask]
+    return np.bincount(groups, minlength=n_groups)
+
+
+def distinct_count(groups, values, n_groups, mask=None):
+    """Число разных values в каждой группе (только строки mask, если задан)."""
+    if mask is not None:
+        groups = groups[mask]
+        values = values[mask]
+    if not len(groups):
+        return np.zeros(n_groups, dtype=np.int64)
+    _, value_codes = np.unique(values, return_inverse=True)
+    width = int(value_codes.max()) + 1
+    pairs = np.unique(groups.astype(np.int64) * width + value_codes.reshape(-1))
+    return np.bincount(pairs // width, minlength=n_groups)
+
+
+def count_distinct(values, mask=None):
+    """Число разных values (только строки mask, если задан)."""
+    if mask is not None:
+        values = values[mask]
+    return int(np.unique(values).size)
+
+
+def first_occurrence(groups, order):
+    """Для каждой встречающейся группы — индекс строки с наименьшим order (при равенстве — первой).
+
+    Возвращает (группы по возрастанию, индексы строк).
+    """
+    if not len(groups):
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty
+    rows = np.lexsort((order, groups))
+    sorted_groups = groups[rows]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    return sorted_groups[starts], rows[starts]
+
+
+def _load_events():
+    return db.session.query(Event.id, Event.name, Event.begin_date).all()
+
+
+def _load_rows():
+    return db.session.query(
+        Participant.id.label('participant_id'),
+        Participant.athlete_id,
+        Participant.event_id,
+        Participant.pct_ppname,
+        Participant.exclude_free_from_reports.label('participant_excluded'),
+        Category.id.label('category_id'),
+        Category.normalized_name,
+        Event.begin_date,
+        Event.event_rank,
+        Event.exclude_free_from_reports.label('event_excluded'),
+        Athlete.club_id,
+    ).join(
+        Event, Participant.event_id == Event.id
+    ).outerjoin(
+        Category, Participant.category_id == Category.id
+    ).outerjoin(
+        Athlete, Participant.athlete_id == Athlete.id
+    ).order_by(Participant.id).yield_per(LOAD_BATCH_SIZE)
+
+
+_frame = None
+_frame_lock = threading.Lock()
+
+
+def get_participation_frame():
+    """Снимок участий для текущей версии данных; перестраивается, если версия изменилась."""
+    global _frame
+    version = get_data_version()
+    frame = _frame
+    if frame is not None and frame.version == version:
+        return frame
+    with _frame_lock:
+        if _frame is None or _frame.version != version:
+            _frame = ParticipationFrame(version, _load_rows(), _load_events())
+        return _frame
@@ -4,131 +4,10 @@
 import base64
 
 from extensions import db
-from models import Athlete, Category, Participant, Event, Club
+from models import Athlete, AthleteRankStats, Category, Participant, Event, Club
+from utils.rank_names import RANK_DICTIONARY, normalize_category_name  # noqa: F401 (реэкспорт)
 
 
-def _athletes_by_id_bulk(athlete_ids):
-    """Один-два запроса вместо тысяч Athlete.query.get (ускоряет /best_results и разряды)."""
-    if not athlete_ids:
-        return {}
-    ids = list({int(x) for x in athlete_ids if x is not None})
-    out = {}
-    chunk_size = 900
-    for i in range(0, len(ids), chunk_size):
-        chunk = ids[i : i + chunk_size]
-        for a in Athlete.query.filter(Athlete.id.in_(chunk)).all():
-            out[a.id] = a
-    return out
-
-
-RANK_DICTIONARY = {
-    'мс': {
-        'name': 'МС',
-        'genders': {'F': 'МС, Женщины', 'M': 'МС, Мужчины'},
-        'keywords': ['мс', 'мастер спорта', 'мастер спорта россии']
-    },
-    'кмс': {
-        'name': 'КМС',
-        'genders': {'F': 'КМС, Девушки', 'M': 'КМС, Юноши'},
-        'keywords': ['кмс', 'кандидат в мастера спорта', 'кандидат в мастера спорта россии', 'кандидат в мастера', 'кандидат мастера спорта', 'кандидат в мастера спорта, юниоры', 'кандидат в мастера спорта, юниорки']
-    },
-    '1 спортивный': {
-        'name': '1 Спортивный',
-        'genders': {'F': '1 Спортивный, Девочки', 'M': '1 Спортивный, Мальчики'},
-        'keywords': ['1 спортивный', 'первый спортивный', '1 спорт', '1 спортивный разряд', 'первый спортивный разряд']
-    },
-    '2 спортивный': {
-        'name': '2 Спортивный',
-        'genders': {'F': '2 Спортивный, Девочки', 'M': '2 Спортивный, Мальчики'},
-        'keywords': ['2 спортивный', 'второй спортивный', '2 спорт', '2 спортивный разряд', 'второй спортивный разряд']
-    },
-    '3 спортивный': {
-        'name': '3 Спортивный',
-        'genders': {'F': '3 Спортивный, Девочки', 'M': '3 Спортивный, Мальчики'},
-        'keywords': ['3 спортивный', 'третий спортивный', '3 спорт', '3 спортивный разряд', 'третий спортивный разряд']
-    },
-    '1 юношеский': {
-        'name': '1 Юношеский',
-        'genders': {'F': '1 Юношеский, Девочки', 'M': '1 Юношеский, Мальчики'},
-        'keywords': ['1 юношеский', 'первый юношеский', '1 юн']
-    },
-    '2 юношеский': {
-        'name': '2 Юношеский',
-        'genders': {'F': '2 Юношеский, Девочки', 'M': '2 Юношеский, Мальчики'},
-        'keywords': ['2 юношеский', 'второй юношеский', '2 юн']
-    },
-    '3 юношеский': {
-        'name': '3 Юношеский',
-        'genders': {'F': '3 Юношеский, Девочки', 'M': '3 Юношеский, Мальчики'},
-        'keywords': ['3 юношеский', 'третий юношеский', '3 юн']
-    },
-    'юный фигурист': {
-        'name': 'Юный Фигурист',
-        'genders': {'F': 'Юный Фигурист, Девочки', 'M': 'Юный Фигурист, Мальчики'},
-        'keywords': ['юный фигурист', 'юный', 'юф']
-    },
-    'дебют': {
-        'name': 'Дебют',
-        'genders': {'F': 'Дебют, Девочки', 'M': 'Дебют, Мальчики'},
-        'keywords': ['дебют', 'дебютный']
-    },
-    'новичок': {
-        'name': 'Новичок',
-        'genders': {'F': 'Новичок, Девочки', 'M': 'Новичок, Мальчики'},
-        'keywords': ['новичок', 'начинающий']
-    },
-    'пары_1 спортивный': {
-        'name': '1 Спортивный, Пары',
-        'genders': {'F': '1 Спортивный, Пары', 'M': '1 Спортивный, Пары'},
-        'keywords': ['парное катание, 1 спортивный', 'пары, 1 спортивный', 'парное, 1 спортивный', 'парное катание, 1 спортивный разряд']
-    },
-    'пары_2 спортивный': {
-        'name': '2 Спортивный, Пары',
-        'genders': {'F': '2 Спортивный, Пары', 'M': '2 Спортивный, Пары'},
-        'keywords': ['парное катание, 2 спортивный', 'пары, 2 спортивный', 'парное, 2 спортивный']
-    },
-    'пары_3 спортивный': {
-        'name': '3 Спортивный, Пары',
-        'genders': {'F': '3 Спортивный, Пары', 'M': '3 Спортивный, Пары'},
-        'keywords': ['парное катание, 3 спортивный', 'пары, 3 спортивный', 'парное, 3 спортивный']
-    },
-    'пары_кмс': {
-        'name': 'КМС, Пары',
-        'genders': {'F': 'КМС, Пары', 'M': 'КМС, Пары'},
-        'keywords': ['парное катание, кандидат в мастера спорта', 'пары, кандидат в мастера спорта', 'парное, кандидат в мастера спорта', 'парное катание, кмс', 'пары, кмс', 'парное катание, кандидат в мастера спорта']
-    },
-    'пары_мс': {
-        'name': 'МС, Пары',
-        'genders': {'F': 'МС, Пары', 'M': 'МС, Пары'},
-        'keywords': ['парное катание, мастер спорта', 'пары, мастер спорта', 'парное, мастер спорта', 'парное катание, мс', 'пары, мс']
-    },
-    'танцы_1 спортивный': {
-        'name': '1 Спортивный, Танцы',
-        'genders': {'F': '1 Спортивный, Танцы', 'M': '1 Спортивный, Танцы'},
-        'keywords': ['танцы на льду, 1 спортивный', 'танцы, 1 спортивный', 'ледяные танцы, 1 спортивный', 'танцы на льду, 1 спортивный разряд']
-    },
-    'танцы_2 спортивный': {
-        'name': '2 Спортивный, Танцы',
-        'genders': {'F': '2 Спортивный, Танцы', 'M': '2 Спортивный, Танцы'},
-        'keywords': ['танцы на льду, 2 спортивный', 'танцы, 2 спортивный', 'ледяные танцы, 2 спортивный']
-    },
-    'танцы_3 спортивный': {
-        'name': '3 Спортивный, Танцы',
-        'genders': {'F': '3 Спортивный, Танцы', 'M': '3 Спортивный, Танцы'},
-        'keywords': ['танцы на льду, 3 спортивный', 'танцы, 3 спортивный', 'ледяные танцы, 3 спортивный']
-    },
-    'танцы_кмс': {
-        'name': 'КМС, Танцы',
-        'genders': {'F': 'КМС, Танцы', 'M': 'КМС, Танцы'},
-        'keywords': ['танцы на льду, кандидат в мастера спорта', 'танцы, кандидат в мастера спорта', 'ледяные танцы, кандидат в мастера спорта', 'танцы на льду, кмс', 'танцы, кмс', 'танцы на льду, кандидат в мастера спорта']
-    },
-    'танцы_мс': {
-        'name': 'МС, Танцы',
-        'genders': {'F': 'МС, Танцы', 'M': 'МС, Танцы'},
-        'keywords': ['танцы на льду, мастер спорта', 'танцы, мастер спорта', 'ледяные танцы, мастер спорта', 'танцы на льду, мс', 'танцы, мс']
-    }
-}
-
 GENDER_LABELS = {'F': 'Женский', 'M': 'Мужской', 'X': 'Смешанный', 'U': 'Не указан'}
 
 def analyze_categories_from_xml(parser):
@@ -146,36 +25,6 @@ def analyze_categories_from_xml(parser):
         })
     return categories_analysis
 
-def normalize_category_name(category_name, gender=None):
-    """Нормализует название категории для группировки по разрядам с учетом пола."""
-    if not category_name:
-        return "Неизвестно"
-    
-    # Импортируем функцию замены латинских букв на русские
-    from utils.normalizers import fix_latin_to_cyrillic
-    
-    # Сначала заменяем латинские буквы на русские (o->о, e->е, c->с, p->р, a->а и т.д.)
-    category_name = fix_latin_to_cyrillic(category_name)
-    
-    name_lower = category_name.lower()
-    name_lower = name_lower.replace('девочки', 'девочки')
-    name_lower = name_lower.replace('спортивный', 'спортивный')
-
-    for rank_data in RANK_DICTIONARY.values():
-        for keyword in rank_data['keywords']:
-            if keyword in name_lower:
-                if gender and gender.upper() in rank_data['genders']:
-                    return rank_data['genders'][gender.upper()]
-                return rank_data['name']
-
-    gender_suffix = ""
-    if gender:
-        if gender.upper() == 'F':
-            gender_suffix = ", Девочки"
-        elif gender.upper() == 'M':
-            gender_suffix = ", Мальчики"
-    return f"Другой{gender_suffix}"
-
 def get_rank_weight(rank_name):
     """Возвращает вес разряда для ранжирования (меньше = лучше)."""
     base_weights = {
@@ -232,49 +81,22 @@ def athlete_display_name(first_name, last_name, full_name_xml):
 def compute_rank_unique_participation_stats(excluded_normalized_ranks):
     """
     Уникальные спортсмены по разряду и доля с бесплатным участием.
-    Агрегация до пары (athlete_id, category_id), а не все строки participant.
+    Читает готовые строки athlete_rank_stats (одна строка на пару спортсмен+разряд).
     """
-    if excluded_normalized_ranks is None:
-        excl = ()
-    else:
-        excl = tuple(excluded_normalized_ranks)
-    free_cond = db.and_(
-        Participant.pct_ppname == 'БЕСП',
-        db.or_(Participant.exclude_free_from_reports.is_(False), Participant.exclude_free_from_reports.is_(None)),
-        db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None)),
-    )
+    excluded_set = frozenset(excluded_normalized_ranks or ())
     rows = db.session.query(
-        Participant.athlete_id,
-        Category.id.label('category_id'),
-        db.func.max(Category.normalized_name).label('normalized_name'),
-        db.func.max(Category.name).label('category_name'),
-        db.func.max(Category.gender).label('category_gender'),
-        db.func.max(db.case((free_cond, 1), else_=0)).label('has_free'),
-    ).select_from(Participant).join(
-        Category, Participant.category_id == Category.id
-    ).join(
-        Event, Participant.event_id == Event.id
-    ).filter(
-        db.or_(
-            Category.normalized_name.is_(None),
-            Category.normalized_name.notin_(excl),
-        )
-    ).group_by(
-        Participant.athlete_id,
-        Category.id,
-    ).all()
+        AthleteRankStats.athlete_id,
+        AthleteRankStats.rank,
+        AthleteRankStats.free_reported_participations,
+    ).join(Athlete, AthleteRankStats.athlete_id == Athlete.id)  # строки удалённых спортсменов не считаем
+    if excluded_set:
+        rows = rows.filter(AthleteRankStats.rank.notin_(excluded_set))
 
     rank_sets = {}
-    excluded_set = frozenset(excl) if excl else frozenset()
     for row in rows:
-        if not row.athlete_id:
-            continue
-        rank = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
-        if rank in excluded_set:
-            continue
-        bucket = rank_sets.setdefault(rank, {'all': set(), 'free': set()})
+        bucket = rank_sets.setdefault(row.rank, {'all': set(), 'free': set()})
         bucket['all'].add(row.athlete_id)
-        if row.has_free:
+        if row.free_reported_participations:
             bucket['free'].add(row.athlete_id)
 
     rank_unique_stats = []
@@ -293,12 +115,41 @@ def compute_rank_unique_participation_stats(excluded_normalized_ranks):
     return rank_unique_stats
 
 
-def build_rank_groups(event_id=None, only_free_participation=False, excluded_normalized_ranks=None):
-    rank_catalog = get_rank_catalog()
+def _rank_rows_from_stats(excluded_normalized_ranks):
+    """Строки build_rank_groups из athlete_rank_stats (все турниры, все участия)."""
+    query = db.session.query(
+        AthleteRankStats.athlete_id,
+        AthleteRankStats.rank.label('rank_name'),
+        AthleteRankStats.category_gender,
+        AthleteRankStats.participations,
+        AthleteRankStats.events_count,
+        AthleteRankStats.best_place,
+        AthleteRankStats.best_points,
+        AthleteRankStats.last_event_date,
+        AthleteRankStats.free_participations,
+        Athlete.full_name_xml,
+        Athlete.last_name,
+        Athlete.first_name,
+        Athlete.patronymic,
+    ).join(Athlete, AthleteRankStats.athlete_id == Athlete.id)
+    if excluded_normalized_ranks:
+        query = query.filter(AthleteRankStats.rank.notin_(list(excluded_normalized_ranks)))
+    return query.all()
+
+
+def _rank_rows_from_participants(event_id, only_free_participation, excluded_normalized_ranks):
+    """Строки build_rank_groups прямой агрегацией участий (фильтр по турниру или только БЕСП)."""
+    free_participation = db.case((
+        db.and_(
+            Participant.pct_ppname == 'БЕСП',
+            db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None))
+        ), 1
+    ), else_=0)
     participants_query = db.session.query(
         Athlete.id.label('athlete_id'),
         Athlete.first_name,
         Athlete.last_name,
+        Athlete.patronymic,
         Athlete.full_name_xml,
         Category.name.label('category_name'),
         Category.gender.label('category_gender'),
@@ -308,22 +159,7 @@ def build_rank_groups(event_id=None, only_free_participation=False, excluded_nor
         db.func.min(Participant.total_place).label('best_place'),
         db.func.max(Participant.total_points).label('best_points'),
         db.func.max(Event.begin_date).label('last_event_date'),
-        db.func.sum(
-            db.case((
-                db.and_(
-                    Participant.pct_ppname == 'БЕСП',
-                    db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None))
-                ), 1
-            ), else_=0)
-        ).label('free_participations'),
-        db.func.max(
-            db.case((
-                db.and_(
-                    Participant.pct_ppname == 'БЕСП',
-                    db.or_(Event.exclude_free_from_reports.is_(False), Event.exclude_free_from_reports.is_(None))
-                ), 1
-            ), else_=0)
-        ).label('has_free_participation')
+        db.func.sum(free_participation).label('free_participations'),
     ).join(Participant, Athlete.id == Participant.athlete_id).join(
         Category, Participant.category_id == Category.id
     ).join(Event, Category.event_id == Event.id)
@@ -343,36 +179,51 @@ def build_rank_groups(event_id=None, only_free_participation=False, excluded_nor
             )
         )
     participants_query = participants_query.group_by(
-        Athlete.id, Athlete.first_name, Athlete.last_name, Athlete.full_name_xml,
+        Athlete.id, Athlete.first_name, Athlete.last_name, Athlete.patronymic, Athlete.full_name_xml,
         Category.name, Category.gender, Category.normalized_name
     )
-    results = participants_query.all()
-    athletes_by_id = _athletes_by_id_bulk(row.athlete_id for row in results)
-    for row in results:
-        rank_name = row.normalized_name or normalize_category_name(row.category_name, row.category_gender)
-        gender_code = (row.category_gender or 'U').upper()
+    rows = []
+    for row in participants_query.all():
+        row = row._asdict()
+        row['rank_name'] = row['normalized_name'] or normalize_category_name(row['category_name'], row['category_gender'])
+        rows.append(row)
+    return rows
+
+
+def build_rank_groups(event_id=None, only_free_participation=False, excluded_normalized_ranks=None):
+    """Группы разрядов со спортсменами.
+
+    Без фильтра по турниру и БЕСП агрегаты берутся из athlete_rank_stats;
+    для одного турнира или только бесплатных участий считаются запросом по участиям.
+    """
+    rank_catalog = get_rank_catalog()
+    if event_id or only_free_participation:
+        rows = _rank_rows_from_participants(event_id, only_free_participation, excluded_normalized_ranks)
+    else:
+        rows = [row._asdict() for row in _rank_rows_from_stats(excluded_normalized_ranks)]
+    for row in rows:
+        rank_name = row['rank_name']
+        gender_code = (row['category_gender'] or 'U').upper()
         if rank_name not in rank_catalog:
             rank_catalog[rank_name] = _create_rank_entry(rank_name, gender_code, rank_name.split(',')[0].strip())
         rank_entry = rank_catalog[rank_name]
         best_points_value = 0
-        if row.best_points is not None:
+        if row['best_points'] is not None:
             try:
-                best_points_value = round(float(row.best_points), 2)
+                best_points_value = round(float(row['best_points']), 2)
             except (TypeError, ValueError):
                 best_points_value = 0
-        # Используем property full_name из модели для правильного отображения без дублирования
-        athlete_obj = athletes_by_id.get(row.athlete_id)
-        athlete_name = athlete_obj.full_name if athlete_obj else (row.full_name_xml or f"{row.last_name or ''} {row.first_name or ''}".strip())
+        free_participations = int(row['free_participations'] or 0)
         athlete_data = {
-            'id': row.athlete_id,
-            'name': athlete_name,
-            'participations': int(row.participations or 0),
-            'events_count': int(row.events_count or 0),
-            'best_place': int(row.best_place) if row.best_place is not None else None,
+            'id': row['athlete_id'],
+            'name': Athlete.compose_full_name(row['full_name_xml'], row['last_name'], row['first_name'], row['patronymic']),
+            'participations': int(row['participations'] or 0),
+            'events_count': int(row['events_count'] or 0),
+            'best_place': int(row['best_place']) if row['best_place'] is not None else None,
             'best_points': best_points_value if best_points_value else 0,
-            'last_event_date': row.last_event_date.isoformat() if row.last_event_date else None,
-            'free_participations': int(row.free_participations or 0),
-            'has_free_participation': bool(row.has_free_participation)
+            'last_event_date': row['last_event_date'].isoformat() if row['last_event_date'] else None,
+            'free_participations': free_participations,
+            'has_free_participation': free_participations > 0
         }
         rank_entry['athletes'].append(athlete_data)
         rank_entry['athlete_count'] += 1
@@ -397,60 +248,49 @@ def build_rank_groups(event_id=None, only_free_participation=False, excluded_nor
     return rank_groups
 
 def build_best_results(rank_name=None):
+    """Лучший результат каждого спортсмена в разряде — из athlete_rank_stats (best_result_*)."""
     rank_catalog = get_rank_catalog()
     best_results_query = db.session.query(
-        Athlete.id.label('athlete_id'),
+        AthleteRankStats.athlete_id,
+        AthleteRankStats.rank.label('rank_name'),
+        AthleteRankStats.category_gender,
+        AthleteRankStats.best_result_place.label('place'),
+        AthleteRankStats.best_result_points.label('points'),
         Athlete.first_name,
         Athlete.last_name,
+        Athlete.patronymic,
         Athlete.full_name_xml,
-        Category.normalized_name.label('rank_name'),
-        Category.gender.label('category_gender'),
-        Participant.total_place.label('place'),
-        Participant.total_points.label('points'),
         Event.id.label('event_id'),
         Event.name.label('event_name'),
         Event.begin_date.label('event_date'),
         Event.place.label('event_place'),
         Club.id.label('club_id'),
         Club.name.label('club_name')
-    ).join(Participant, Athlete.id == Participant.athlete_id).join(
-        Category, Participant.category_id == Category.id
     ).join(
-        Event, Category.event_id == Event.id
+        Athlete, AthleteRankStats.athlete_id == Athlete.id
+    ).join(
+        Event, AthleteRankStats.best_result_event_id == Event.id
     ).outerjoin(
         Club, Athlete.club_id == Club.id
-    ).filter(Category.normalized_name.isnot(None), Participant.total_place.isnot(None))
+    )
     if rank_name:
-        best_results_query = best_results_query.filter(Category.normalized_name == rank_name)
+        best_results_query = best_results_query.filter(AthleteRankStats.rank == rank_name)
     results = best_results_query.all()
     athlete_ids = {row.athlete_id for row in results}
-    athletes_by_id = _athletes_by_id_bulk(athlete_ids)
     participations_counts = {}
     if athlete_ids:
         counts = db.session.query(
-            Participant.athlete_id,
-            db.func.count(Participant.id).label('cnt')
+            AthleteRankStats.athlete_id,
+            db.func.sum(AthleteRankStats.participations).label('cnt')
         ).filter(
-            Participant.athlete_id.in_(athlete_ids)
-        ).group_by(Participant.athlete_id).all()
-        participations_counts = {row.athlete_id: row.cnt for row in counts}
-    rank_athletes = {}
+            AthleteRankStats.athlete_id.in_(athlete_ids)
+        ).group_by(AthleteRankStats.athlete_id).all()
+        participations_counts = {row.athlete_id: int(row.cnt or 0) for row in counts}
     for row in results:
-        rank_name_val = row.rank_name or normalize_category_name('', row.category_gender)
+        rank_name_val = row.rank_name
         gender_code = (row.category_gender or 'U').upper()
         if rank_name_val not in rank_catalog:
             rank_catalog[rank_name_val] = _create_rank_entry(rank_name_val, gender_code, rank_name_val.split(',')[0].strip())
-        key = (rank_name_val, row.athlete_id)
-        points_value = 0
-        if row.points is not None:
-            try:
-                points_float = float(row.points)
-                points_value = round(points_float, 2)
-            except (TypeError, ValueError):
-                points_value = 0
-        # Используем property full_name из модели для правильного отображения без дублирования
-        athlete_obj = athletes_by_id.get(row.athlete_id)
-        athlete_name = athlete_obj.full_name if athlete_obj else (row.full_name_xml or f"{row.last_name or ''} {row.first_name or ''}".strip())
         event_date_iso = None
         event_date_display = 'Дата не указана'
         if row.event_date:
@@ -458,9 +298,9 @@ def build_best_results(rank_name=None):
             event_date_display = row.event_date.strftime('%d.%m.%Y')
         athlete_result = {
             'id': row.athlete_id,
-            'name': athlete_name,
+            'name': Athlete.compose_full_name(row.full_name_xml, row.last_name, row.first_name, row.patronymic),
             'best_place': row.place,
-            'best_points': points_value,
+            'best_points': row.points or 0,
             'event_id': row.event_id,
             'event_name': row.event_name,
             'event_date_iso': event_date_iso,
@@ -470,9 +310,6 @@ def build_best_results(rank_name=None):
             'club_name': row.club_name or 'Не указан',
             'participations_count': participations_counts.get(row.athlete_id, 0)
         }
-        if key not in rank_athletes or athlete_result['best_points'] > rank_athletes[key]['best_points']:
-            rank_athletes[key] = athlete_result
-    for (rank_name_val, _), athlete_result in rank_athletes.items():
         rank_entry = rank_catalog[rank_name_val]
         rank_entry['athletes'].append(athlete_result)
         rank_entry['athlete_count'] += 1
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Кеш тяжёлых аналитических ответов с ключом (endpoint, аргументы, data_version).
+
+/categories, /best_results, /school-segment-event-ranks и /api/analytics/* —
+чистые функции содержимого БД, а оно меняется только при импорте и правках
+администратора. Все эти пути увеличивают data_version (services/data_version.py),
+поэтому новая версия даёт новые ключи, а старые записи просто вытесняются.
+
+Хранилище:
+- Redis, если задан REDIS_URL (общий для всех воркеров Gunicorn). Ключи с TTL,
+  число записей ограничено RESPONSE_CACHE_MAX_ENTRIES: последнее обращение
+  хранится в отсортированном множестве, самые старые записи удаляются (LRU).
+- Иначе каталог instance/response_cache/ (pickle + gzip). Суммарный размер
+  ограничен RESPONSE_CACHE_MAX_BYTES, первыми удаляются файлы с самым старым
+  временем обращения (mtime обновляется при чтении).
+Записи старше RESPONSE_CACHE_TTL секунд не используются. Отключить: RESPONSE_CACHE=0.
+Ошибки кеша не ломают ответ — значение просто считается заново.
+"""
+
+import functools
+import gzip
+import hashlib
+import json
+import logging
+import os
+import pickle
+import threading
+import time
+
+from flask import Response, request
+
+from services.data_version import get_data_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 5000
+_CACHE_SUFFIX = '.pkl.gz'
+_REDIS_PREFIX = 'response_cache:'
+_REDIS_LRU_KEY = _REDIS_PREFIX + 'lru'
+
+
+def _cache_enabled() -> bool:
+    flag = (os.environ.get('RESPONSE_CACHE') or '1').strip().lower()
+    return flag not in ('0', 'false', 'no', 'off')
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _default_cache_dir() -> str:
+    from flask import current_app
+
+    return os.path.join(current_app.instance_path, 'response_cache')
+
+
+class DiskCacheBackend:
+    """Файлы <ключ>.pkl.gz в каталоге; LRU-вытеснение по mtime при превышении размера."""
+
+    def __init__(self, cache_dir, ttl, max_bytes):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}{_CACHE_SUFFIX}')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with gzip.open(path, 'rb') as f:
+                value = pickle.load(f)
+            os.utime(path)  # отметка обращения для LRU
+            return value
+        except FileNotFoundError:
+            return None
+
+    def set(self, key, value):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with gzip.open(tmp_path, 'wb', compresslevel=1) as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(_CACHE_SUFFIX):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        if total <= self.max_bytes:
+            return
+        entries.sort()
+        for _, size, path in entries:
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+class RedisCacheBackend:
+    """Ключи response_cache:<ключ> с TTL; LRU по отсортированному множеству времени обращений."""
+
+    def __init__(self, client, ttl, max_entries):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key):
+        raw = self.client.get(_REDIS_PREFIX + key)
+        if raw is None:
+            return None
+        self.client.zadd(_REDIS_LRU_KEY, {key: time.time()})
+        return pickle.loads(raw)
+
+    def set(self, key, value):
+        pipe = self.client.pipeline()
+        pipe.set(_REDIS_PREFIX + key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), ex=self.ttl)
+        pipe.zadd(_REDIS_LRU_KEY, {key: time.time()})
+        pipe.zcard(_REDIS_LRU_KEY)
+        count = pipe.execute()[-1]
+        excess = count - self.max_entries
+        if excess > 0:
+            stale = [member for member, _ in self.client.zpopmin(_REDIS_LRU_KEY, excess)]
+            if stale:
+                self.client.delete(*(_REDIS_PREFIX + (m.decode() if isinstance(m, bytes) else m) for m in stale))
+
+
+_redis_backend = None
+_redis_lock = threading.Lock()
+
+
+def _get_backend():
+    global _redis_backend
+    ttl = _env_int('RESPONSE_CACHE_TTL', DEFAULT_TTL_SECONDS)
+    redis_url = os.environ.get('REDIS_URL')
+    if redis_url:
+        with _redis_lock:
+            if _redis_backend is None:
+                import redis
+
+                _redis_backend = RedisCacheBackend(
+                    redis.Redis.from_url(redis_url),
+                    ttl,
+                    _env_int('RESPONSE_CACHE_MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                )
+            return _redis_backend
+    return DiskCacheBackend(_default_cache_dir(), ttl, _env_int('RESPONSE_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def _make_key(namespace, params, version):
+    payload = json.dumps([namespace, params, version], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_or_compute(namespace, params, compute):
+    """Значение compute() из кеша по (namespace, params, data_version) или вычисленное заново.
+
+    params — JSON-сериализуемые аргументы, от которых зависит результат.
+    None не кешируется.
+    """
+    if not _cache_enabled():
+        return compute()
+    try:
+        backend = _get_backend()
+        key = _make_key(namespace, params, get_data_version())
+        cached = backend.get(key)
+        if cached is not None:
+            return cached
+    except Exception as e:
+        logger.warning('Кеш ответов недоступен (%s): %s', namespace, e)
+        return compute()
+
+    value = compute()
+    if value is None:
+        return value
+    try:
+        backend.set(key, value)
+    except Exception as e:
+        logger.warning('Не удалось сохранить в кеш ответов (%s): %s', namespace, e)
+    return value
+
+
+def cached_json_view(view=None, *, key_params=None):
+    """Декоратор JSON-эндпоинта: кешируется тело успешного (200) ответа для (endpoint, query string).
+
+    key_params — необязательная функция без аргументов, возвращающая дополнительные
+    части ключа: то, от чего ответ зависит помимо аргументов запроса (например,
+    сезон, в который разрешается season=current на текущую дату).
+    Использование: @cached_json_view или @cached_json_view(key_params=...).
+    """
+    if view is None:
+        return functools.partial(cached_json_view, key_params=key_params)
+
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        params = {
+            'view_args': kwargs,
+            'args': sorted(request.args.items(multi=True)),
+        }
+        if key_params is not None:
+            params['extra'] = key_params()
+        computed = []
+
+        def compute():
+            response = view(*args, **kwargs)
+            computed.append(response)
+            if isinstance(response, Response) and response.status_code == 200 and response.is_json:
+                return response.get_data()
+            return None
+
+        body = get_or_compute(request.endpoint, params, compute)
+        if computed:
+            return computed[0]
+        return Response(body, mimetype='application/json')
+
+    return wrapper
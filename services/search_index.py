@@ -0,0 +1,210 @@
+"""SQLite FTS5 (trigram) search index for athletes, coaches, clubs and events.
+
+Each indexed model has a stored, indexed `search_key` column: search_key() of the
+searchable fields (case-folded, Latin lookalikes replaced by Cyrillic, whitespace
+collapsed). It also has a shadow FTS5 table whose rowid is the model id and whose
+single column `body` holds the same key. The query goes through the same
+normalization, so matching is case-insensitive and lookalike-insensitive.
+
+Both are kept in sync by session hooks (see init_search_index): before_flush fills
+search_key, after_flush writes it to the FTS table in the same transaction. This
+covers ORM inserts, updates and deletes, including the import pipeline.
+backfill_search_keys() and rebuild_search_index() repopulate them from scratch
+(scripts/rebuild_search_index.py; migrations keep their own frozen copy).
+When the FTS tables are missing or the database is not SQLite, build_search_filter()
+falls back to LIKE on the search_key column.
+"""
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from extensions import db
+from models import Athlete, Coach, Club, Event
+from utils.search_utils import search_key
+
+# Пачка строк для INSERT/DELETE в FTS-таблицы (ниже лимита параметров SQLite)
+SYNC_CHUNK_SIZE = 500
+
+# Триграммы: слова короче трёх символов MATCH не находит, для них используется LIKE
+TRIGRAM_MIN_LENGTH = 3
+SEARCH_MIN_WORD_LENGTH = 2
+
+
+class SearchIndexSpec:
+    """FTS table for one model: source table name and the fields that go into body."""
+
+    def __init__(self, model, fts_table, fields):
+        self.model = model
+        self.fts_table = fts_table
+        self.fields = fields
+        self.table = sa.table(fts_table, sa.column('rowid', sa.Integer), sa.column('body', sa.Text))
+
+    def body(self, values):
+        return search_key(' '.join(str(value) for value in values if value))
+
+    def body_for(self, obj):
+        return self.body(getattr(obj, field) for field in self.fields)
+
+
+SEARCH_INDEXES = (
+    SearchIndexSpec(Athlete, 'athlete_fts', ('full_name_xml', 'last_name', 'first_name', 'patronymic')),
+    SearchIndexSpec(Coach, 'coach_fts', ('name',)),
+    SearchIndexSpec(Club, 'club_fts', ('name', 'short_name', 'city')),
+    SearchIndexSpec(Event, 'event_fts', ('name', 'long_name', 'place', 'venue')),
+)
+_SPEC_BY_MODEL = {spec.model: spec for spec in SEARCH_INDEXES}
+
+# url движка -> есть ли FTS-таблицы (проверяется один раз на процесс)
+_available_by_url = {}
+
+
+def create_search_tables(connection):
+    """CREATE VIRTUAL TABLE ... USING fts5 для всех индексов (нужен SQLite >= 3.34)."""
+    for spec in SEARCH_INDEXES:
+        connection.exec_driver_sql(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {spec.fts_table} USING fts5(body, tokenize='trigram')"
+        )
+
+
+def drop_search_tables(connection):
+    for spec in SEARCH_INDEXES:
+        connection.exec_driver_sql(f"DROP TABLE IF EXISTS {spec.fts_table}")
+
+
+def search_index_available(connection):
+    """True, если база SQLite и все FTS-таблицы созданы."""
+    if connection.dialect.name != 'sqlite':
+        return False
+    url = str(connection.engine.url)
+    if url not in _available_by_url:
+        existing = set(sa.inspect(connection).get_table_names())
+        _available_by_url[url] = all(spec.fts_table in existing for spec in SEARCH_INDEXES)
+    return _available_by_url[url]
+
+
+def _delete_rows(connection, spec, ids):
+    ids = list(ids)
+    for start in range(0, len(ids), SYNC_CHUNK_SIZE):
+        chunk = ids[start:start + SYNC_CHUNK_SIZE]
+        connection.execute(spec.table.delete().where(spec.table.c.rowid.in_(chunk)))
+
+
+def _write_rows(connection, spec, rows):
+    """rows: список {'rowid': id, 'body': текст}; старые строки с теми же rowid заменяются."""
+    _delete_rows(connection, spec, [row['rowid'] for row in rows])
+    for start in range(0, len(rows), SYNC_CHUNK_SIZE):
+        connection.execute(spec.table.insert(), rows[start:start + SYNC_CHUNK_SIZE])
+
+
+def backfill_search_keys(connection):
+    """Пересчитывает колонку search_key у всех индексируемых моделей. Возвращает число изменённых строк."""
+    changed = 0
+    for spec in SEARCH_INDEXES:
+        source = spec.model.__table__
+        columns = [source.c[field] for field in spec.fields]
+        updates = []
+        for row in connection.execute(sa.select(source.c.id, source.c.search_key, *columns)):
+            key = spec.body(row[2:])
+            if key != row[1]:
+                updates.append({'row_id': row[0], 'key': key})
+        statement = (
+            source.update()
+            .where(source.c.id == sa.bindparam('row_id'))
+            .values(search_key=sa.bindparam('key'))
+        )
+        for start in range(0, len(updates), SYNC_CHUNK_SIZE):
+            connection.execute(statement, updates[start:start + SYNC_CHUNK_SIZE])
+        changed += len(updates)
+    return changed
+
+
+def rebuild_search_index(connection):
+    """Полностью перестраивает все FTS-таблицы по текущим данным. Возвращает число строк."""
+    total = 0
+    for spec in SEARCH_INDEXES:
+        source = spec.model.__table__
+        columns = [source.c[field] for field in spec.fields]
+        connection.execute(spec.table.delete())
+        rows = [
+            {'rowid': row[0], 'body': spec.body(row[1:])}
+            for row in connection.execute(sa.select(source.c.id, *columns))
+        ]
+        for start in range(0, len(rows), SYNC_CHUNK_SIZE):
+            connection.execute(spec.table.insert(), rows[start:start + SYNC_CHUNK_SIZE])
+        total += len(rows)
+    return total
+
+
+def _fill_search_keys(session, flush_context, instances):
+    """Пересчитывает search_key у новых и изменённых объектов перед записью."""
+    for obj in session.new | session.dirty:
+        spec = _SPEC_BY_MODEL.get(type(obj))
+        if spec is not None:
+            key = spec.body_for(obj)
+            if obj.search_key != key:
+                obj.search_key = key
+
+
+def _sync_after_flush(session, flush_context):
+    """Переносит изменения индексируемых моделей этого flush в FTS-таблицы."""
+    upserts = {}
+    deletes = {}
+    for obj in session.new | session.dirty:
+        spec = _SPEC_BY_MODEL.get(type(obj))
+        if spec is not None and obj.id is not None:
+            upserts.setdefault(spec, {})[obj.id] = obj.search_key or ''
+    for obj in session.deleted:
+        spec = _SPEC_BY_MODEL.get(type(obj))
+        if spec is not None and obj.id is not None:
+            deletes.setdefault(spec, set()).add(obj.id)
+    if not upserts and not deletes:
+        return
+
+    connection = session.connection()
+    if not search_index_available(connection):
+        return
+    for spec, ids in deletes.items():
+        _delete_rows(connection, spec, ids)
+    for spec, bodies in upserts.items():
+        _write_rows(connection, spec, [{'rowid': obj_id, 'body': body} for obj_id, body in bodies.items()])
+
+
+def init_search_index():
+    """Подключает заполнение search_key и синхронизацию FTS к сессии приложения."""
+    if not event.contains(db.session, 'before_flush', _fill_search_keys):
+        event.listen(db.session, 'before_flush', _fill_search_keys)
+    if not event.contains(db.session, 'after_flush', _sync_after_flush):
+        event.listen(db.session, 'after_flush', _sync_after_flush)
+
+
+def _escape_like(word):
+    return word.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def build_search_filter(model, search_term, min_word_length=SEARCH_MIN_WORD_LENGTH):
+    """Фильтр `model.id IN (поиск по FTS)` — все слова запроса должны встретиться в ключе.
+
+    Слова от 3 символов ищутся через MATCH по триграммам, более короткие — через LIKE
+    по той же FTS-таблице. Слова короче min_word_length игнорируются: /api/* исторически
+    отбрасывают односимвольные слова, а /events передаёт 1 и требует все слова.
+    Без FTS-таблиц — LIKE по колонке search_key (регистр уже свёрнут при записи).
+    Возвращает None, если искать нечего.
+    """
+    spec = _SPEC_BY_MODEL[model]
+    words = [w for w in search_key(search_term or '').split() if len(w) >= min_word_length]
+    if not words:
+        return None
+
+    if not search_index_available(db.session.connection()):
+        return sa.and_(*(model.search_key.contains(word, autoescape=True) for word in words))
+
+    conditions = []
+    match_words = [w for w in words if len(w) >= TRIGRAM_MIN_LENGTH]
+    if match_words:
+        match_query = ' AND '.join('"%s"' % w.replace('"', '""') for w in match_words)
+        conditions.append(spec.table.c.body.op('MATCH')(match_query))
+    for word in words:
+        if len(word) < TRIGRAM_MIN_LENGTH:
+            conditions.append(spec.table.c.body.like(f'%{_escape_like(word)}%', escape='\\'))
+
+    return model.id.in_(sa.select(spec.table.c.rowid).where(*conditions))
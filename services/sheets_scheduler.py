@@ -0,0 +1,354 @@
+"""Coalescing, quota-paced sender for Google Sheets writes.
+
+SheetsSync used to replay a changed sheet call by call: every format(),
+update_acell(), freeze() and batch_update() was its own HTTP round trip, paced
+by fixed sleeps. SheetsScheduler queues the same gspread-style calls per sheet
+(SheetQueue mirrors the Worksheet methods used by the export) and turns them
+into raw API requests:
+- values (update, update_acell) -> entries of values:batchUpdate, grouped by
+  valueInputOption (update — RAW, update_acell — USER_ENTERED, as in gspread);
+- formats, merges, widths, freeze, clear, title -> requests of
+  spreadsheets:batchUpdate.
+Order within a sheet is kept by phases: structure requests, then value writes.
+A request that may touch values (clear, merge, rename) queued after value
+writes opens the next phase; formats, widths and freeze do not depend on
+values and join the current one. Phase k of all sheets goes out as one
+spreadsheets:batchUpdate plus one values:batchUpdate per input option, so a
+typical export is 3-4 API calls instead of hundreds.
+
+Every call takes a token from a TokenBucket sized to the Sheets write quota
+(SHEETS_WRITES_PER_MINUTE, 60 per minute per user by default) instead of fixed
+sleeps. A failed structure batch is atomic on the API side, so it is resent in
+halves until the failing requests are isolated; those are only logged (a bad
+merge must not stop the export). Failed value writes raise.
+
+The transport is anything with batch_update(body) and values_batch_update(body):
+a gspread Spreadsheet in production, HttpTransport for a plain HTTP endpoint
+(scripts/fake_sheets_server.py runs a local fake one).
+"""
+
+import json
+import logging
+import os
+import re
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WRITES_PER_MINUTE = 60
+# Запас запросов, которые можно отправить сразу, не дожидаясь пополнения
+DEFAULT_BURST = 5
+# Ограничения размера одного вызова (тело запроса Sheets API лучше держать в пределах нескольких МБ)
+MAX_REQUESTS_PER_BATCH = 500
+MAX_CELLS_PER_BATCH = 100000
+
+_A1_PART_RE = re.compile(r'^([A-Z]*)(\d*)$')
+# Запросы, не трогающие значения ячеек: их можно отправить раньше уже поставленных в очередь значений
+_VALUE_NEUTRAL_REQUESTS = {
+    'updateDimensionProperties',
+    'autoResizeDimensions',
+    'updateBorders',
+    'addConditionalFormatRule',
+    'updateConditionalFormatRule',
+    'deleteConditionalFormatRule',
+}
+
+
+def _writes_per_minute():
+    try:
+        return max(1, int(os.environ.get('SHEETS_WRITES_PER_MINUTE', DEFAULT_WRITES_PER_MINUTE)))
+    except ValueError:
+        return DEFAULT_WRITES_PER_MINUTE
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index
+
+
+def a1_to_grid_range(a1, sheet_id):
+    """'A1:C3', 'G5', 'A:Z', '2:2' -> GridRange (индексы с 0, конец не включается)."""
+    start, _, end = a1.split('!')[-1].upper().partition(':')
+    end = end or start
+    start_match = _A1_PART_RE.match(start)
+    end_match = _A1_PART_RE.match(end)
+    if not start_match or not end_match or not (start or end):
+        raise ValueError(f'Не удалось разобрать диапазон {a1!r}')
+    grid = {'sheetId': sheet_id}
+    start_col, start_row = start_match.groups()
+    end_col, end_row = end_match.groups()
+    if start_col:
+        grid['startColumnIndex'] = _column_index(start_col) - 1
+    if end_col:
+        grid['endColumnIndex'] = _column_index(end_col)
+    if start_row:
+        grid['startRowIndex'] = int(start_row) - 1
+    if end_row:
+        grid['endRowIndex'] = int(end_row)
+    return grid
+
+
+def _repeat_cell(sheet_id, a1, cell_format):
+    return {
+        'repeatCell': {
+            'range': a1_to_grid_range(a1, sheet_id),
+            'cell': {'userEnteredFormat': cell_format},
+            'fields': 'userEnteredFormat(' + ','.join(cell_format.keys()) + ')',
+        }
+    }
+
+
+def _is_value_neutral(request):
+    kind = next(iter(request), None)
+    if kind == 'repeatCell':
+        return 'userEnteredValue' not in request[kind].get('fields', '')
+    if kind == 'updateSheetProperties':
+        # Переименование нельзя: диапазоны значений ссылаются на лист по названию
+        return 'title' not in request[kind].get('fields', '')
+    return kind in _VALUE_NEUTRAL_REQUESTS
+
+
+def update_args(args, kwargs):
+    """Аргументы Worksheet.update -> (range_name, values, valueInputOption).
+
+    gspread принимает и update(range, values), и update(values, range_name).
+    """
+    range_name = kwargs.get('range_name')
+    values = kwargs.get('values')
+    positional = list(args)
+    if positional and isinstance(positional[0], str):
+        range_name = range_name or positional.pop(0)
+    if positional and values is None:
+        values = positional.pop(0)
+    if positional and range_name is None:
+        range_name = positional.pop(0)
+    option = kwargs.get('value_input_option')
+    if option is None:
+        option = 'RAW' if kwargs.get('raw', True) else 'USER_ENTERED'
+    return range_name or 'A1', values, str(getattr(option, 'value', option))
+
+
+def _cell_count(entry):
+    return sum(len(row) for row in entry.get('values') or []) or 1
+
+
+class TokenBucket:
+    """rate_per_minute токенов в минуту, не больше capacity в запасе; acquire() ждёт, пока токен появится."""
+
+    def __init__(self, rate_per_minute, capacity=DEFAULT_BURST, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1):
+        """Забирает токены; возвращает, сколько секунд пришлось ждать."""
+        waited = 0.0
+        self._refill()
+        while self.tokens < tokens:
+            delay = (tokens - self.tokens) / self.rate
+            self._sleep(delay)
+            waited += delay
+            self._refill()
+        self.tokens -= tokens
+        return waited
+
+
+class HttpTransport:
+    """Sheets API v4 по HTTP: base_url — 'https://sheets.googleapis.com' или адрес локального фейкового сервера.
+
+    session — объект с post(url, json=...) (например, google.auth AuthorizedSession);
+    без него запросы идут через urllib без авторизации.
+    """
+
+    def __init__(self, base_url, spreadsheet_id, session=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.spreadsheet_id = spreadsheet_id
+        self.session = session
+        self.timeout = timeout
+
+    def _post(self, path, body):
+        url = f'{self.base_url}/v4/spreadsheets/{self.spreadsheet_id}{path}'
+        if self.session is not None:
+            response = self.session.post(url, json=body, timeout=self.timeout)
+            response.raise_for_status()
+            return response.json()
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+            method='POST',
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode('utf-8') or '{}')
+
+    def batch_update(self, body):
+        return self._post(':batchUpdate', body)
+
+    def values_batch_update(self, body):
+        return self._post('/values:batchUpdate', body)
+
+
+class SheetQueue:
+    """Очередь одного листа с методами записи gspread.Worksheet (и batch_update таблицы)."""
+
+    def __init__(self, sheet_id, title):
+        self.sheet_id = sheet_id
+        self.title = title
+        # [(structure_requests, {valueInputOption: [ValueRange, ...]}), ...] — фазы по порядку
+        self.phases = []
+
+    def _phase(self, new_after_values):
+        if not self.phases or (new_after_values and self.phases[-1][1]):
+            self.phases.append(([], {}))
+        return self.phases[-1]
+
+    def add_requests(self, requests):
+        for request in requests:
+            # Оформление и размеры не зависят от значений и уходят в текущую фазу;
+            # очистка, объединения и т. п. после записанных значений открывают новую
+            self._phase(not _is_value_neutral(request))[0].append(request)
+
+    def add_values(self, range_name, values, value_input_option='RAW'):
+        if '!' not in range_name:
+            quoted = "'" + self.title.replace("'", "''") + "'"
+            range_name = f'{quoted}!{range_name}'
+        self._phase(False)[1].setdefault(value_input_option, []).append({'range': range_name, 'values': values})
+
+    # Методы gspread.Worksheet
+
+    def update(self, *args, **kwargs):
+        range_name, values, option = update_args(args, kwargs)
+        self.add_values(range_name, values or [], option)
+
+    def update_acell(self, label, value):
+        self.add_values(label, [[value]], 'USER_ENTERED')
+
+    def format(self, ranges, cell_format):
+        if isinstance(ranges, str):
+            ranges = [ranges]
+        self.add_requests([_repeat_cell(self.sheet_id, a1, cell_format) for a1 in ranges])
+
+    def batch_format(self, formats):
+        self.add_requests([_repeat_cell(self.sheet_id, item['range'], item['format']) for item in formats])
+
+    def freeze(self, rows=None, cols=None):
+        grid, fields = {}, []
+        if rows is not None:
+            grid['frozenRowCount'] = rows
+            fields.append('gridProperties.frozenRowCount')
+        if cols is not None:
+            grid['frozenColumnCount'] = cols
+            fields.append('gridProperties.frozenColumnCount')
+        if not fields:
+            raise TypeError('freeze: нужно указать rows или cols')
+        self.add_requests([{
+            'updateSheetProperties': {
+                'properties': {'sheetId': self.sheet_id, 'gridProperties': grid},
+                'fields': ','.join(fields),
+            }
+        }])
+
+    def clear(self):
+        # Как Worksheet.clear(): только значения, оформление остаётся
+        self.add_requests([{'updateCells': {'range': {'sheetId': self.sheet_id}, 'fields': 'userEnteredValue'}}])
+
+    def update_title(self, title):
+        self.add_requests([{
+            'updateSheetProperties': {'properties': {'sheetId': self.sheet_id, 'title': title}, 'fields': 'title'}
+        }])
+        self.title = title
+
+    # Метод gspread.Spreadsheet
+
+    def batch_update(self, body):
+        self.add_requests(body.get('requests', []))
+
+
+class SheetsScheduler:
+    """Собирает записи по листам и отправляет их минимальным числом вызовов (см. описание модуля)."""
+
+    def __init__(self, transport, bucket=None,
+                 max_requests=MAX_REQUESTS_PER_BATCH, max_cells=MAX_CELLS_PER_BATCH):
+        self.transport = transport
+        self.bucket = bucket or TokenBucket(_writes_per_minute())
+        self.max_requests = max_requests
+        self.max_cells = max_cells
+        self._queues = {}
+        self.api_calls = 0
+
+    def sheet(self, key, sheet_id=None, title=''):
+        """Очередь листа key (создаётся при первом обращении)."""
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = SheetQueue(sheet_id, title)
+        return queue
+
+    def add_values(self, data, value_input_option='RAW'):
+        """Готовые ValueRange (диапазоны с именем листа) — в последнюю фазу отдельной очереди."""
+        queue = self.sheet(('values', value_input_option))
+        for entry in data:
+            queue.add_values(entry['range'], entry['values'], value_input_option)
+
+    def _send(self, method, body):
+        self.bucket.acquire()
+        self.api_calls += 1
+        return getattr(self.transport, method)(body)
+
+    def _send_requests(self, items):
+        """items — [(очередь, запрос)]; неудачный пакет делится пополам, пока не останутся отдельные запросы."""
+        try:
+            self._send('batch_update', {'requests': [request for _, request in items]})
+        except Exception as e:
+            if len(items) == 1:
+                queue, request = items[0]
+                logger.warning(f"Лист '{queue.title}': не выполнен {next(iter(request), '?')}: {e}")
+                return
+            # Пакет атомарен: после ошибки из него не применилось ничего, повторяем по половинам
+            logger.warning(f"Пакет оформления из {len(items)} запросов не выполнен ({e}), отправка частями")
+            middle = len(items) // 2
+            self._send_requests(items[:middle])
+            self._send_requests(items[middle:])
+
+    def _send_values(self, value_input_option, data):
+        chunk, cells = [], 0
+        for entry in data:
+            size = _cell_count(entry)
+            if chunk and (len(chunk) >= self.max_requests or cells + size > self.max_cells):
+                self._send('values_batch_update', {'valueInputOption': value_input_option, 'data': chunk})
+                chunk, cells = [], 0
+            chunk.append(entry)
+            cells += size
+        if chunk:
+            self._send('values_batch_update', {'valueInputOption': value_input_option, 'data': chunk})
+
+    def flush(self):
+        """Отправляет всё накопленное и очищает очереди. Возвращает число вызовов API за flush."""
+        calls_before = self.api_calls
+        queues = list(self._queues.values())
+        self._queues = {}
+        for phase in range(max((len(queue.phases) for queue in queues), default=0)):
+            items = []
+            values = {}
+            for queue in queues:
+                if phase >= len(queue.phases):
+                    continue
+                requests, queue_values = queue.phases[phase]
+                items.extend((queue, request) for request in requests)
+                for option, data in queue_values.items():
+                    values.setdefault(option, []).extend(data)
+            for start in range(0, len(items), self.max_requests):
+                self._send_requests(items[start:start + self.max_requests])
+            for option, data in values.items():
+                self._send_values(option, data)
+        return self.api_calls - calls_before
@@ -0,0 +1,317 @@
+"""Deferred, diff-based push of the Google Sheets export.
+
+export_to_google_sheets() builds every sheet against a RecordingSpreadsheet:
+reads (worksheet lookup, add_worksheet, metadata) go to the API right away,
+writes are only recorded per sheet. SheetsSync.push() then compares each sheet
+with the manifest of the previous export (instance/google_sheets_manifest.json):
+- layout — every non-value call (clear requests, merges, formats, widths,
+  freeze) — is hashed as a whole;
+- values are laid onto a cell grid and hashed in blocks of MANIFEST_BLOCK_ROWS rows.
+A sheet with unchanged layout gets only its changed row blocks. A new sheet, a
+sheet whose layout changed, or any sheet under push(full=True) is replayed in
+full. Both go through services.sheets_scheduler, which coalesces the whole push
+into a few batchUpdate calls paced by the Sheets write quota.
+Header timestamps ("Обновлено: dd.mm.yyyy HH:MM") are ignored when hashing
+and are always written. Manual edits in the spreadsheet are not detected;
+run a full sync after them.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+
+from services.sheets_scheduler import SheetsScheduler, update_args
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_BLOCK_ROWS = 50
+
+_TIMESTAMP_RE = re.compile(r'обновлено:? \d{2}\.\d{2}\.\d{4} \d{2}:\d{2}', re.IGNORECASE)
+_CELL_RE = re.compile(r'^([A-Z]+)(\d+)')
+# Ключ манифеста для запросов без sheetId (на уровне всей таблицы)
+_SPREADSHEET_KEY = '*'
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index
+
+
+def _column_letters(index):
+    letters = ''
+    while index:
+        index, rest = divmod(index - 1, 26)
+        letters = chr(ord('A') + rest) + letters
+    return letters
+
+
+def _parse_start_cell(range_name):
+    """'A3:G10' / "'Лист'!B2" -> (строка, колонка) левой верхней ячейки, с 1."""
+    cell = range_name.split('!')[-1]
+    match = _CELL_RE.match(cell)
+    if not match:
+        raise ValueError(f'Не удалось разобрать диапазон {range_name!r}')
+    return int(match.group(2)), _column_index(match.group(1))
+
+
+def _a1_range(title, first_row, last_row, last_col):
+    quoted = "'" + title.replace("'", "''") + "'"
+    return f'{quoted}!A{first_row}:{_column_letters(last_col)}{last_row}'
+
+
+def _is_volatile(value):
+    return isinstance(value, str) and _TIMESTAMP_RE.search(value) is not None
+
+
+def _hash(payload):
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _sheet_ids(obj):
+    """Все sheetId, встречающиеся в запросе batch_update."""
+    found = set()
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            if key == 'sheetId':
+                found.add(value)
+            else:
+                found |= _sheet_ids(value)
+    elif isinstance(obj, list):
+        for item in obj:
+            found |= _sheet_ids(item)
+    return found
+
+
+class SheetRecord:
+    """Записанные вызовы одного листа и итоговая сетка значений."""
+
+    def __init__(self, worksheet):
+        self.worksheet = worksheet
+        self.ops = []  # (kind, target, method, args, kwargs); kind — 'values' или 'layout'
+        self.cells = {}  # (строка, колонка) -> значение
+
+    @property
+    def key(self):
+        return str(self.worksheet.id) if self.worksheet is not None else _SPREADSHEET_KEY
+
+    @property
+    def title(self):
+        return self.worksheet.title if self.worksheet is not None else ''
+
+    def add_values(self, range_name, values, op):
+        first_row, first_col = _parse_start_cell(range_name)
+        for r, row in enumerate(values or []):
+            for c, value in enumerate(row):
+                self.cells[(first_row + r, first_col + c)] = value
+        self.ops.append(op)
+
+    def max_row(self):
+        return max((row for row, _ in self.cells), default=0)
+
+    def max_col(self):
+        return max((col for _, col in self.cells), default=0)
+
+    def _block_payload(self, block):
+        first = block * MANIFEST_BLOCK_ROWS + 1
+        last = first + MANIFEST_BLOCK_ROWS - 1
+        return sorted(
+            (row, col, '<timestamp>' if _is_volatile(value) else value)
+            for (row, col), value in self.cells.items()
+            if first <= row <= last
+        )
+
+    def manifest_entry(self):
+        layout = [(target, method, args, kwargs) for kind, target, method, args, kwargs in self.ops if kind == 'layout']
+        blocks = {}
+        for block in {(row - 1) // MANIFEST_BLOCK_ROWS for row, _ in self.cells}:
+            blocks[str(block)] = _hash(self._block_payload(block))
+        return {
+            'title': self.title,
+            'layout': _hash(layout),
+            'blocks': blocks,
+            'max_row': self.max_row(),
+            'max_col': self.max_col(),
+        }
+
+    def value_ranges(self, entry, previous):
+        """Диапазоны для values:batchUpdate: изменившиеся блоки строк и ячейки с отметкой времени."""
+        last_col = max(entry['max_col'], previous.get('max_col', 0))
+        last_row_total = max(entry['max_row'], previous.get('max_row', 0))
+        data = []
+        written_blocks = set()
+        for block in sorted(set(entry['blocks']) | set(previous.get('blocks', {})), key=int):
+            if entry['blocks'].get(block) == previous.get('blocks', {}).get(block):
+                continue
+            first = int(block) * MANIFEST_BLOCK_ROWS + 1
+            last = min(first + MANIFEST_BLOCK_ROWS - 1, last_row_total)
+            rows = [
+                [self.cells.get((row, col), '') for col in range(1, last_col + 1)]
+                for row in range(first, last + 1)
+            ]
+            data.append({'range': _a1_range(self.title, first, last, last_col), 'values': rows})
+            written_blocks.add(int(block))
+        for (row, col), value in sorted(self.cells.items()):
+            if _is_volatile(value) and (row - 1) // MANIFEST_BLOCK_ROWS not in written_blocks:
+                cell = f'{_column_letters(col)}{row}'
+                quoted = "'" + self.title.replace("'", "''") + "'"
+                data.append({'range': f'{quoted}!{cell}', 'values': [[value]]})
+        return data
+
+
+class RecordingWorksheet:
+    """Лист, у которого записывающие методы только запоминают вызов."""
+
+    def __init__(self, record):
+        self._record = record
+        self._worksheet = record.worksheet
+
+    def __getattr__(self, name):
+        return getattr(self._worksheet, name)
+
+    def _layout(self, method, *args, **kwargs):
+        self._record.ops.append(('layout', 'worksheet', method, args, kwargs))
+
+    def update(self, *args, **kwargs):
+        range_name, values, _ = update_args(args, kwargs)
+        self._record.add_values(range_name, values, ('values', 'worksheet', 'update', args, kwargs))
+
+    def update_acell(self, label, value):
+        self._record.add_values(label, [[value]], ('values', 'worksheet', 'update_acell', (label, value), {}))
+
+    def format(self, *args, **kwargs):
+        self._layout('format', *args, **kwargs)
+
+    def batch_format(self, *args, **kwargs):
+        self._layout('batch_format', *args, **kwargs)
+
+    def freeze(self, *args, **kwargs):
+        self._layout('freeze', *args, **kwargs)
+
+    def clear(self, *args, **kwargs):
+        self._layout('clear', *args, **kwargs)
+
+    def update_title(self, *args, **kwargs):
+        self._layout('update_title', *args, **kwargs)
+
+
+class RecordingSpreadsheet:
+    """Таблица для построения экспорта: чтения идут в API, batch_update записывается по листам."""
+
+    def __init__(self, sync, spreadsheet):
+        self._sync = sync
+        self._spreadsheet = spreadsheet
+
+    def __getattr__(self, name):
+        return getattr(self._spreadsheet, name)
+
+    @property
+    def sheet1(self):
+        return self._sync.wrap(self._spreadsheet.sheet1)
+
+    def worksheet(self, title):
+        return self._sync.wrap(self._spreadsheet.worksheet(title))
+
+    def add_worksheet(self, *args, **kwargs):
+        return self._sync.wrap(self._spreadsheet.add_worksheet(*args, **kwargs))
+
+    def batch_update(self, body):
+        sheet_ids = _sheet_ids(body.get('requests', []))
+        record = self._sync.record_for_id(sheet_ids.pop()) if len(sheet_ids) == 1 else None
+        if record is None:
+            record = self._sync.spreadsheet_record
+        record.ops.append(('layout', 'spreadsheet', 'batch_update', (body,), {}))
+
+
+class SheetsSync:
+    """Собирает записи экспорта и отправляет в таблицу только изменения (см. описание модуля)."""
+
+    def __init__(self, spreadsheet, manifest_path, scheduler=None):
+        self._spreadsheet = spreadsheet
+        self.manifest_path = manifest_path
+        self.spreadsheet = RecordingSpreadsheet(self, spreadsheet)
+        self.spreadsheet_record = SheetRecord(None)
+        self._records = {}
+        self.scheduler = scheduler or SheetsScheduler(spreadsheet)
+
+    @property
+    def api_calls(self):
+        return self.scheduler.api_calls
+
+    def wrap(self, worksheet):
+        record = self._records.get(worksheet.id)
+        if record is None:
+            record = self._records[worksheet.id] = SheetRecord(worksheet)
+        return RecordingWorksheet(record)
+
+    def record_for_id(self, sheet_id):
+        return self._records.get(sheet_id)
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self, manifest):
+        os.makedirs(os.path.dirname(self.manifest_path), exist_ok=True)
+        tmp_path = f'{self.manifest_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False)
+        os.replace(tmp_path, self.manifest_path)
+
+    def _enqueue(self, record):
+        sheet_id = record.worksheet.id if record.worksheet is not None else None
+        queue = self.scheduler.sheet(record.key, sheet_id, record.title)
+        for kind, target, method, args, kwargs in record.ops:
+            try:
+                getattr(queue, method)(*args, **kwargs)
+            except Exception as e:
+                # Без значений лист бессмыслен; ошибки оформления (объединения, ширины) не прерывают экспорт
+                if kind == 'values':
+                    raise
+                logger.warning(f"Лист '{record.title}': не удалось выполнить {method}: {e}")
+
+    def push(self, full=False):
+        """Отправляет записанное. Возвращает {'replayed': [...], 'patched': [...], 'unchanged': [...], 'api_calls': n}."""
+        manifest = self._load_manifest()
+        sheets_manifest = manifest.setdefault(self._spreadsheet.id, {})
+        result = {'replayed': [], 'patched': [], 'unchanged': []}
+        value_ranges = []
+        new_entries = {}
+
+        for record in self._records.values():
+            entry = record.manifest_entry()
+            previous = None if full else sheets_manifest.get(record.key)
+            new_entries[record.key] = entry
+            if previous is None or previous.get('layout') != entry['layout']:
+                # Пока лист перезаписывается, его запись в манифесте недействительна
+                sheets_manifest.pop(record.key, None)
+                self._enqueue(record)
+                result['replayed'].append(record.title)
+                continue
+            if entry['blocks'] != previous.get('blocks') or entry['max_row'] != previous.get('max_row'):
+                result['patched'].append(record.title)
+            else:
+                result['unchanged'].append(record.title)
+            value_ranges.extend(record.value_ranges(entry, previous))
+
+        if self.spreadsheet_record.ops:
+            self._enqueue(self.spreadsheet_record)
+        if value_ranges:
+            self.scheduler.add_values(value_ranges, 'RAW')
+        if result['replayed']:
+            self._save_manifest(manifest)
+
+        self.scheduler.flush()
+        if new_entries:
+            sheets_manifest.update(new_entries)
+            self._save_manifest(manifest)
+
+        result['api_calls'] = self.api_calls
+        return result
@@ -0,0 +1,415 @@
+"""Offline XLSX backend for the report export.
+
+XlsxSpreadsheet stands in for a gspread Spreadsheet in the export builders
+(google_sheets_sync.export_to_xlsx): sheet1, worksheet(), add_worksheet(),
+batch_update() and fetch_sheet_metadata() work without the network, and its
+worksheets are SheetQueue objects from services.sheets_scheduler, so every
+write is translated into the same Sheets API requests as for Google.
+save() applies those requests to an in-memory grid per sheet (values,
+userEnteredFormat, merges, column widths, row heights, frozen rows, title)
+and streams the result through openpyxl in write-only mode.
+
+Supported formatting is what the export uses: textFormat (bold, italic,
+fontSize, foregroundColor), backgroundColor, horizontal/verticalAlignment,
+wrapStrategy and numberFormat. Conditional formatting and other request
+types are skipped.
+"""
+
+import copy
+import json
+import logging
+import re
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Font, PatternFill
+from openpyxl.utils import get_column_letter
+from openpyxl.worksheet.cell_range import CellRange
+
+from services.sheets_scheduler import SheetQueue
+
+logger = logging.getLogger(__name__)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+DEFAULT_ROWS = 1000
+DEFAULT_COLS = 26
+# Пиксели Google Sheets -> ширина колонки Excel (в символах) и высота строки (в пунктах)
+PIXELS_PER_CHAR = 7.0
+POINTS_PER_PIXEL = 0.75
+
+_CELL_RE = re.compile(r'^([A-Z]+)(\d+)$')
+# Excel не допускает в имени листа []:*?/\ и длину больше 31 символа
+_SHEET_TITLE_INVALID_RE = re.compile(r'[\[\]:*?/\\]')
+MAX_SHEET_TITLE = 31
+_FIELDS_RE = re.compile(r'^userEnteredFormat(?:\((.*)\))?$')
+_HORIZONTAL = {'LEFT': 'left', 'CENTER': 'center', 'RIGHT': 'right'}
+_VERTICAL = {'TOP': 'top', 'MIDDLE': 'center', 'BOTTOM': 'bottom'}
+
+
+def _column_index(letters):
+    index = 0
+    for ch in letters:
+        index = index * 26 + (ord(ch) - ord('A') + 1)
+    return index
+
+
+def _excel_sheet_title(title, used):
+    """Имя листа, допустимое в Excel и уникальное среди used (без учёта регистра); добавляет его в used."""
+    base = _SHEET_TITLE_INVALID_RE.sub('_', title or '').strip("'") or 'Лист'
+    candidate = base[:MAX_SHEET_TITLE]
+    suffix = 1
+    while candidate.lower() in used:
+        suffix += 1
+        tail = f' ({suffix})'
+        candidate = base[:MAX_SHEET_TITLE - len(tail)] + tail
+    used.add(candidate.lower())
+    return candidate
+
+
+def _range_start(range_name):
+    """'Лист'!B2:D9 -> (строка, колонка) левой верхней ячейки, с 0."""
+    start = range_name.split('!')[-1].split(':')[0]
+    match = _CELL_RE.match(start)
+    if not match:
+        raise ValueError(f'Не удалось разобрать диапазон {range_name!r}')
+    return int(match.group(2)) - 1, _column_index(match.group(1)) - 1
+
+
+def _request_sheet_id(obj):
+    """Первый sheetId в запросе batch_update (None для запросов уровня таблицы)."""
+    if isinstance(obj, dict):
+        if 'sheetId' in obj:
+            return obj['sheetId']
+        values = obj.values()
+    elif isinstance(obj, list):
+        values = obj
+    else:
+        return None
+    for value in values:
+        found = _request_sheet_id(value)
+        if found is not None:
+            return found
+    return None
+
+
+def _hex_color(color):
+    """{'red': .., 'green': .., 'blue': ..} (0..1, нулевые компоненты опущены) -> 'FFRRGGBB'."""
+    return 'FF' + ''.join(f"{round(float(color.get(key, 0)) * 255):02X}" for key in ('red', 'green', 'blue'))
+
+
+class _Grid:
+    """Содержимое листа после применения запросов; строки и колонки с 0."""
+
+    def __init__(self, title, rows, cols):
+        self.title = title
+        self.rows = rows
+        self.cols = cols
+        self.values = {}
+        self.formats = {}
+        self.merges = []  # (первая строка, последняя + 1, первая колонка, последняя + 1)
+        self.col_widths = {}
+        self.row_heights = {}
+        self.frozen_rows = 0
+        self.frozen_cols = 0
+        self.filter_range = None
+        self.used_rows = 0
+        self.used_cols = 0
+
+    def _bounds(self, grid_range):
+        return (
+            grid_range.get('startRowIndex', 0),
+            grid_range.get('endRowIndex', self.rows),
+            grid_range.get('startColumnIndex', 0),
+            grid_range.get('endColumnIndex', self.cols),
+        )
+
+    def _mark_used(self, end_row, end_col):
+        self.used_rows = max(self.used_rows, end_row)
+        self.used_cols = max(self.used_cols, end_col)
+
+    def _cells(self, grid_range):
+        r0, r1, c0, c1 = self._bounds(grid_range)
+        return ((r, c) for r in range(r0, r1) for c in range(c0, c1))
+
+    def _repeat_cell(self, body):
+        match = _FIELDS_RE.match(body.get('fields', ''))
+        if not match:
+            logger.debug(f"XLSX '{self.title}': repeatCell с полями {body.get('fields')!r} пропущен")
+            return
+        cell_format = body.get('cell', {}).get('userEnteredFormat', {})
+        keys = [key.strip() for key in match.group(1).split(',')] if match.group(1) else None
+        grid_range = body['range']
+        for cell in self._cells(grid_range):
+            if keys is None:
+                self.formats[cell] = copy.deepcopy(cell_format)
+                continue
+            current = self.formats.setdefault(cell, {})
+            for key in keys:
+                if key in cell_format:
+                    current[key] = copy.deepcopy(cell_format[key])
+                else:
+                    current.pop(key, None)
+        # Диапазоны вида 'A:Z' (без строк) не расширяют лист
+        if 'endRowIndex' in grid_range:
+            r0, r1, c0, c1 = self._bounds(grid_range)
+            self._mark_used(r1, c1)
+
+    def _update_cells(self, body):
+        if 'rows' in body:
+            logger.debug(f"XLSX '{self.title}': updateCells с данными пропущен")
+            return
+        fields = body.get('fields', '')
+        clear_values = fields == '*' or 'userEnteredValue' in fields
+        clear_formats = fields == '*' or 'userEnteredFormat' in fields
+        r0, r1, c0, c1 = self._bounds(body.get('range', {}))
+        for store, clear in ((self.values, clear_values), (self.formats, clear_formats)):
+            if clear:
+                for cell in [cell for cell in store if r0 <= cell[0] < r1 and c0 <= cell[1] < c1]:
+                    del store[cell]
+
+    @staticmethod
+    def _overlaps(a, b):
+        return a[0] < b[1] and b[0] < a[1] and a[2] < b[3] and b[2] < a[3]
+
+    def _merge(self, body):
+        merge = self._bounds(body['range'])
+        if any(self._overlaps(merge, existing) for existing in self.merges):
+            # Sheets API отклоняет такое объединение
+            logger.debug(f"XLSX '{self.title}': объединение {merge} пересекается с существующим")
+            return
+        self.merges.append(merge)
+        self._mark_used(merge[1], merge[3])
+
+    def _unmerge(self, body):
+        area = self._bounds(body['range'])
+        self.merges = [merge for merge in self.merges if not self._overlaps(merge, area)]
+
+    def _dimension(self, body):
+        grid_range = body['range']
+        size = body.get('properties', {}).get('pixelSize')
+        if size is None:
+            return
+        target = self.col_widths if grid_range.get('dimension') == 'COLUMNS' else self.row_heights
+        for index in range(grid_range.get('startIndex', 0), grid_range.get('endIndex', grid_range.get('startIndex', 0) + 1)):
+            target[index] = size
+
+    def _sheet_properties(self, body):
+        properties = body.get('properties', {})
+        fields = body.get('fields', '')
+        grid = properties.get('gridProperties', {})
+        if 'title' in fields and properties.get('title'):
+            self.title = properties['title']
+        if 'frozenRowCount' in fields:
+            self.frozen_rows = grid.get('frozenRowCount') or 0
+        if 'frozenColumnCount' in fields:
+            self.frozen_cols = grid.get('frozenColumnCount') or 0
+
+    def _basic_filter(self, body):
+        self.filter_range = body.get('filter', {}).get('range', {})
+
+    def apply_request(self, request):
+        kind, body = next(iter(request.items()))
+        handler = {
+            'repeatCell': self._repeat_cell,
+            'updateCells': self._update_cells,
+            'mergeCells': self._merge,
+            'unmergeCells': self._unmerge,
+            'updateDimensionProperties': self._dimension,
+            'updateSheetProperties': self._sheet_properties,
+            'setBasicFilter': self._basic_filter,
+        }.get(kind)
+        if handler is None:
+            logger.debug(f"XLSX '{self.title}': запрос {kind} не поддерживается, пропущен")
+            return
+        handler(body)
+
+    def apply_values(self, range_name, values, value_input_option):
+        first_row, first_col = _range_start(range_name)
+        for r, row in enumerate(values or []):
+            for c, value in enumerate(row):
+                cell = (first_row + r, first_col + c)
+                if value is None or value == '':
+                    self.values.pop(cell, None)
+                else:
+                    self.values[cell] = (value, value_input_option)
+            self._mark_used(first_row + r + 1, first_col + len(row))
+
+
+class _StyleCache:
+    """userEnteredFormat -> (Font, PatternFill, Alignment, number_format), по одному объекту на формат."""
+
+    def __init__(self):
+        self._styles = {}
+
+    def get(self, cell_format):
+        key = json.dumps(cell_format, sort_keys=True)
+        style = self._styles.get(key)
+        if style is None:
+            style = self._styles[key] = self._build(cell_format)
+        return style
+
+    @staticmethod
+    def _build(cell_format):
+        text = cell_format.get('textFormat') or {}
+        font = None
+        if text:
+            font = Font(
+                bold=text.get('bold'),
+                italic=text.get('italic'),
+                size=text.get('fontSize'),
+                color=_hex_color(text['foregroundColor']) if text.get('foregroundColor') else None,
+            )
+        fill = None
+        if cell_format.get('backgroundColor'):
+            fill = PatternFill('solid', fgColor=_hex_color(cell_format['backgroundColor']))
+        alignment = None
+        horizontal = _HORIZONTAL.get(cell_format.get('horizontalAlignment'))
+        vertical = _VERTICAL.get(cell_format.get('verticalAlignment'))
+        wrap = cell_format.get('wrapStrategy') == 'WRAP'
+        if horizontal or vertical or wrap:
+            alignment = Alignment(horizontal=horizontal, vertical=vertical, wrap_text=wrap or None)
+        number_format = (cell_format.get('numberFormat') or {}).get('pattern')
+        return font, fill, alignment, number_format
+
+
+class XlsxWorksheet(SheetQueue):
+    """Лист для построителей экспорта: методы записи gspread.Worksheet, запросы копятся в очереди."""
+
+    def __init__(self, sheet_id, title, rows=DEFAULT_ROWS, cols=DEFAULT_COLS):
+        super().__init__(sheet_id, title)
+        self.rows = rows
+        self.cols = cols
+
+    @property
+    def id(self):
+        return self.sheet_id
+
+
+class XlsxSpreadsheet:
+    """Замена gspread.Spreadsheet без сети; save() пишет все листы в один .xlsx."""
+
+    id = None
+    url = None
+
+    def __init__(self):
+        self._worksheets = []
+
+    def _by_id(self, sheet_id):
+        for worksheet in self._worksheets:
+            if worksheet.sheet_id == sheet_id:
+                return worksheet
+        return None
+
+    @property
+    def sheet1(self):
+        if not self._worksheets:
+            self._worksheets.append(XlsxWorksheet(0, 'Лист1'))
+        return self._worksheets[0]
+
+    def worksheets(self):
+        return list(self._worksheets)
+
+    def worksheet(self, title):
+        for worksheet in self._worksheets:
+            if worksheet.title == title:
+                return worksheet
+        raise LookupError(f'Лист {title!r} не найден')
+
+    def add_worksheet(self, title, rows=DEFAULT_ROWS, cols=DEFAULT_COLS, index=None):
+        worksheet = XlsxWorksheet(len(self._worksheets), title, int(rows), int(cols))
+        if index is None:
+            self._worksheets.append(worksheet)
+        else:
+            self._worksheets.insert(index, worksheet)
+        return worksheet
+
+    def fetch_sheet_metadata(self, params=None):
+        return {'sheets': [
+            {'properties': {'sheetId': worksheet.sheet_id, 'title': worksheet.title}}
+            for worksheet in self._worksheets
+        ]}
+
+    def batch_update(self, body):
+        for request in body.get('requests', []):
+            worksheet = self._by_id(_request_sheet_id(request))
+            if worksheet is None:
+                logger.debug(f"XLSX: запрос {next(iter(request), '?')} без листа пропущен")
+                continue
+            worksheet.add_requests([request])
+
+    def _grid(self, worksheet):
+        # Как в Google, запись значений расширяет лист; диапазоны вида 'A:Z' должны покрыть и новые строки
+        rows = worksheet.rows
+        for _, values in worksheet.phases:
+            for data in values.values():
+                for entry in data:
+                    first_row = _range_start(entry['range'])[0]
+                    rows = max(rows, first_row + len(entry['values'] or []))
+        grid = _Grid(worksheet.title, rows, worksheet.cols)
+        for requests, values in worksheet.phases:
+            for request in requests:
+                grid.apply_request(request)
+            for value_input_option, data in values.items():
+                for entry in data:
+                    grid.apply_values(entry['range'], entry['values'], value_input_option)
+        return grid
+
+    def save(self, target):
+        """Пишет книгу в target (путь или двоичный файловый объект)."""
+        workbook = Workbook(write_only=True)
+        styles = _StyleCache()
+        used_titles = set()
+        for worksheet in self._worksheets:
+            grid = self._grid(worksheet)
+            _write_sheet(workbook, grid, _excel_sheet_title(grid.title, used_titles), styles)
+        workbook.save(target)
+
+
+def _write_sheet(workbook, grid, title, styles):
+    ws = workbook.create_sheet(title)
+    last_row = grid.used_rows
+    last_col = max(grid.used_cols, max(grid.col_widths, default=-1) + 1)
+
+    # В режиме write-only размеры, закрепление и объединения задаются до записи строк
+    for col, size in grid.col_widths.items():
+        ws.column_dimensions[get_column_letter(col + 1)].width = round(size / PIXELS_PER_CHAR, 2)
+    for row, size in grid.row_heights.items():
+        if row < last_row:
+            ws.row_dimensions[row + 1].height = round(size * POINTS_PER_PIXEL, 2)
+    if grid.frozen_rows or grid.frozen_cols:
+        ws.freeze_panes = f'{get_column_letter(grid.frozen_cols + 1)}{grid.frozen_rows + 1}'
+    for r0, r1, c0, c1 in grid.merges:
+        r1, c1 = min(r1, last_row), min(c1, last_col)
+        if r1 - r0 > 1 or c1 - c0 > 1:
+            ws.merged_cells.add(CellRange(min_col=c0 + 1, min_row=r0 + 1, max_col=c1, max_row=r1))
+    if grid.filter_range is not None and last_row and last_col:
+        r0, r1, c0, c1 = grid._bounds(grid.filter_range)
+        r1, c1 = min(r1, last_row), min(c1, last_col)
+        if r1 > r0 and c1 > c0:
+            ws.auto_filter.ref = CellRange(min_col=c0 + 1, min_row=r0 + 1, max_col=c1, max_row=r1).coord
+
+    for r in range(last_row):
+        row = []
+        for c in range(last_col):
+            value, value_input_option = grid.values.get((r, c), (None, None))
+            cell_format = grid.formats.get((r, c))
+            # RAW: строка '=...' остаётся текстом, а не формулой
+            raw_formula = value_input_option == 'RAW' and isinstance(value, str) and value.startswith('=')
+            if not cell_format and not raw_formula:
+                row.append(value)
+                continue
+            cell = WriteOnlyCell(ws, value=value)
+            if raw_formula:
+                cell.data_type = 's'
+            if cell_format:
+                font, fill, alignment, number_format = styles.get(cell_format)
+                if font is not None:
+                    cell.font = font
+                if fill is not None:
+                    cell.fill = fill
+                if alignment is not None:
+                    cell.alignment = alignment
+                if number_format:
+                    cell.number_format = number_format
+            row.append(cell)
+        ws.append(row)
@@ -5,7 +5,7 @@
 import logging
 import os
 
-from parsers.isu_calcfs_parser import ISUCalcFSParser
+from services.parse_cache import parse_xml_cached, parse_xml_files
 
 logger = logging.getLogger(__name__)
 
@@ -17,14 +17,19 @@ def iter_ready_parsers(parser_data, categories_analysis, deleted_indices):
     deleted_indices — множество индексов категорий (глобальных по categories_analysis).
     """
     if 'files' in parser_data:
-        category_index = 0
+        ready_files = []
         for file_info in parser_data['files']:
             filepath = file_info.get('filepath')
             if not filepath or not os.path.exists(filepath):
                 logger.warning('Пропуск файла без пути или файл отсутствует: %s', file_info.get('filename'))
                 continue
-            parser = ISUCalcFSParser(filepath)
-            parser.parse()
+            ready_files.append(file_info)
+        # Все файлы разбираются параллельно; запись в БД у вызывающего остаётся последовательной
+        parsers = parse_xml_files([file_info['filepath'] for file_info in ready_files])
+
+        category_index = 0
+        for file_info, parser in zip(ready_files, parsers):
+            filepath = file_info['filepath']
 
             categories_to_save = []
             deleted_category_ids = set()
@@ -55,8 +60,7 @@ def iter_ready_parsers(parser_data, categories_analysis, deleted_indices):
         if not filepath or not os.path.exists(filepath):
             logger.error('Файл импорта не найден: %s', filepath)
             return
-        parser = ISUCalcFSParser(filepath)
-        parser.parse()
+        parser = parse_xml_cached(filepath)
 
         categories_to_save = []
         deleted_category_ids = set()
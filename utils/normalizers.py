@@ -16,6 +16,11 @@ def normalize_string(value):
     return value.strip()
 
 
+def normalize_name_key(value):
+    """Ключ для поиска по имени/фамилии: normalize_string в нижнем регистре (пустое -> None)."""
+    return normalize_string(value).lower() or None
+
+
 def remove_duplication(text):
     """Удаляет дублирование слов в тексте (например, 'Софья Софья' -> 'Софья')."""
     if not text or not isinstance(text, str):
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нормализация названий категорий в разряды (без обращения к БД).
+Используется импортом, агрегатами athlete_rank_stats и миграциями.
+"""
+
+from utils.normalizers import fix_latin_to_cyrillic
+
+
+RANK_DICTIONARY = {
+    'мс': {
+        'name': 'МС',
+        'genders': {'F': 'МС, Женщины', 'M': 'МС, Мужчины'},
+        'keywords': ['мс', 'мастер спорта', 'мастер спорта россии']
+    },
+    'кмс': {
+        'name': 'КМС',
+        'genders': {'F': 'КМС, Девушки', 'M': 'КМС, Юноши'},
+        'keywords': ['кмс', 'кандидат в мастера спорта', 'кандидат в мастера спорта россии', 'кандидат в мастера', 'кандидат мастера спорта', 'кандидат в мастера спорта, юниоры', 'кандидат в мастера спорта, юниорки']
+    },
+    '1 спортивный': {
+        'name': '1 Спортивный',
+        'genders': {'F': '1 Спортивный, Девочки', 'M': '1 Спортивный, Мальчики'},
+        'keywords': ['1 спортивный', 'первый спортивный', '1 спорт', '1 спортивный разряд', 'первый спортивный разряд']
+    },
+    '2 спортивный': {
+        'name': '2 Спортивный',
+        'genders': {'F': '2 Спортивный, Девочки', 'M': '2 Спортивный, Мальчики'},
+        'keywords': ['2 спортивный', 'второй спортивный', '2 спорт', '2 спортивный разряд', 'второй спортивный разряд']
+    },
+    '3 спортивный': {
+        'name': '3 Спортивный',
+        'genders': {'F': '3 Спортивный, Девочки', 'M': '3 Спортивный, Мальчики'},
+        'keywords': ['3 спортивный', 'третий спортивный', '3 спорт', '3 спортивный разряд', 'третий спортивный разряд']
+    },
+    '1 юношеский': {
+        'name': '1 Юношеский',
+        'genders': {'F': '1 Юношеский, Девочки', 'M': '1 Юношеский, Мальчики'},
+        'keywords': ['1 юношеский', 'первый юношеский', '1 юн']
+    },
+    '2 юношеский': {
+        'name': '2 Юношеский',
+        'genders': {'F': '2 Юношеский, Девочки', 'M': '2 Юношеский, Мальчики'},
+        'keywords': ['2 юношеский', 'второй юношеский', '2 юн']
+    },
+    '3 юношеский': {
+        'name': '3 Юношеский',
+        'genders': {'F': '3 Юношеский, Девочки', 'M': '3 Юношеский, Мальчики'},
+        'keywords': ['3 юношеский', 'третий юношеский', '3 юн']
+    },
+    'юный фигурист': {
+        'name': 'Юный Фигурист',
+        'genders': {'F': 'Юный Фигурист, Девочки', 'M': 'Юный Фигурист, Мальчики'},
+        'keywords': ['юный фигурист', 'юный', 'юф']
+    },
+    'дебют': {
+        'name': 'Дебют',
+        'genders': {'F': 'Дебют, Девочки', 'M': 'Дебют, Мальчики'},
+        'keywords': ['дебют', 'дебютный']
+    },
+    'новичок': {
+        'name': 'Новичок',
+        'genders': {'F': 'Новичок, Девочки', 'M': 'Новичок, Мальчики'},
+        'keywords': ['новичок', 'начинающий']
+    },
+    'пары_1 спортивный': {
+        'name': '1 Спортивный, Пары',
+        'genders': {'F': '1 Спортивный, Пары', 'M': '1 Спортивный, Пары'},
+        'keywords': ['парное катание, 1 спортивный', 'пары, 1 спортивный', 'парное, 1 спортивный', 'парное катание, 1 спортивный разряд']
+    },
+    'пары_2 спортивный': {
+        'name': '2 Спортивный, Пары',
+        'genders': {'F': '2 Спортивный, Пары', 'M': '2 Спортивный, Пары'},
+        'keywords': ['парное катание, 2 спортивный', 'пары, 2 спортивный', 'парное, 2 спортивный']
+    },
+    'пары_3 спортивный': {
+        'name': '3 Спортивный, Пары',
+        'genders': {'F': '3 Спортивный, Пары', 'M': '3 Спортивный, Пары'},
+        'keywords': ['парное катание, 3 спортивный', 'пары, 3 спортивный', 'парное, 3 спортивный']
+    },
+    'пары_кмс': {
+        'name': 'КМС, Пары',
+        'genders': {'F': 'КМС, Пары', 'M': 'КМС, Пары'},
+        'keywords': ['парное катание, кандидат в мастера спорта', 'пары, кандидат в мастера спорта', 'парное, кандидат в мастера спорта', 'парное катание, кмс', 'пары, кмс', 'парное катание, кандидат в мастера спорта']
+    },
+    'пары_мс': {
+        'name': 'МС, Пары',
+        'genders': {'F': 'МС, Пары', 'M': 'МС, Пары'},
+        'keywords': ['парное катание, мастер спорта', 'пары, мастер спорта', 'парное, мастер спорта', 'парное катание, мс', 'пары, мс']
+    },
+    'танцы_1 спортивный': {
+        'name': '1 Спортивный, Танцы',
+        'genders': {'F': '1 Спортивный, Танцы', 'M': '1 Спортивный, Танцы'},
+        'keywords': ['танцы на льду, 1 спортивный', 'танцы, 1 спортивный', 'ледяные танцы, 1 спортивный', 'танцы на льду, 1 спортивный разряд']
+    },
+    'танцы_2 спортивный': {
+        'name': '2 Спортивный, Танцы',
+        'genders': {'F': '2 Спортивный, Танцы', 'M': '2 Спортивный, Танцы'},
+        'keywords': ['танцы на льду, 2 спортивный', 'танцы, 2 спортивный', 'ледяные танцы, 2 спортивный']
+    },
+    'танцы_3 спортивный': {
+        'name': '3 Спортивный, Танцы',
+        'genders': {'F': '3 Спортивный, Танцы', 'M': '3 Спортивный, Танцы'},
+        'keywords': ['танцы на льду, 3 спортивный', 'танцы, 3 спортивный', 'ледяные танцы, 3 спортивный']
+    },
+    'танцы_кмс': {
+        'name': 'КМС, Танцы',
+        'genders': {'F': 'КМС, Танцы', 'M': 'КМС, Танцы'},
+        'keywords': ['танцы на льду, кандидат в мастера спорта', 'танцы, кандидат в мастера спорта', 'ледяные танцы, кандидат в мастера спорта', 'танцы на льду, кмс', 'танцы, кмс', 'танцы на льду, кандидат в мастера спорта']
+    },
+    'танцы_мс': {
+        'name': 'МС, Танцы',
+        'genders': {'F': 'МС, Танцы', 'M': 'МС, Танцы'},
+        'keywords': ['танцы на льду, мастер спорта', 'танцы, мастер спорта', 'ледяные танцы, мастер спорта', 'танцы на льду, мс', 'танцы, мс']
+    }
+}
+
+
+def normalize_category_name(category_name, gender=None):
+    """Нормализует название категории для группировки по разрядам с учетом пола."""
+    if not category_name:
+        return "Неизвестно"
+    
+    # Сначала заменяем латинские буквы на русские (o->о, e->е, c->с, p->р, a->а и т.д.)
+    category_name = fix_latin_to_cyrillic(category_name)
+    
+    name_lower = category_name.lower()
+    name_lower = name_lower.replace('девочки', 'девочки')
+    name_lower = name_lower.replace('спортивный', 'спортивный')
+
+    for rank_data in RANK_DICTIONARY.values():
+        for keyword in rank_data['keywords']:
+            if keyword in name_lower:
+                if gender and gender.upper() in rank_data['genders']:
+                    return rank_data['genders'][gender.upper()]
+                return rank_data['name']
+
+    gender_suffix = ""
+    if gender:
+        if gender.upper() == 'F':
+            gender_suffix = ", Девочки"
+        elif gender.upper() == 'M':
+            gender_suffix = ", Мальчики"
+    return f"Другой{gender_suffix}"
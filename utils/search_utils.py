@@ -32,6 +32,15 @@ def normalize_search_term(search_term):
     return normalized
 
 
+def search_key(text):
+    """Ключ для поиска (колонки search_key и FTS-индекс, services/search_index.py)
+
+    normalize_search_term + casefold + 'ё' -> 'е'. Одной и той же функцией нормализуются
+    и хранимые строки, и поисковый запрос.
+    """
+    return normalize_search_term(text).casefold().replace('ё', 'е')
+
+
 def create_search_filter(model_field, search_term):
     """Создает фильтр для поиска с учетом нормализации
     